@@ -0,0 +1,389 @@
+"""
+CPU render benchmark.
+
+Renders generated reference scenes through `run.py`, the same way the
+service does, for each engine, frame count and resolution. Wall time is
+split into process startup, file open and per frame render, save and
+record time. Results are saved as JSON and compared with a baseline:
+
+    python -m modules.render.benchmark --baseline benchmark/baseline.json
+
+Save a baseline with `--update-baseline` before upgrading Blender or the
+service, then run again after the upgrade. The exit code is 1 when a case
+got slower than the baseline by more than `--threshold`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from math import radians
+from pathlib import Path
+from uuid import uuid4
+
+import bpy
+
+from modules.render.run import (
+    BASE_DIR,
+    LOGS_DIR,
+    REDIS_RESULTS_KEY,
+    clear_progress,
+    get_redis,
+)
+
+
+BENCHMARK_DIR = BASE_DIR / "benchmark"
+RENDER_SCRIPT = BASE_DIR / "modules" / "render" / "run.py"
+SCENES = ("simple", "heavy")
+ENGINES = ("CYCLES", "BLENDER_EEVEE_NEXT")
+METRICS = ("total", "startup", "open", "render", "write", "record")
+
+
+def parse_resolution(value: str) -> tuple[int, int]:
+    width, _, height = value.partition("x")
+    try:
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid resolution: {value}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scenes",
+        nargs="+",
+        choices=SCENES,
+        default=list(SCENES),
+        help="Reference scenes to render",
+    )
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=ENGINES,
+        default=list(ENGINES),
+        help="Render engines",
+    )
+    parser.add_argument(
+        "--frames",
+        nargs="+",
+        type=int,
+        default=[1, 3],
+        help="Frame counts",
+    )
+    parser.add_argument(
+        "--resolutions",
+        nargs="+",
+        type=parse_resolution,
+        default=[(320, 180), (640, 360)],
+        help="Resolutions as WIDTHxHEIGHT",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs of each case, the median is kept",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Number of render threads, 0 to auto-detect",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=BENCHMARK_DIR / "work",
+        help="Directory for the scenes and rendered frames",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=BENCHMARK_DIR / "results.json",
+        help="Where to save the results",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=BENCHMARK_DIR / "baseline.json",
+        help="Results to compare with",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Save the results as the new baseline",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Slowdown ratio flagged as a regression",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.05,
+        help="Seconds of slowdown ignored as noise",
+    )
+    return parser.parse_args()
+
+
+def add_material(obj, color: tuple, roughness: float, metallic: float = 0):
+    material = bpy.data.materials.new(f"{obj.name}_material")
+    # Blender 5 gives new materials a node tree, older versions do not.
+    if material.node_tree is None:
+        material.use_nodes = True
+    shader = material.node_tree.nodes["Principled BSDF"]
+    shader.inputs["Base Color"].default_value = (*color, 1)
+    shader.inputs["Roughness"].default_value = roughness
+    shader.inputs["Metallic"].default_value = metallic
+    obj.data.materials.append(material)
+
+
+def build_simple_scene(scene) -> None:
+    """
+    A few primitives on a plane lit by the sun.
+    """
+    bpy.ops.mesh.primitive_plane_add(size=20)
+    add_material(bpy.context.object, (0.8, 0.8, 0.8), 0.9)
+    bpy.ops.mesh.primitive_cube_add(location=(-2, 0, 1))
+    cube = bpy.context.object
+    add_material(cube, (0.8, 0.1, 0.1), 0.4)
+    # Frames differ, so no frame is a copy of the previous one.
+    cube.keyframe_insert("rotation_euler", frame=1)
+    cube.rotation_euler.z = radians(90)
+    cube.keyframe_insert("rotation_euler", frame=24)
+    bpy.ops.mesh.primitive_uv_sphere_add(location=(0, 0, 1))
+    add_material(bpy.context.object, (0.1, 0.3, 0.8), 0.2, metallic=1)
+    bpy.ops.mesh.primitive_cone_add(location=(2, 0, 1))
+    add_material(bpy.context.object, (0.1, 0.7, 0.2), 0.6)
+    bpy.ops.object.light_add(type="SUN", rotation=(radians(45), 0, 0))
+    bpy.context.object.data.energy = 3
+
+
+def build_heavy_scene(scene) -> None:
+    """
+    A grid of subdivided glossy spheres lit by area lights.
+    """
+    bpy.ops.mesh.primitive_plane_add(size=40)
+    add_material(bpy.context.object, (0.5, 0.5, 0.5), 0.3)
+    for x in range(-3, 4):
+        for y in range(-3, 4):
+            bpy.ops.mesh.primitive_ico_sphere_add(
+                subdivisions=3, radius=0.6, location=(x * 1.5, y * 1.5, 0.6)
+            )
+            sphere = bpy.context.object
+            modifier = sphere.modifiers.new("subdivision", "SUBSURF")
+            modifier.render_levels = 2
+            add_material(
+                sphere,
+                ((x + 3) / 6, (y + 3) / 6, 0.5),
+                0.1 + 0.1 * ((x + y) % 5),
+                metallic=(x + y) % 2,
+            )
+            sphere.keyframe_insert("location", frame=1)
+            sphere.location.z += 0.5 * ((x * y) % 3)
+            sphere.keyframe_insert("location", frame=24)
+    for x in (-6, 6):
+        bpy.ops.object.light_add(type="AREA", location=(x, 0, 8))
+        bpy.context.object.data.energy = 2000
+        bpy.context.object.data.size = 4
+
+
+def build_scene(name: str, blend_path: Path) -> None:
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    {"simple": build_simple_scene, "heavy": build_heavy_scene}[name](scene)
+
+    bpy.ops.object.camera_add(
+        location=(0, -14, 8), rotation=(radians(62), 0, 0)
+    )
+    scene.camera = bpy.context.object
+    world = bpy.data.worlds.new("world")
+    world.color = (0.05, 0.05, 0.08)
+    scene.world = world
+
+    # Fixed sample counts keep results comparable across Blender versions.
+    scene.cycles.device = "CPU"
+    scene.cycles.samples = 32
+    scene.cycles.use_adaptive_sampling = False
+    scene.cycles.use_denoising = False
+    scene.eevee.taa_render_samples = 16
+    blend_path.parent.mkdir(parents=True, exist_ok=True)
+    bpy.ops.wm.save_as_mainfile(filepath=str(blend_path))
+
+
+def run_case(
+    blend_path: Path,
+    engine: str,
+    frames: int,
+    resolution: tuple[int, int],
+    args: argparse.Namespace,
+    redis,
+) -> dict[str, float]:
+    """
+    Render the case once through run.py and return its phase times.
+    """
+    job_id = f"benchmark-{uuid4().hex}"
+    run_dir = args.work_dir / job_id
+    rendered_dir = run_dir / "rendered"
+    rendered_dir.mkdir(parents=True)
+    timings_path = run_dir / "timings.json"
+
+    started_at = time.time()
+    try:
+        subprocess.run(
+            [
+                sys.executable,
+                str(RENDER_SCRIPT),
+                "--job-id",
+                job_id,
+                "--blender-file-path",
+                str(blend_path),
+                "--resolution-x",
+                str(resolution[0]),
+                "--resolution-y",
+                str(resolution[1]),
+                "--engine",
+                engine,
+                "--output-format",
+                "PNG",
+                "--frame-range",
+                f"1,{frames}",
+                "--output-dir",
+                str(rendered_dir),
+                "--threads",
+                str(args.threads),
+                "--timings-path",
+                str(timings_path),
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        total = time.time() - started_at
+        timings = json.loads(timings_path.read_text())
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+        clear_progress(job_id, redis)
+        redis.delete(REDIS_RESULTS_KEY.format(job_id))
+        (LOGS_DIR / "render_jobs" / f"{job_id}.log").unlink(missing_ok=True)
+
+    frame_timings = list(timings["frames"].values())
+    return {
+        "total": total,
+        "startup": timings["started_at"] - started_at,
+        "open": timings["open"],
+        # Per frame means.
+        "render": statistics.mean(t["render"] for t in frame_timings),
+        "write": statistics.mean(t["write"] for t in frame_timings),
+        "record": statistics.mean(t["record"] for t in frame_timings),
+    }
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    redis = get_redis()
+    cases = {}
+    for scene_name in args.scenes:
+        blend_path = args.work_dir / "scenes" / f"{scene_name}.blend"
+        build_scene(scene_name, blend_path)
+        for engine in args.engines:
+            for frames in args.frames:
+                for resolution in args.resolutions:
+                    case_id = (
+                        f"{scene_name}/{engine}/{frames}f/"
+                        f"{resolution[0]}x{resolution[1]}"
+                    )
+                    runs = [
+                        run_case(
+                            blend_path, engine, frames, resolution, args, redis
+                        )
+                        for _ in range(args.repeat)
+                    ]
+                    cases[case_id] = {
+                        metric: statistics.median(run[metric] for run in runs)
+                        for metric in METRICS
+                    }
+                    print(f"{case_id}: {cases[case_id]['total']:.2f} sec.")
+
+    return {
+        "created_at": datetime.now().isoformat(),
+        "environment": {
+            "blender": bpy.app.version_string,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "threads": args.threads,
+        },
+        "cases": cases,
+    }
+
+
+def compare_results(
+    results: dict, baseline: dict, threshold: float, min_delta: float
+) -> list[str]:
+    """
+    Print the change of each metric and return the regressed ones.
+    """
+    if results["environment"] != baseline["environment"]:
+        print(
+            "Warning: the baseline was made in another environment: "
+            f"{baseline['environment']}"
+        )
+
+    regressions = []
+    for case_id, metrics in results["cases"].items():
+        base_metrics = baseline["cases"].get(case_id)
+        if base_metrics is None:
+            print(f"{case_id}: not in the baseline")
+            continue
+        for metric in METRICS:
+            value, base_value = metrics[metric], base_metrics[metric]
+            change = (value - base_value) / base_value if base_value else 0
+            regressed = change > threshold and value - base_value > min_delta
+            print(
+                f"{case_id} {metric}: {base_value:.3f} -> {value:.3f} sec. "
+                f"({change:+.1%}){' REGRESSION' if regressed else ''}"
+            )
+            if regressed:
+                regressions.append(f"{case_id} {metric}")
+    return regressions
+
+
+def main() -> int:
+    args = parse_args()
+    results = run_benchmark(args)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Results saved: {args.output}")
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline to compare with: {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    regressions = compare_results(
+        results, baseline, args.threshold, args.min_delta
+    )
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    exit_code = main()
+    sys.stdout.flush()
+    # Blender does not always exit on its own, see run.py.
+    os._exit(exit_code)
@@ -0,0 +1,457 @@
+"""
+Render farm worker.
+
+Leases frame batches queued by the API in farm mode, fetches the project
+assets, renders with `render_blender_file` and uploads the frames back to
+the API. Run it on any
+machine that can reach the API and its Redis:
+
+    python -m modules.render.farm_worker --api-url http://api-host:8000
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+from redis import Redis, WatchError
+
+from modules.render.run import (
+    BASE_DIR,
+    REDIS_DATA_LIFETIME,
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_JOBS_DB,
+    clear_progress,
+    close_logger,
+    render_blender_file,
+    service_logger,
+    setup_logger,
+)
+from src.blender_service.assets import is_safe_path
+
+
+FARM_TASKS_KEY = "farm_tasks"
+FARM_TASK_KEY = "farm_task:{}"
+FARM_LEASE_KEY = "farm_lease:{}"
+FARM_ATTEMPTS_KEY = "farm_attempts"
+FARM_EVENTS_KEY = "farm_events"
+FARM_LEASE_TIMEOUT = int(os.getenv("FARM_LEASE_TIMEOUT", 60))
+FARM_MAX_ATTEMPTS = int(os.getenv("FARM_MAX_ATTEMPTS", 3))
+FARM_DIR = BASE_DIR / "farm"
+FETCH_WORKERS = 4
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--api-url",
+        type=str,
+        default="http://localhost:8000",
+        help="Base URL of the render service API",
+    )
+    parser.add_argument(
+        "--worker-id",
+        type=str,
+        default=f"{socket.gethostname()}-{os.getpid()}",
+        help="Worker name reported in task events",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        default=FARM_DIR,
+        help="Directory for downloaded projects and rendered frames",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Number of render threads, 0 to auto-detect",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds to wait when there are no tasks",
+    )
+    return parser.parse_args()
+
+
+def get_redis() -> Redis:
+    return Redis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_JOBS_DB,
+        decode_responses=True,
+    )
+
+
+def lease_task(redis: Redis) -> tuple[str, str, int] | None:
+    """
+    Lease the oldest visible task.
+
+    Returns the task id, the lease token and the attempt number.
+    """
+    with redis.pipeline() as pipeline:
+        while True:
+            try:
+                pipeline.watch(FARM_TASKS_KEY)
+                now = time.time()
+                tasks = pipeline.zrangebyscore(
+                    FARM_TASKS_KEY, "-inf", now, start=0, num=1
+                )
+                if not tasks:
+                    pipeline.unwatch()
+                    return None
+
+                task_id = tasks[0]
+                token = uuid4().hex
+                pipeline.multi()
+                pipeline.zadd(
+                    FARM_TASKS_KEY, {task_id: now + FARM_LEASE_TIMEOUT}
+                )
+                pipeline.set(
+                    FARM_LEASE_KEY.format(task_id),
+                    token,
+                    ex=REDIS_DATA_LIFETIME,
+                )
+                pipeline.hincrby(FARM_ATTEMPTS_KEY, task_id, 1)
+                attempts = pipeline.execute()[-1]
+                return task_id, token, attempts
+            except WatchError:
+                continue
+
+
+def _update_lease(
+    redis: Redis, task_id: str, token: str, visible_at: float
+) -> bool:
+    """
+    Move the task visibility time if the lease is still ours.
+    """
+    lease_key = FARM_LEASE_KEY.format(task_id)
+    with redis.pipeline() as pipeline:
+        while True:
+            try:
+                pipeline.watch(lease_key)
+                if pipeline.get(lease_key) != token:
+                    pipeline.unwatch()
+                    return False
+                if pipeline.zscore(FARM_TASKS_KEY, task_id) is None:
+                    pipeline.unwatch()
+                    return False
+                pipeline.multi()
+                pipeline.zadd(FARM_TASKS_KEY, {task_id: visible_at}, xx=True)
+                pipeline.execute()
+                return True
+            except WatchError:
+                continue
+
+
+def extend_lease(redis: Redis, task_id: str, token: str) -> bool:
+    return _update_lease(
+        redis, task_id, token, time.time() + FARM_LEASE_TIMEOUT
+    )
+
+
+def release_lease(redis: Redis, task_id: str, token: str) -> bool:
+    """
+    Make the task visible again so another worker can retry it.
+    """
+    return _update_lease(redis, task_id, token, time.time())
+
+
+def complete_task(redis: Redis, task_id: str, token: str, event: dict) -> bool:
+    """
+    Remove the task and report the event if the lease is still ours.
+    """
+    lease_key = FARM_LEASE_KEY.format(task_id)
+    with redis.pipeline() as pipeline:
+        while True:
+            try:
+                pipeline.watch(lease_key)
+                if pipeline.get(lease_key) != token:
+                    pipeline.unwatch()
+                    return False
+                pipeline.multi()
+                pipeline.zrem(FARM_TASKS_KEY, task_id)
+                pipeline.hdel(FARM_ATTEMPTS_KEY, task_id)
+                pipeline.delete(lease_key, FARM_TASK_KEY.format(task_id))
+                pipeline.rpush(FARM_EVENTS_KEY, json.dumps(event))
+                pipeline.execute()
+                return True
+            except WatchError:
+                continue
+
+
+def push_event(redis: Redis, event: dict) -> None:
+    redis.rpush(FARM_EVENTS_KEY, json.dumps(event))
+
+
+class LeaseKeeper(threading.Thread):
+    """
+    Heartbeat extending the task lease while the task renders.
+    """
+
+    def __init__(self, redis: Redis, task_id: str, token: str):
+        super().__init__(daemon=True)
+        self.redis = redis
+        self.task_id = task_id
+        self.token = token
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        interval = FARM_LEASE_TIMEOUT / 3
+        while not self._stop_event.wait(interval):
+            try:
+                if not extend_lease(self.redis, self.task_id, self.token):
+                    service_logger.warning(
+                        f"Lease lost, task_id: {self.task_id}"
+                    )
+                    self.lost = True
+                    return
+            except Exception as exc:
+                service_logger.error(f"Heartbeat failed: {exc}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def fetch_json(url: str):
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return json.load(response)
+
+
+def fetch_asset(api_url: str, digest: str, assets_dir: Path) -> Path:
+    """
+    Download an asset into the local store unless it is already there.
+    """
+    asset_path = assets_dir / digest[:2] / digest
+    if asset_path.exists():
+        return asset_path
+
+    asset_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = asset_path.with_name(f"{digest}.{uuid4().hex}.part")
+    try:
+        urllib.request.urlretrieve(
+            f"{api_url}/api/projects/assets/{digest}", tmp_path
+        )
+        os.replace(tmp_path, asset_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return asset_path
+
+
+def link_asset(asset_path: Path, target_path: Path) -> None:
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(asset_path, target_path)
+    except OSError:
+        shutil.copyfile(asset_path, target_path)
+
+
+def fetch_project(task: dict, api_url: str, work_dir: Path) -> Path:
+    """
+    Build the project from its asset manifest unless it is up to date.
+
+    Assets are kept in a local store by hash, so only files this machine
+    has not seen yet are downloaded. Returns the project directory. A file
+    lock keeps several workers on the same machine from fetching at once.
+    """
+    project_dir = work_dir / task["project_id"]
+    project_dir.mkdir(parents=True, exist_ok=True)
+    extracted_dir = project_dir / "extract"
+    version_file = project_dir / ".version"
+
+    with open(project_dir / ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if (
+            version_file.exists()
+            and version_file.read_text() == task["project_version"]
+        ):
+            return extracted_dir
+
+        service_logger.info(f"Fetch project: {task['project_id']}")
+        project_id = urllib.parse.quote(task["project_id"])
+        manifest = fetch_json(f"{api_url}/api/projects/{project_id}/assets")
+        for path in manifest:
+            if not is_safe_path(path):
+                raise ValueError(f"Invalid asset path: {path}")
+
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            asset_paths = dict(
+                zip(
+                    manifest,
+                    executor.map(
+                        lambda digest: fetch_asset(
+                            api_url, digest, work_dir / "assets"
+                        ),
+                        manifest.values(),
+                    ),
+                )
+            )
+
+        shutil.rmtree(extracted_dir, ignore_errors=True)
+        for path, asset_path in asset_paths.items():
+            link_asset(asset_path, extracted_dir / path)
+        version_file.write_text(task["project_version"])
+    return extracted_dir
+
+
+def get_blender_file_path(extracted_dir: Path) -> Path:
+    blender_files = list(extracted_dir.glob("*.blend"))
+    if not blender_files:
+        raise FileNotFoundError(f"Blender file not found in {extracted_dir}")
+    if len(blender_files) > 1:
+        raise ValueError(f"Multiple Blender files found in {extracted_dir}")
+    return blender_files[0]
+
+
+def upload_frame(api_url: str, job_id: str, frame_path: Path) -> None:
+    url = (
+        f"{api_url}/api/tasks/{job_id}/frames/"
+        f"{urllib.parse.quote(frame_path.name)}"
+    )
+    with open(frame_path, "rb") as frame_file:
+        request = urllib.request.Request(
+            url,
+            data=frame_file,
+            method="PUT",
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Length": str(frame_path.stat().st_size),
+            },
+        )
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+
+
+def render_task(task: dict, args: argparse.Namespace, redis: Redis) -> None:
+    extracted_dir = fetch_project(task, args.api_url, args.work_dir)
+    blender_file_path = get_blender_file_path(extracted_dir)
+
+    job_id = task["job_id"]
+    rendered_dir = (
+        args.work_dir / task["project_id"] / job_id / uuid4().hex / "rendered"
+    )
+    rendered_dir.mkdir(parents=True)
+
+    logger = setup_logger(
+        name=job_id,
+        filename=f"{job_id}.log",
+        log_dir="render_jobs",
+        log_format="%(asctime)s %(levelname)s %(message)s",
+    )
+    if not task["job_total_frames"]:
+        clear_progress(job_id, redis)
+
+    try:
+        status = render_blender_file(
+            blender_file_path=str(blender_file_path),
+            resolution_x=task["resolution_x"],
+            resolution_y=task["resolution_y"],
+            engine=task["engine"],
+            output_format=task["output_format"],
+            frame_range=list(map(int, task["frame_range"].split(","))),
+            rendered_dir=rendered_dir,
+            logger=logger,
+            job_id=job_id,
+            redis=redis,
+            threads=args.threads,
+            job_total_frames=task["job_total_frames"],
+            # The API records frames once they are uploaded.
+            record_results=False,
+            # Tasks queued before quality profiles existed.
+            quality=task.get("quality", "FINAL"),
+        )
+        if "FINISHED" not in status:
+            raise RuntimeError(f"Render status: {status}")
+
+        for frame_path in sorted(rendered_dir.iterdir()):
+            upload_frame(args.api_url, job_id, frame_path)
+    finally:
+        close_logger(logger)
+        shutil.rmtree(rendered_dir.parent, ignore_errors=True)
+
+
+def process_task(
+    task_id: str,
+    token: str,
+    attempts: int,
+    args: argparse.Namespace,
+    redis: Redis,
+) -> None:
+    event = {"task_id": task_id, "worker_id": args.worker_id}
+
+    payload = redis.get(FARM_TASK_KEY.format(task_id))
+    error = None
+    if payload is None:
+        error = "Task payload not found"
+    elif attempts > FARM_MAX_ATTEMPTS:
+        error = f"Task failed {FARM_MAX_ATTEMPTS} times"
+
+    if error is not None:
+        complete_task(
+            redis,
+            task_id,
+            token,
+            {**event, "event": "failed", "error": error},
+        )
+        service_logger.error(f"{error}, task_id: {task_id}")
+        return
+
+    push_event(redis, {**event, "event": "started"})
+    keeper = LeaseKeeper(redis, task_id, token)
+    keeper.start()
+    try:
+        render_task(json.loads(payload), args, redis)
+        result = {**event, "event": "finished"}
+    except Exception as exc:
+        service_logger.exception(f"Task failed, task_id: {task_id}")
+        result = {**event, "event": "failed", "error": str(exc)}
+    finally:
+        keeper.stop()
+
+    if keeper.lost:
+        service_logger.info(f"Dropping result of task: {task_id}")
+        return
+
+    if result["event"] == "failed" and attempts < FARM_MAX_ATTEMPTS:
+        service_logger.info(f"Releasing task for retry: {task_id}")
+        release_lease(redis, task_id, token)
+        return
+
+    complete_task(redis, task_id, token, result)
+
+
+def main():
+    args = parse_args()
+    redis = get_redis()
+    service_logger.info(f"Farm worker started: {args.worker_id}")
+
+    while True:
+        leased = lease_task(redis)
+        if leased is None:
+            time.sleep(args.poll_interval)
+            continue
+
+        task_id, token, attempts = leased
+        service_logger.info(
+            f"Leased task: {task_id}, attempt: {attempts}, "
+            f"worker: {args.worker_id}"
+        )
+        process_task(task_id, token, attempts, args, redis)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import argparse
+import hashlib
 import json
 import os
+import re
+import sys
 from pathlib import Path
 import logging
 from logging.handlers import RotatingFileHandler
 import time
+from datetime import datetime
+from typing import Iterable
 
 import bpy
 from bpy.app.handlers import persistent
@@ -17,11 +22,92 @@ LOGS_DIR = BASE_DIR / "logs"
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(pathname)s - %(message)s"
 DEFAULT_DATEFMT = "%Y-%m-%d %H:%M:%S"
 REDIS_PROGRESS_KEY = "render_progress:{}"
+REDIS_WORKER_RESULT_KEY = "render_worker_result:{}"
+REDIS_COMPLETED_FRAMES_KEY = "render_completed_frames:{}"
+REDIS_RESULTS_KEY = "render_results:{}"
+REDIS_FRAME_STATS_KEY = "render_frame_stats:{}"
+REDIS_PREVIEW_QUEUE_KEY = "preview_queue"
+REDIS_JOB_EVENTS_CHANNEL = "render_events:{}"
 REDIS_DATA_LIFETIME = 60 * 60 * 24
 load_dotenv(BASE_DIR / ".env")
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
 REDIS_JOBS_DB = os.getenv("REDIS_JOBS_DB")
+# Scene attributes changed by a job, restored before the next job when the
+# warm worker reuses an already opened Blender file.
+SCENE_STATE_PATHS = (
+    "frame_start",
+    "frame_end",
+    "frame_current",
+    "render.resolution_x",
+    "render.resolution_y",
+    "render.engine",
+    "render.filepath",
+    "render.use_overwrite",
+    "render.use_placeholder",
+    "render.threads_mode",
+    "render.threads",
+    "render.image_settings.file_format",
+    "render.resolution_percentage",
+    "render.use_simplify",
+    "render.simplify_subdivision_render",
+    "render.simplify_child_particles_render",
+    "render.simplify_volumes",
+    "cycles.samples",
+    "cycles.use_denoising",
+    "eevee.taa_render_samples",
+)
+# Scene settings of the quality profiles, the final profile keeps the
+# settings saved in the Blender file.
+QUALITY_PROFILES = {
+    "DRAFT": {
+        "render.resolution_percentage": 25,
+        "render.use_simplify": True,
+        "render.simplify_subdivision_render": 0,
+        "render.simplify_child_particles_render": 0.1,
+        "render.simplify_volumes": 0.25,
+        "cycles.samples": 16,
+        "cycles.use_denoising": True,
+        "eevee.taa_render_samples": 4,
+    },
+    "PREVIEW": {
+        "render.resolution_percentage": 50,
+        "render.use_simplify": True,
+        "render.simplify_subdivision_render": 2,
+        "render.simplify_child_particles_render": 0.5,
+        "render.simplify_volumes": 0.5,
+        "cycles.samples": 128,
+        "cycles.use_denoising": True,
+        "eevee.taa_render_samples": 16,
+    },
+    "FINAL": {},
+}
+# The first pass of a progressive render, a draft at the final resolution.
+PROGRESSIVE_DRAFT_SETTINGS = {
+    path: value
+    for path, value in QUALITY_PROFILES["DRAFT"].items()
+    if path != "render.resolution_percentage"
+}
+open_file_state = {}
+FRAME_FILENAME_PATTERN = re.compile(r"^frame_(\d+)\.\w+$")
+# Render stats, e.g. "Mem: 18M | Sample 2/32", "Rendering 4 / 16 samples"
+# and, last for each frame, "Time: 00:05.64 (Saving: 00:01.65)". Blender
+# 4 also reports "Mem:18.00M (Peak 25.00M)".
+MEMORY_PATTERN = re.compile(r"(?:Mem: ?|Peak )([\d.]+)M")
+SAMPLES_PATTERN = re.compile(r"Sample (\d+)/(\d+)|Rendering (\d+) / (\d+)")
+FRAME_TIME_PATTERN = re.compile(
+    r"^Time: ?([\d:.]+)(?: \(Saving: ([\d:.]+)\))?"
+)
+# EEVEE is "BLENDER_EEVEE_NEXT" in some Blender 4.x releases and
+# "BLENDER_EEVEE" in the others, the API accepts either name.
+# FFmpeg encoders take frames of at least this size with even sides.
+VIDEO_MIN_SIZE = 16
+ENGINE_ALIASES = {
+    "BLENDER_EEVEE_NEXT": "BLENDER_EEVEE",
+    "BLENDER_EEVEE": "BLENDER_EEVEE_NEXT",
+}
+# Taken after bpy is imported, which is most of the process startup.
+STARTED_AT = time.time()
 
 
 def setup_logger(
@@ -79,73 +165,370 @@ def update_progress(
         "total_frames": total_frames,
         "remaining_frames": remaining_frames,
     }
-    redis.set(
+    pipeline = redis.pipeline()
+    pipeline.set(
         REDIS_PROGRESS_KEY.format(job_id),
         json.dumps(progress_message),
         ex=REDIS_DATA_LIFETIME,
     )
+    pipeline.publish(
+        REDIS_JOB_EVENTS_CHANNEL.format(job_id),
+        json.dumps(
+            {
+                "event": "progress",
+                "job_id": job_id,
+                "render_progress": progress_message,
+            }
+        ),
+    )
+    pipeline.execute()
+
+
+def count_completed_frame(job_id: str, frame: int, redis: Redis) -> int:
+    """
+    Count a written frame across all chunks of the job.
+
+    Frames are kept in a set, so a retried chunk or farm batch writing a
+    frame again does not count it twice.
+    """
+    key = REDIS_COMPLETED_FRAMES_KEY.format(job_id)
+    pipeline = redis.pipeline()
+    pipeline.sadd(key, frame)
+    pipeline.scard(key)
+    pipeline.expire(key, REDIS_DATA_LIFETIME)
+    return pipeline.execute()[1]
+
+
+def record_result(
+    job_id: str,
+    file_path: Path,
+    redis: Redis,
+    previews: bool = False,
+    draft: bool = False,
+) -> None:
+    """
+    Append a written frame to the job's result manifest and queue its
+    previews.
+
+    A draft frame is replaced by its final render later, the final one is
+    appended again then.
+    """
+    stat = file_path.stat()
+    with open(file_path, "rb") as file:
+        sha256 = hashlib.file_digest(file, "sha256").hexdigest()
+    entry = {
+        "filename": file_path.name,
+        "size": stat.st_size,
+        "sha256": sha256,
+        "timestamp": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+    }
+    if draft:
+        entry["draft"] = True
+    key = REDIS_RESULTS_KEY.format(job_id)
+    pipeline = redis.pipeline()
+    pipeline.rpush(key, json.dumps(entry))
+    pipeline.expire(key, REDIS_DATA_LIFETIME)
+    if previews:
+        pipeline.rpush(
+            REDIS_PREVIEW_QUEUE_KEY, json.dumps([job_id, entry["filename"]])
+        )
+    pipeline.execute()
+
+
+def parse_duration(value: str) -> float:
+    """
+    Return seconds of a Blender duration, e.g. "01:02.50".
+    """
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def update_frame_stats(frame_stats: dict, stats: str) -> None:
+    """
+    Add the figures of a render stats message to the frame's stats.
+    """
+    for match in MEMORY_PATTERN.finditer(stats):
+        frame_stats["peak_memory_mb"] = max(
+            frame_stats.get("peak_memory_mb", 0.0), float(match.group(1))
+        )
+    if match := SAMPLES_PATTERN.search(stats):
+        samples, total_samples = match.group(1, 2)
+        if samples is None:
+            samples, total_samples = match.group(3, 4)
+        # Adaptive sampling reports 0 samples once the frame converged.
+        frame_stats["samples"] = max(
+            frame_stats.get("samples", 0), int(samples)
+        )
+        frame_stats["total_samples"] = int(total_samples)
+    if match := FRAME_TIME_PATTERN.search(stats):
+        frame_time, saving_time = match.groups()
+        saving_seconds = parse_duration(saving_time) if saving_time else 0.0
+        frame_stats["render_seconds"] = round(
+            parse_duration(frame_time) - saving_seconds, 3
+        )
+        frame_stats["saving_seconds"] = saving_seconds
+
+
+def record_frame_stats(
+    job_id: str, frame: int, frame_stats: dict, redis: Redis
+) -> None:
+    """
+    Append the stats of a written frame to the job's stats stream.
+    """
+    fields = {"frame": frame}
+    for name in (
+        "render_seconds",
+        "peak_memory_mb",
+        "samples",
+        "total_samples",
+    ):
+        if name in frame_stats:
+            fields[name] = frame_stats[name]
+    key = REDIS_FRAME_STATS_KEY.format(job_id)
+    pipeline = redis.pipeline()
+    pipeline.xadd(key, fields)
+    pipeline.expire(key, REDIS_DATA_LIFETIME)
+    pipeline.execute()
+
+
+def format_frame_stats(frame: int, frame_stats: dict) -> str:
+    parts = []
+    if "render_seconds" in frame_stats:
+        parts.append(f"Render Time: {frame_stats['render_seconds']:.2f} sec.")
+    if "peak_memory_mb" in frame_stats:
+        parts.append(f"Peak Memory: {frame_stats['peak_memory_mb']:g}M")
+    if "samples" in frame_stats:
+        parts.append(
+            f"Samples: {frame_stats['samples']}/"
+            f"{frame_stats['total_samples']}"
+        )
+    return f"Frame Stats: {frame} - {', '.join(parts)}"
 
 
 def clear_progress(job_id: str, redis: Redis):
-    redis.delete(REDIS_PROGRESS_KEY.format(job_id))
+    redis.delete(
+        REDIS_PROGRESS_KEY.format(job_id),
+        REDIS_COMPLETED_FRAMES_KEY.format(job_id),
+    )
 
 
-def parce_args():
-    service_logger.info("Start parsing arguments")
+def build_parser(job_args_required: bool = True) -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--job-id",
         type=str,
-        required=True,
+        required=job_args_required,
         help="Job ID",
     )
     parser.add_argument(
         "--blender-file-path",
         type=str,
-        required=True,
+        required=job_args_required,
         help="Path to the Blender file to render",
     )
     parser.add_argument(
         "--resolution-x",
         type=int,
-        required=True,
+        required=job_args_required,
         help="Resolution x",
     )
     parser.add_argument(
         "--resolution-y",
         type=int,
-        required=True,
+        required=job_args_required,
         help="Resolution y",
     )
     parser.add_argument(
         "--engine",
         type=str,
-        required=True,
+        required=job_args_required,
         help="Render engine",
     )
     parser.add_argument(
         "--output-format",
         type=str,
-        required=True,
+        required=job_args_required,
         help="Output format",
     )
     parser.add_argument(
         "--frame-range",
         type=str,
-        required=True,
+        required=job_args_required,
         help="Frame or Frames to render",
     )
     parser.add_argument(
         "--output-dir",
         type=Path,
-        required=True,
+        required=job_args_required,
         help="Directory where the rendered files will be saved.",
     )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=0,
+        help="Number of render threads, 0 to auto-detect",
+    )
+    parser.add_argument(
+        "--task-id",
+        type=str,
+        default=None,
+        help="Task ID, defaults to the job ID",
+    )
+    parser.add_argument(
+        "--job-total-frames",
+        type=int,
+        default=0,
+        help="Frames in the whole job when rendering one chunk of it",
+    )
+    parser.add_argument(
+        "--previews",
+        action="store_true",
+        help="Queue previews of the written frames",
+    )
+    parser.add_argument(
+        "--quality",
+        type=str,
+        choices=list(QUALITY_PROFILES),
+        default="FINAL",
+        help="Quality profile",
+    )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        help="Write a quick draft of the frames before the final ones",
+    )
+    parser.add_argument(
+        "--timings-path",
+        type=Path,
+        default=None,
+        help="Write the time spent in each render phase to this JSON file",
+    )
+    return parser
+
+
+def build_encode_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--encode-video",
+        action="store_true",
+        help="Encode rendered frames into a video instead of rendering",
+    )
+    parser.add_argument("--job-id", type=str, required=True, help="Job ID")
+    parser.add_argument(
+        "--frames-dir",
+        type=Path,
+        required=True,
+        help="Directory with the rendered frames",
+    )
+    parser.add_argument(
+        "--output-path",
+        type=Path,
+        required=True,
+        help="Path of the video file",
+    )
+    parser.add_argument(
+        "--video-format",
+        type=str,
+        required=True,
+        help="FFmpeg container format",
+    )
+    parser.add_argument(
+        "--codec", type=str, required=True, help="FFmpeg video codec"
+    )
+    parser.add_argument(
+        "--quality",
+        type=str,
+        required=True,
+        help="FFmpeg constant rate factor preset",
+    )
+    parser.add_argument(
+        "--fps", type=int, required=True, help="Frames per second"
+    )
+    return parser
+
+
+def parce_args():
+    service_logger.info("Start parsing arguments")
+    mode_parser = argparse.ArgumentParser(add_help=False)
+    mode_parser.add_argument("--worker-queue", type=str, default=None)
+    mode_parser.add_argument("--encode-video", action="store_true")
+    mode, _ = mode_parser.parse_known_args()
+
+    if mode.encode_video:
+        args = build_encode_parser().parse_args()
+        args.worker_queue = None
+        service_logger.info(f"Arguments parsed: {args}")
+        return args
+
+    parser = build_parser(job_args_required=mode.worker_queue is None)
+    parser.add_argument(
+        "--worker-queue",
+        type=str,
+        default=None,
+        help="Run as a warm worker taking jobs from this Redis list",
+    )
     args = parser.parse_args()
+    args.encode_video = False
     service_logger.info(f"Arguments parsed: {args}")
     return args
 
 
+def _resolve_attr(obj, path: str):
+    *parents, attr = path.split(".")
+    for parent in parents:
+        obj = getattr(obj, parent)
+    return obj, attr
+
+
+def snapshot_scene_state(
+    scene, paths: Iterable[str] = SCENE_STATE_PATHS
+) -> dict:
+    state = {}
+    for path in paths:
+        obj, attr = _resolve_attr(scene, path)
+        state[path] = getattr(obj, attr)
+    return state
+
+
+def restore_scene_state(scene, state: dict) -> None:
+    for path, value in state.items():
+        obj, attr = _resolve_attr(scene, path)
+        setattr(obj, attr, value)
+
+
+def set_render_engine(scene, engine: str) -> None:
+    try:
+        scene.render.engine = engine
+    except TypeError:
+        if engine not in ENGINE_ALIASES:
+            raise
+        scene.render.engine = ENGINE_ALIASES[engine]
+
+
+def open_blender_file(blender_file_path: str) -> None:
+    """
+    Open the Blender file, reusing it if it is already open and unchanged.
+    """
+    mtime = os.path.getmtime(blender_file_path)
+    if (
+        open_file_state.get("path") == blender_file_path
+        and open_file_state.get("mtime") == mtime
+    ):
+        service_logger.debug("Reuse open Blender file")
+        restore_scene_state(bpy.context.scene, open_file_state["scene"])
+        return
+
+    service_logger.debug("Open Blender file")
+    bpy.ops.wm.open_mainfile(filepath=blender_file_path)
+    open_file_state.update(
+        path=blender_file_path,
+        mtime=mtime,
+        scene=snapshot_scene_state(bpy.context.scene),
+    )
+
+
 def render_blender_file(
     blender_file_path: str,
     resolution_x: int,
@@ -157,8 +540,24 @@ def render_blender_file(
     logger: logging.Logger,
     job_id: str,
     redis: Redis,
+    threads: int = 0,
+    job_total_frames: int = 0,
+    record_results: bool = True,
+    previews: bool = False,
+    quality: str = "FINAL",
+    progressive: bool = False,
+    timings: dict | None = None,
 ) -> None:
+    """
+    Render the frames of the Blender file.
+
+    With `timings`, the seconds spent opening the file and rendering,
+    saving and recording each frame are added to it.
+    """
     filename = blender_file_path.split("/")[-1]
+    draft_pass = False
+    frame_started_at = {}
+    frame_stats = {}
 
     @persistent
     def render_init_handler(scene):
@@ -172,6 +571,7 @@ def render_blender_file(
             f"resolution: {resolution_x}x{resolution_y}, "
             f"engine: {engine}, "
             f"output_format: {output_format}, "
+            f"quality: {'DRAFT PASS' if draft_pass else quality}, "
             f"{frames}"
         )
         logger.info(msg)
@@ -183,14 +583,48 @@ def render_blender_file(
         logger.info(msg)
         service_logger.info(f"Job ID: {job_id} - {msg}")
 
+    @persistent
+    def render_pre_handler(scene):
+        frame_started_at[scene.frame_current] = time.perf_counter()
+
+    @persistent
+    def render_post_handler(scene):
+        # Blender saves the frame before this handler runs.
+        elapsed = time.perf_counter() - frame_started_at[scene.frame_current]
+        timings["frames"][str(scene.frame_current)] = {
+            "render": elapsed - frame_stats.get("saving_seconds", 0.0),
+            "write": frame_stats.get("saving_seconds", 0.0),
+        }
+
     @persistent
     def render_write_handler(scene):
+        write_started_at = time.perf_counter()
         current_frame = scene.frame_current
-        start_frame = scene.frame_start
-        total_frames = scene.frame_end - scene.frame_start + 1
-        completed_frames = current_frame - start_frame + 1
+        if draft_pass:
+            if record_results:
+                frame_path = Path(scene.render.frame_path(frame=current_frame))
+                record_result(job_id, frame_path, redis, previews, draft=True)
+            msg = f"Write Draft Frame: {current_frame}"
+            logger.info(msg)
+            service_logger.info(f"Job ID: {job_id} - {msg}")
+            frame_stats.clear()
+            return
+
+        if job_total_frames:
+            total_frames = job_total_frames
+            completed_frames = count_completed_frame(
+                job_id, current_frame, redis
+            )
+        else:
+            start_frame = scene.frame_start
+            total_frames = scene.frame_end - scene.frame_start + 1
+            completed_frames = current_frame - start_frame + 1
         remaining_frames = total_frames - completed_frames
 
+        if record_results:
+            frame_path = Path(scene.render.frame_path(frame=current_frame))
+            record_result(job_id, frame_path, redis, previews)
+
         update_progress(
             job_id=job_id,
             current_frame=current_frame,
@@ -199,6 +633,8 @@ def render_blender_file(
             redis=redis,
         )
 
+        record_frame_stats(job_id, current_frame, frame_stats, redis)
+
         msg = (
             f"Write Frame: {current_frame} - "
             f"Completed Frames: {completed_frames}/{total_frames}, "
@@ -206,12 +642,17 @@ def render_blender_file(
         )
         logger.info(msg)
         service_logger.info(f"Job ID: {job_id} - {msg}")
+        logger.info(format_frame_stats(current_frame, frame_stats))
+        frame_stats.clear()
+        if timings is not None:
+            timings["frames"][str(current_frame)]["record"] = (
+                time.perf_counter() - write_started_at
+            )
 
     @persistent
     def render_stats_handler(arg):
-        msg = f"Render Stats: {arg}"
-        logger.info(msg)
-        service_logger.info(f"Job ID: {job_id} - {msg}")
+        service_logger.debug(f"Job ID: {job_id} - Render Stats: {arg}")
+        update_frame_stats(frame_stats, arg)
 
     def clear_handlers():
         service_logger.debug("Clear bpy handlers")
@@ -219,6 +660,8 @@ def render_blender_file(
         bpy.app.handlers.render_complete.clear()
         bpy.app.handlers.render_write.clear()
         bpy.app.handlers.render_stats.clear()
+        bpy.app.handlers.render_pre.clear()
+        bpy.app.handlers.render_post.clear()
 
     def add_handlers():
         service_logger.debug("Add bpy handlers")
@@ -226,24 +669,52 @@ def render_blender_file(
         bpy.app.handlers.render_complete.append(render_complete_handler)
         bpy.app.handlers.render_write.append(render_write_handler)
         bpy.app.handlers.render_stats.append(render_stats_handler)
+        if timings is not None:
+            timings.setdefault("frames", {})
+            bpy.app.handlers.render_pre.append(render_pre_handler)
+            bpy.app.handlers.render_post.append(render_post_handler)
 
     clear_handlers()
     add_handlers()
 
-    service_logger.debug("Open Blender file")
-    bpy.ops.wm.open_mainfile(filepath=blender_file_path)
+    opened_at = time.perf_counter()
+    open_blender_file(blender_file_path)
+    if timings is not None:
+        timings["open"] = time.perf_counter() - opened_at
 
     service_logger.debug("Set render settings")
     bpy.context.scene.render.resolution_x = resolution_x
     bpy.context.scene.render.resolution_y = resolution_y
-    bpy.context.scene.render.engine = engine
+    set_render_engine(bpy.context.scene, engine)
     bpy.context.scene.render.image_settings.file_format = output_format
+    restore_scene_state(bpy.context.scene, QUALITY_PROFILES[quality])
+    if threads > 0:
+        service_logger.debug(f"Set render threads: {threads}")
+        bpy.context.scene.render.threads_mode = "FIXED"
+        bpy.context.scene.render.threads = threads
 
     if isinstance(frame_range, list):
         service_logger.debug(f"Set frame range: {frame_range}")
         bpy.context.scene.render.filepath = str(rendered_dir / "frame_")
+        # Keep frames written before an interrupted run of the job.
+        bpy.context.scene.render.use_overwrite = False
+        bpy.context.scene.render.use_placeholder = True
         bpy.context.scene.frame_start = int(frame_range[0])
         bpy.context.scene.frame_end = int(frame_range[-1])
+        if progressive:
+            service_logger.debug("Render draft pass")
+            final_settings = snapshot_scene_state(
+                bpy.context.scene, PROGRESSIVE_DRAFT_SETTINGS
+            )
+            restore_scene_state(bpy.context.scene, PROGRESSIVE_DRAFT_SETTINGS)
+            draft_pass = True
+            status = bpy.ops.render.render(animation=True)
+            draft_pass = False
+            if "FINISHED" not in status:
+                return status
+            restore_scene_state(bpy.context.scene, final_settings)
+            # The final frames replace the drafts.
+            bpy.context.scene.render.use_overwrite = True
         status = bpy.ops.render.render(animation=True)
     elif isinstance(frame_range, int):
         service_logger.debug(f"Set frame range: {frame_range}")
@@ -253,13 +724,160 @@ def render_blender_file(
         bpy.context.scene.frame_set(int(frame_range))
         status = bpy.ops.render.render(write_still=True)
 
-    bpy.ops.wm.quit_blender()
+    return status
+
+
+def find_frame_files(frames_dir: Path) -> list[Path]:
+    """
+    Return the written frames in the dir sorted by frame number.
+    """
+    frames = {}
+    for file_path in frames_dir.iterdir():
+        match = FRAME_FILENAME_PATTERN.match(file_path.name)
+        # Empty files are placeholders of frames never written.
+        if match and file_path.stat().st_size > 0:
+            frames[int(match.group(1))] = file_path
+    return [frames[frame] for frame in sorted(frames)]
+
+
+def video_resolution(width: int, height: int) -> tuple[int, int]:
+    """
+    Return the video size for frames of the given size.
+
+    Small frames are scaled up by a whole factor, odd sides are rounded
+    down to even, the frames are cropped by at most a pixel.
+    """
+    scale = -(-VIDEO_MIN_SIZE // min(width, height))
+    return (width * scale) // 2 * 2, (height * scale) // 2 * 2
+
+
+def encode_video_file(
+    frame_files: list[Path],
+    output_path: Path,
+    video_format: str,
+    codec: str,
+    quality: str,
+    fps: int,
+    logger: logging.Logger,
+    job_id: str,
+    redis: Redis,
+) -> set[str]:
+    """
+    Encode the frames into a video with the sequencer of an empty scene.
 
+    The video is written next to the final path and moved there once
+    complete, so a partial video is never served.
+    """
+    total_frames = len(frame_files)
+
+    @persistent
+    def encode_write_handler(scene):
+        encoded_frames = scene.frame_current - scene.frame_start + 1
+        update_progress(
+            job_id=job_id,
+            current_frame=int(
+                FRAME_FILENAME_PATTERN.match(
+                    frame_files[encoded_frames - 1].name
+                ).group(1)
+            ),
+            total_frames=total_frames,
+            remaining_frames=total_frames - encoded_frames,
+            redis=redis,
+        )
+
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    bpy.app.handlers.render_write.clear()
+    bpy.app.handlers.render_write.append(encode_write_handler)
+
+    scene = bpy.context.scene
+    first_frame = frame_files[0]
+    image = bpy.data.images.load(str(first_frame))
+    width, height = image.size
+    bpy.data.images.remove(image)
+    scene.render.resolution_x, scene.render.resolution_y = video_resolution(
+        width, height
+    )
+    scene.render.resolution_percentage = 100
+
+    sequence_editor = scene.sequence_editor_create()
+    strip = sequence_editor.strips.new_image(
+        name="frames",
+        filepath=str(first_frame),
+        channel=1,
+        frame_start=1,
+        fit_method="FILL",
+    )
+    for frame_file in frame_files[1:]:
+        strip.elements.append(frame_file.name)
+
+    scene.frame_start = 1
+    scene.frame_end = total_frames
+    scene.render.fps = fps
+    scene.render.fps_base = 1
+    scene.render.image_settings.media_type = "VIDEO"
+    scene.render.image_settings.file_format = "FFMPEG"
+    scene.render.ffmpeg.format = video_format
+    scene.render.ffmpeg.codec = codec
+    scene.render.ffmpeg.constant_rate_factor = quality
+    partial_path = output_path.with_name(f".{output_path.name}.part")
+    scene.render.filepath = str(partial_path)
+    scene.render.use_file_extension = False
+
+    msg = (
+        f"Start Encode: {total_frames} frames, format: {video_format}, "
+        f"codec: {codec}, quality: {quality}, fps: {fps}"
+    )
+    logger.info(msg)
+    service_logger.info(f"Job ID: {job_id} - {msg}")
+    status = bpy.ops.render.render(animation=True)
+    if "FINISHED" in status:
+        os.replace(partial_path, output_path)
     return status
 
 
-def main():
-    args = parce_args()
+def run_encode(args: argparse.Namespace, redis: Redis) -> set[str]:
+    logger = setup_logger(
+        name=args.job_id,
+        filename=f"{args.job_id}.log",
+        log_dir="render_jobs",
+        log_format="%(asctime)s %(levelname)s %(message)s",
+    )
+    try:
+        frame_files = find_frame_files(args.frames_dir)
+        if not frame_files:
+            raise FileNotFoundError(f"No frames in {args.frames_dir}")
+
+        clear_progress(args.job_id, redis)
+        start_time = time.time()
+        status = encode_video_file(
+            frame_files=frame_files,
+            output_path=args.output_path,
+            video_format=args.video_format,
+            codec=args.codec,
+            quality=args.quality,
+            fps=args.fps,
+            logger=logger,
+            job_id=args.job_id,
+            redis=redis,
+        )
+        diff_time = round(time.time() - start_time, 2)
+        service_logger.info(
+            f"Encode status: {status}. Encode time: {diff_time} sec. "
+            f"Job ID: {args.job_id}"
+        )
+        logger.info(f"Encode time: {diff_time} sec.")
+        return status
+    finally:
+        close_logger(logger)
+
+
+def close_logger(logger: logging.Logger) -> None:
+    for handler in logger.handlers:
+        handler.close()
+    logger.handlers.clear()
+
+
+def run_render(args: argparse.Namespace, redis: Redis) -> set[str]:
     logger = setup_logger(
         name=args.job_id,
         filename=f"{args.job_id}.log",
@@ -271,32 +889,103 @@ def main():
     frame_range = map(int, frame_range)
     frame_range = list(frame_range)
 
+    if not args.job_total_frames:
+        clear_progress(args.job_id, redis)
+
+    timings = None
+    if args.timings_path is not None:
+        timings = {"started_at": STARTED_AT}
+
+    try:
+        start_time = time.time()
+        status = render_blender_file(
+            blender_file_path=args.blender_file_path,
+            resolution_x=args.resolution_x,
+            resolution_y=args.resolution_y,
+            engine=args.engine,
+            output_format=args.output_format,
+            frame_range=frame_range,
+            rendered_dir=args.output_dir,
+            logger=logger,
+            job_id=args.job_id,
+            redis=redis,
+            threads=args.threads,
+            job_total_frames=args.job_total_frames,
+            previews=args.previews,
+            quality=args.quality,
+            progressive=args.progressive,
+            timings=timings,
+        )
+        end_time = time.time()
+        diff_time = round(end_time - start_time, 2)
+        service_logger.info(
+            f"Render status: {status}. Render time: {diff_time} sec."
+            f"Job ID: {args.job_id}"
+        )
+        logger.info(f"Render time: {diff_time} sec.")
+        if timings is not None:
+            timings["finished_at"] = end_time
+            args.timings_path.write_text(json.dumps(timings))
+        return status
+    finally:
+        close_logger(logger)
+
+
+def run_worker(queue_key: str, redis: Redis) -> None:
+    """
+    Keep bpy loaded and render jobs pushed to the queue one by one.
+
+    Each queue item is a JSON list of the same arguments the one-shot mode
+    takes on the command line. The outcome is pushed to the job's result
+    list, where the service waits for it.
+    """
+    service_logger.info(f"Worker started, queue: {queue_key}")
+    parser = build_parser()
+    while True:
+        _, payload = redis.blpop(queue_key)
+        args = parser.parse_args(json.loads(payload))
+        service_logger.info(f"Worker got task: {args.task_id}")
+
+        result = {"success": False, "error": None}
+        try:
+            status = run_render(args, redis)
+            result["success"] = "FINISHED" in status
+        except Exception as exc:
+            service_logger.exception(f"Job ID: {args.job_id} - {exc}")
+            result["error"] = str(exc)
+
+        result_key = REDIS_WORKER_RESULT_KEY.format(
+            args.task_id or args.job_id
+        )
+        redis.rpush(result_key, json.dumps(result))
+        redis.expire(result_key, REDIS_DATA_LIFETIME)
+
+
+def main() -> int:
+    """
+    Run the render and return the exit code for the service.
+    """
+    args = parce_args()
     redis = get_redis()
-    clear_progress(args.job_id, redis)
-
-    start_time = time.time()
-    status = render_blender_file(
-        blender_file_path=args.blender_file_path,
-        resolution_x=args.resolution_x,
-        resolution_y=args.resolution_y,
-        engine=args.engine,
-        output_format=args.output_format,
-        frame_range=frame_range,
-        rendered_dir=args.output_dir,
-        logger=logger,
-        job_id=args.job_id,
-        redis=redis,
-    )
-    end_time = time.time()
-    diff_time = round(end_time - start_time, 2)
-    service_logger.info(
-        f"Render status: {status}. Render time: {diff_time} sec."
-        f"Job ID: {args.job_id}"
-    )
-    logger.info(f"Render time: {diff_time} sec.")
+
+    if args.worker_queue is not None:
+        run_worker(args.worker_queue, redis)
+        return 0
+
+    try:
+        if args.encode_video:
+            status = run_encode(args, redis)
+        else:
+            status = run_render(args, redis)
+    except Exception as exc:
+        service_logger.exception(f"Job ID: {args.job_id} - {exc}")
+        return 1
+    return 0 if "FINISHED" in status else 1
 
 
 if __name__ == "__main__":
-    main()
-    # No other way to stop the process for eevee.
-    raise KeyboardInterrupt
+    exit_code = main()
+    logging.shutdown()
+    sys.stdout.flush()
+    # Blender does not always exit on its own, e.g. after eevee renders.
+    os._exit(exit_code)
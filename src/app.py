@@ -1,18 +1,80 @@
-from contextlib import asynccontextmanager
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+from prometheus_client import CONTENT_TYPE_LATEST
+
 from src.core.config import config
+from src.core.metrics import RequestMetricsMiddleware, generate_metrics
+from src.core.redis import async_jobs_pool
 from src.blender_service.router import project_router, tasks_router
+from src.blender_service.dispatcher import (
+    dispatch_jobs,
+    consume_farm_events,
+    lead_dispatch,
+    make_frame_previews,
+    watch_stopped_jobs,
+)
+from src.blender_service.metrics import pipeline_registry
+from src.blender_service.pool import RenderPool
+from src.blender_service.previews import previews_enabled
+
+
+def start_background_tasks(
+    render_pool: RenderPool, preview_executor: ProcessPoolExecutor | None
+) -> list[asyncio.Task]:
+    background_tasks = [asyncio.create_task(watch_stopped_jobs(render_pool))]
+    if config.RENDER_MODE == "farm":
+        background_tasks += [
+            asyncio.create_task(consume_farm_events()),
+            # Farm workers render, videos are encoded here.
+            asyncio.create_task(dispatch_jobs(render_pool, encode_only=True)),
+        ]
+    else:
+        background_tasks.append(
+            asyncio.create_task(dispatch_jobs(render_pool))
+        )
+
+    if preview_executor is not None:
+        background_tasks.append(
+            asyncio.create_task(
+                make_frame_previews(preview_executor, config.PREVIEW_WORKERS)
+            )
+        )
+    return background_tasks
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.active_process = None
+    render_pool = RenderPool(
+        size=config.RENDER_WORKERS,
+        threads_per_worker=config.RENDER_THREADS_PER_WORKER,
+    )
+    preview_executor = None
+    if previews_enabled():
+        # Spawned, forking would copy the running event loop and threads.
+        preview_executor = ProcessPoolExecutor(
+            max_workers=config.PREVIEW_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    dispatcher = asyncio.create_task(
+        lead_dispatch(
+            lambda: start_background_tasks(render_pool, preview_executor)
+        )
+    )
     yield
-    app.state.active_process = None
+    dispatcher.cancel()
+    with suppress(asyncio.CancelledError):
+        await dispatcher
+    if preview_executor is not None:
+        preview_executor.shutdown(cancel_futures=True)
+    render_pool.shutdown()
+    await async_jobs_pool.disconnect()
 
 
 app = FastAPI(
@@ -35,6 +97,7 @@ app.add_middleware(
     allow_methods=config.CORS_METHODS,
     allow_headers=config.CORS_HEADERS,
 )
+app.add_middleware(RequestMetricsMiddleware)
 app.include_router(api_router)
 app.mount("/media", StaticFiles(directory=config.TEMP_DIR), name="media")
 
@@ -42,3 +105,10 @@ app.mount("/media", StaticFiles(directory=config.TEMP_DIR), name="media")
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(
+        generate_metrics(pipeline_registry), media_type=CONTENT_TYPE_LATEST
+    )
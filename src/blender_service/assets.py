@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO
+from uuid import uuid4
+
+from src.core.config import config
+from .exceptions import ProjectExtractionError
+
+
+ASSET_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def is_safe_path(name: str) -> bool:
+    """
+    Check that a relative project path stays inside the project dir.
+    """
+    path = PurePosixPath(name)
+    return bool(name) and not path.is_absolute() and ".." not in path.parts
+
+
+def parse_asset_manifest(data: str) -> dict[str, str]:
+    """
+    Parse a JSON object mapping project file paths to asset hashes.
+    """
+    manifest = json.loads(data)
+    if not isinstance(manifest, dict):
+        raise ValueError("Asset manifest must be an object")
+    return validate_asset_manifest(manifest)
+
+
+def validate_asset_manifest(manifest: dict[str, str]) -> dict[str, str]:
+    for path, digest in manifest.items():
+        if not is_safe_path(path):
+            raise ValueError(f"Invalid asset path: {path}")
+        if not isinstance(digest, str) or not ASSET_HASH_PATTERN.match(digest):
+            raise ValueError(f"Invalid asset hash for: {path}")
+    return manifest
+
+
+class AssetStore:
+    """
+    Project files stored once by their SHA-256 and hard-linked into projects.
+    """
+
+    root: Path = config.ASSET_STORE_DIR
+
+    @classmethod
+    def path(cls, digest: str) -> Path:
+        return cls.root / digest[:2] / digest
+
+    @classmethod
+    def exists(cls, digest: str) -> bool:
+        return bool(ASSET_HASH_PATTERN.match(digest)) and (
+            cls.path(digest).is_file()
+        )
+
+    @classmethod
+    def missing(cls, digests: list[str]) -> list[str]:
+        return [digest for digest in digests if not cls.exists(digest)]
+
+    @classmethod
+    def add(cls, source: BinaryIO, max_size: int) -> str:
+        """
+        Store the stream content and return its SHA-256.
+
+        Raises ProjectExtractionError when the stream is larger than
+        `max_size`, which catches zip members lying about their size.
+        """
+        tmp_dir = cls.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / uuid4().hex
+
+        sha256 = hashlib.sha256()
+        written = 0
+        try:
+            with open(tmp_path, "wb") as out_file:
+                while chunk := source.read(COPY_CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > max_size:
+                        raise ProjectExtractionError(
+                            "File is larger than declared"
+                        )
+                    sha256.update(chunk)
+                    out_file.write(chunk)
+
+            digest = sha256.hexdigest()
+            asset_path = cls.path(digest)
+            if asset_path.exists():
+                tmp_path.unlink()
+            else:
+                asset_path.parent.mkdir(parents=True, exist_ok=True)
+                # Shared by hard links, must never be modified in place.
+                tmp_path.chmod(0o444)
+                os.replace(tmp_path, asset_path)
+            return digest
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    @classmethod
+    def link(cls, digest: str, target_path: Path) -> None:
+        """
+        Hard link the asset to the target, copying across file systems.
+        """
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        target_path.unlink(missing_ok=True)
+        try:
+            os.link(cls.path(digest), target_path)
+        except OSError:
+            shutil.copyfile(cls.path(digest), target_path)
@@ -6,9 +6,60 @@ class JobErrorMessages(StrEnum):
     JOB_NOT_FOUND = "Job not found."
     JOB_ALREADY_RENDERING = "Job is already rendering."
     JOB_NOT_RENDERING = "Job is not rendering."
+    JOB_STOPPING = "Tasks of the job are still stopping. Try later."
     SERVICE_BUSY = "Service is busy. Try later."
     LOG_FILE_NOT_FOUND = "Log file not found. Try later."
     PROJECT_NOT_FOUND = "Project not found."
+    INVALID_FILENAME = "Invalid file name."
+    PROJECT_NOT_READY = "Project extraction failed."
+    PROJECT_EXTRACTING = "Project is still extracting. Try later."
+    ASSET_NOT_FOUND = "Asset not found."
+    UPLOAD_NOT_FOUND = "Upload session not found."
+    UPLOAD_INCOMPLETE = "Upload is not complete. Missing chunks:"
+    UPLOAD_CHUNK_INVALID = "Invalid chunk index or size."
+    UPLOAD_CHECKSUM_MISMATCH = (
+        "Upload checksum mismatch. Upload the chunks again."
+    )
+    UPLOAD_TOO_LARGE = "Upload is too large."
+    PROJECT_UPLOADING = "Project upload is not finished."
+    PROJECT_EXISTS = "Project is already uploaded."
+    TOO_MANY_JOBS = "Too many jobs to watch."
+    INVALID_CURSOR = "Invalid page cursor."
+    INVALID_FRAMES = "Invalid frames, use ranges like 1-10,15."
+    RESULT_NOT_FOUND = "No rendered frames found."
 
 
+RENDER_SCRIPT = "modules/render/run.py"
+
 REDIS_PROGRESS_KEY = "render_progress:{}"
+REDIS_WORKER_RESULT_KEY = "render_worker_result:{}"
+REDIS_CHUNKS_DONE_KEY = "render_chunks_done:{}"
+REDIS_COMPLETED_FRAMES_KEY = "render_completed_frames:{}"
+REDIS_RESULTS_KEY = "render_results:{}"
+REDIS_PREVIEWS_KEY = "render_previews:{}"
+REDIS_FRAME_STATS_KEY = "render_frame_stats:{}"
+REDIS_FRAME_TIME_HISTORY_KEY = "frame_time_history:{}"
+REDIS_PREVIEW_QUEUE_KEY = "preview_queue"
+REDIS_QUEUE_KEY = "render_queue"
+REDIS_ENCODE_QUEUE_KEY = "encode_queue"
+REDIS_PROCESSING_KEY = "render_processing:{}"
+REDIS_ENCODE_PROCESSING_KEY = "encode_processing:{}"
+REDIS_JOB_EVENTS_CHANNEL = "render_events:{}"
+REDIS_UPLOAD_CHUNKS_KEY = "upload_chunks:{}"
+REDIS_RENDER_PROCESSES_KEY = "render_processes"
+REDIS_DISPATCHER_LOCK_KEY = "render_dispatcher:{}"
+REDIS_JOBS_INDEX_KEY = "jobs_index"
+REDIS_PROJECT_JOBS_KEY = "jobs_index:project:{}"
+REDIS_STATUS_JOBS_KEY = "jobs_index:status:{}"
+
+RENDER_CACHE_USED_KEY = "render_cache_used"
+RENDER_CACHE_FILES_KEY = "render_cache_files"
+RENDER_CACHE_SIZES_KEY = "render_cache_sizes"
+RENDER_CACHE_TOTAL_KEY = "render_cache_total"
+RENDER_CACHE_LOCK_KEY = "render_cache_lock"
+
+FARM_TASKS_KEY = "farm_tasks"
+FARM_TASK_KEY = "farm_task:{}"
+FARM_LEASE_KEY = "farm_lease:{}"
+FARM_ATTEMPTS_KEY = "farm_attempts"
+FARM_EVENTS_KEY = "farm_events"
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import os
+from concurrent.futures import Executor
+from contextlib import suppress
+from typing import Callable
+
+from redis.exceptions import LockError
+from starlette.concurrency import run_in_threadpool
+
+from src.core.config import config
+from src.core.redis import get_async_jobs_redis
+from src.core.logger import setup_logger
+from .schemas import STOPPED_STATUSES, TERMINAL_STATUSES
+from .job_queue import AsyncEncodeQueue, AsyncJobQueue, parse_task_id
+from .pool import RenderPool, RenderSlot
+from .farm import AsyncFarmQueue
+from .service import handle_farm_event
+from .supervisor import HOSTNAME, encode_task, recover_tasks, render_task
+from .utils import AsyncJobManager
+from .previews import PreviewManager, make_previews
+from .constants import REDIS_DISPATCHER_LOCK_KEY, REDIS_JOB_EVENTS_CHANNEL
+
+
+dispatcher_logger = setup_logger(
+    name="dispatcher",
+    filename="dispatcher.log",
+)
+
+
+def is_cancelling() -> bool:
+    task = asyncio.current_task()
+    return task is not None and task.cancelling() > 0
+
+
+async def consume_queue(slot: RenderSlot, encode_only: bool = False) -> None:
+    """
+    Drain the render queue into a single pool slot.
+
+    Each slot runs one task at a time and takes the next one as soon as it
+    frees up, so the pool renders as many tasks at once as it has slots.
+    Video encodes go first, they finish jobs whose frames are already
+    rendered, with `encode_only` the slot takes nothing else. A task stays
+    in the processing list of the host until its outcome is saved, a task
+    cut off by cancellation stays there for `recover_tasks`.
+    """
+    redis = get_async_jobs_redis()
+    while True:
+        try:
+            job_id = await AsyncEncodeQueue.pop(HOSTNAME, redis)
+            if job_id is not None:
+                dispatcher_logger.info(
+                    f"Dispatching encode: {job_id} to slot {slot.index}"
+                )
+                try:
+                    await encode_task(job_id, slot)
+                finally:
+                    if not is_cancelling():
+                        await AsyncEncodeQueue.finish(job_id, HOSTNAME, redis)
+                continue
+
+            task_id = None
+            if not encode_only:
+                task_id = await AsyncJobQueue.pop(HOSTNAME, redis)
+            if task_id is None:
+                await asyncio.sleep(config.RENDER_QUEUE_POLL_INTERVAL)
+                continue
+
+            try:
+                job_id, _ = parse_task_id(task_id)
+                job = await AsyncJobManager.get(job_id, redis)
+                if job is None or job.status in TERMINAL_STATUSES:
+                    dispatcher_logger.info(f"Skipping queued task: {task_id}")
+                    continue
+
+                dispatcher_logger.info(
+                    f"Dispatching task: {task_id} to slot {slot.index}"
+                )
+                await render_task(task_id, slot)
+            finally:
+                if not is_cancelling():
+                    await AsyncJobQueue.finish(task_id, HOSTNAME, redis)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            dispatcher_logger.error(f"Slot {slot.index} error: {exc}")
+            await asyncio.sleep(config.RENDER_QUEUE_POLL_INTERVAL)
+
+
+async def dispatch_jobs(pool: RenderPool, encode_only: bool = False) -> None:
+    """
+    Run the queued tasks in the pool slots.
+
+    With `encode_only` the slots take video encodes only, for the farm
+    mode where farm workers render the frames.
+    """
+    dispatcher_logger.info(
+        f"Dispatcher started with {len(pool.slots)} slot(s)"
+    )
+    try:
+        await recover_tasks()
+        await asyncio.gather(
+            *(consume_queue(slot, encode_only) for slot in pool.slots)
+        )
+    finally:
+        dispatcher_logger.info("Dispatcher stopped")
+
+
+async def watch_stopped_jobs(pool: RenderPool) -> None:
+    """
+    Kill the processes of jobs cancelled or failed in any API process.
+
+    A failed chunk takes down the chunks of its job still rendering.
+    """
+    redis = get_async_jobs_redis()
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.psubscribe(REDIS_JOB_EVENTS_CHANNEL.format("*"))
+            while True:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=config.RENDER_QUEUE_POLL_INTERVAL,
+                )
+                if message is None:
+                    continue
+                event = json.loads(message["data"])
+                if (
+                    event["event"] == "status"
+                    and event["status"] in STOPPED_STATUSES
+                ):
+                    pool.kill(event["job_id"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            dispatcher_logger.error(f"Job event watcher error: {exc}")
+            await asyncio.sleep(config.RENDER_QUEUE_POLL_INTERVAL)
+        finally:
+            await pubsub.aclose()
+
+
+async def cancel_tasks(tasks: list[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+async def lead_dispatch(start_tasks: Callable[[], list[asyncio.Task]]) -> None:
+    """
+    Run the background tasks in one API process per host.
+
+    Gunicorn starts several API processes, each with its own render pool.
+    Only the process holding the dispatcher lock starts the tasks, so the
+    slots are not multiplied. When it dies, another process takes over
+    once the lock expires.
+    """
+    redis = get_async_jobs_redis()
+    lock = redis.lock(
+        REDIS_DISPATCHER_LOCK_KEY.format(HOSTNAME),
+        timeout=config.DISPATCHER_LOCK_TIMEOUT,
+        thread_local=False,
+    )
+    tasks = []
+    try:
+        while True:
+            try:
+                if tasks:
+                    await lock.reacquire()
+                elif await lock.acquire(blocking=False):
+                    dispatcher_logger.info(
+                        f"Dispatcher lock taken, pid: {os.getpid()}"
+                    )
+                    tasks = start_tasks()
+            except LockError as exc:
+                dispatcher_logger.error(f"Dispatcher lock lost: {exc}")
+                await cancel_tasks(tasks)
+                tasks = []
+            except Exception as exc:
+                dispatcher_logger.error(f"Dispatcher lock error: {exc}")
+            await asyncio.sleep(config.DISPATCHER_LOCK_TIMEOUT / 3)
+    finally:
+        await cancel_tasks(tasks)
+        if tasks:
+            with suppress(Exception):
+                await lock.release()
+
+
+async def consume_farm_events() -> None:
+    """
+    Apply events reported by farm workers to their jobs.
+    """
+    redis = get_async_jobs_redis()
+    dispatcher_logger.info("Farm event consumer started")
+    try:
+        while True:
+            try:
+                event = await AsyncFarmQueue.pop_event(redis)
+                if event is None:
+                    await asyncio.sleep(config.FARM_POLL_INTERVAL)
+                    continue
+                await run_in_threadpool(handle_farm_event, event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                dispatcher_logger.error(f"Farm event error: {exc}")
+                await asyncio.sleep(config.FARM_POLL_INTERVAL)
+    finally:
+        dispatcher_logger.info("Farm event consumer stopped")
+
+
+async def consume_previews(executor: Executor) -> None:
+    """
+    Make previews of written frames in the executor, one at a time.
+    """
+    redis = get_async_jobs_redis()
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            item = await PreviewManager.pop(redis)
+            if item is None:
+                await asyncio.sleep(config.RENDER_QUEUE_POLL_INTERVAL)
+                continue
+
+            job_id, filename = item
+            job = await AsyncJobManager.get(job_id, redis)
+            if job is None:
+                continue
+            previews = await loop.run_in_executor(
+                executor,
+                make_previews,
+                job.rendered_dir / filename,
+                job.previews_dir,
+            )
+            await PreviewManager.save(job, filename, previews, redis)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            dispatcher_logger.error(f"Preview error: {exc}")
+
+
+async def make_frame_previews(executor: Executor, workers: int) -> None:
+    dispatcher_logger.info(f"Preview makers started: {workers}")
+    try:
+        await asyncio.gather(
+            *(consume_previews(executor) for _ in range(workers))
+        )
+    finally:
+        dispatcher_logger.info("Preview makers stopped")
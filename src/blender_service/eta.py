@@ -0,0 +1,215 @@
+import hashlib
+import json
+import statistics
+from datetime import datetime
+
+from fastapi import Depends
+from redis import Redis
+from redis import asyncio as aioredis
+
+from src.core.config import config
+from src.core.redis import get_jobs_redis, get_async_jobs_redis
+from .schemas import JobDB, Status, TERMINAL_STATUSES
+from .farm import AnyPipeline
+from .job_queue import task_total_frames
+from .constants import REDIS_FRAME_STATS_KEY, REDIS_FRAME_TIME_HISTORY_KEY
+
+
+def settings_digest(job: JobDB) -> str:
+    """
+    Digest of the project and the settings that change the frame time.
+    """
+    settings = job.render_settings.model_dump(
+        mode="json", exclude={"frame_range", "video", "progressive"}
+    )
+    data = json.dumps([job.project_id, settings], sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def job_frames(job: JobDB) -> int:
+    """
+    Return the number of frames the job renders in its current run.
+    """
+    if job.render_progress is not None:
+        return job.render_progress.total_frames
+    frame_range = job.render_settings.frame_range
+    return task_total_frames(job) or len(frame_range.frames)
+
+
+def completed_frames(job: JobDB) -> int:
+    progress = job.render_progress
+    if progress is None:
+        return 0
+    return progress.total_frames - progress.remaining_frames
+
+
+def stamp_timings(job: JobDB) -> None:
+    """
+    Stamp the start and end of the job's run.
+    """
+    if job.status == Status.RENDERING and job.started_at is None:
+        job.started_at = datetime.now()
+    if job.status in TERMINAL_STATUSES and job.finished_at is None:
+        job.finished_at = datetime.now()
+
+
+def add_estimate_commands(pipeline: AnyPipeline, jobs: list[JobDB]) -> None:
+    """
+    Queue the reads estimates of the jobs are made from: the last frames
+    written in the current run and the frame time history.
+    """
+    for job in jobs:
+        start = "-"
+        if job.started_at is not None:
+            start = int(job.started_at.timestamp() * 1000)
+        pipeline.xrevrange(
+            REDIS_FRAME_STATS_KEY.format(job.job_id),
+            min=start,
+            count=config.ETA_FRAME_WINDOW,
+        )
+        pipeline.lrange(
+            REDIS_FRAME_TIME_HISTORY_KEY.format(settings_digest(job)), 0, -1
+        )
+
+
+def entry_time(entry_id: str) -> float:
+    milliseconds, _, _ = entry_id.partition("-")
+    return int(milliseconds) / 1000
+
+
+# Frames written closer together come from processes rendering in parallel.
+MIN_FRAME_GAP = 0.05
+
+
+def seconds_per_frame(
+    job: JobDB,
+    frame_times: list[float],
+    history: list[float],
+    now: float,
+) -> float | None:
+    """
+    Return the wall time per frame of the job.
+
+    The last frames written in the current run give the time between
+    them, so the rate follows scenes getting heavier or lighter. Until
+    there are two, completed jobs with the same project and settings are
+    used, and then the time since the start, which includes file loading.
+
+    Chunks rendered in parallel write frames at nearly the same time, so
+    their gaps say nothing about the rate. Those jobs take the time since
+    the start once a frame is done.
+    """
+    done = completed_frames(job)
+    average = None
+    if done > 0 and job.started_at is not None:
+        average = (now - job.started_at.timestamp()) / done
+
+    parallel = job.chunks is not None and len(job.chunks) > 1
+    if parallel and average is not None:
+        return average
+    if not parallel and len(frame_times) > 1:
+        window = (frame_times[0] - frame_times[-1]) / (len(frame_times) - 1)
+        if window >= MIN_FRAME_GAP:
+            return window
+    if history:
+        return statistics.median(history)
+    return average
+
+
+def apply_estimates(jobs: list[JobDB], results: list) -> None:
+    """
+    Set elapsed time, ETA and frame rate of the jobs from the results of
+    `add_estimate_commands`.
+    """
+    now = datetime.now().timestamp()
+    for job, entries, history in zip(jobs, results[::2], results[1::2]):
+        # Newest first.
+        frame_times = [entry_time(entry_id) for entry_id, _ in entries]
+        spf = seconds_per_frame(
+            job, frame_times, [float(value) for value in history], now
+        )
+        if job.started_at is not None:
+            job.elapsed = round(now - job.started_at.timestamp(), 1)
+        if not spf:
+            continue
+
+        # The frame being rendered is partly done.
+        since = now
+        if frame_times:
+            since = frame_times[0]
+        elif job.started_at is not None:
+            since = job.started_at.timestamp()
+        remaining = job_frames(job) - completed_frames(job)
+        job.eta_seconds = round(max(remaining * spf - (now - since), 0), 1)
+        job.frames_per_minute = round(60 / spf, 2)
+
+
+def set_finished_timings(job: JobDB) -> None:
+    """
+    Set elapsed time and the average frame rate of a finished job.
+    """
+    if job.started_at is None or job.finished_at is None:
+        return
+    job.elapsed = round((job.finished_at - job.started_at).total_seconds(), 1)
+    if job.elapsed > 0 and (done := completed_frames(job)):
+        job.frames_per_minute = round(done * 60 / job.elapsed, 2)
+
+
+def unfinished_jobs(jobs: list[JobDB | None]) -> list[JobDB]:
+    """
+    Set the timings of finished jobs and return the jobs to estimate.
+    """
+    unfinished = []
+    for job in jobs:
+        if job is None or job.render_settings is None:
+            continue
+        if job.status in TERMINAL_STATUSES:
+            set_finished_timings(job)
+        else:
+            unfinished.append(job)
+    return unfinished
+
+
+class FrameTimeHistory:
+    """
+    Frame times of finished runs by project and settings.
+    """
+
+    @classmethod
+    def record(
+        cls, job: JobDB, redis: Redis = Depends(get_jobs_redis)
+    ) -> None:
+        """
+        Record the frame time of a run once all of its frames are rendered.
+
+        Video encoding comes after, so it does not count into the time.
+        """
+        if job.started_at is None or job.render_progress is None:
+            return
+        seconds = (datetime.now() - job.started_at).total_seconds()
+        key = REDIS_FRAME_TIME_HISTORY_KEY.format(settings_digest(job))
+        pipeline = redis.pipeline()
+        pipeline.lpush(key, seconds / job_frames(job))
+        pipeline.ltrim(key, 0, config.FRAME_TIME_HISTORY_SIZE - 1)
+        pipeline.expire(key, config.REDIS_DATA_LIFETIME)
+        pipeline.execute()
+
+
+class AsyncJobEstimates:
+    """
+    Timings and estimates of jobs for request handlers.
+
+    Only responses showing jobs to clients fill them in, the reads of the
+    service itself skip the extra round trip.
+    """
+
+    @classmethod
+    async def apply(
+        cls,
+        jobs: list[JobDB | None],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        if unfinished := unfinished_jobs(jobs):
+            pipeline = redis.pipeline(transaction=False)
+            add_estimate_commands(pipeline, unfinished)
+            apply_estimates(unfinished, await pipeline.execute())
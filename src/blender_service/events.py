@@ -0,0 +1,73 @@
+import json
+from typing import AsyncGenerator
+
+from src.core.config import config
+from src.core.redis import get_async_jobs_redis
+from .schemas import TERMINAL_STATUSES
+from .constants import REDIS_JOB_EVENTS_CHANNEL
+from .utils import AsyncJobManager
+
+
+def format_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def stream_job_events(
+    job_ids: list[str],
+) -> AsyncGenerator[str, None]:
+    """
+    Relay progress and status changes of jobs as server-sent events.
+
+    Starts with the current state of every job and ends once all of them
+    reach a terminal status. Without job ids, relays the events of all
+    jobs until the client disconnects.
+    """
+    redis = get_async_jobs_redis()
+    pubsub = redis.pubsub()
+    if job_ids:
+        await pubsub.subscribe(
+            *(REDIS_JOB_EVENTS_CHANNEL.format(job_id) for job_id in job_ids)
+        )
+    else:
+        await pubsub.psubscribe(REDIS_JOB_EVENTS_CHANNEL.format("*"))
+
+    try:
+        # Read the state after subscribing, so no change falls in between.
+        active_jobs = set()
+        jobs = await AsyncJobManager.get_many(job_ids, redis)
+        for job_id, job in zip(job_ids, jobs):
+            if job is None:
+                continue
+            state = job.model_dump(
+                mode="json",
+                include={
+                    "job_id",
+                    "status",
+                    "render_progress",
+                    "queue_position",
+                },
+            )
+            yield format_event(
+                "status", json.dumps({"event": "status", **state})
+            )
+            if job.status not in TERMINAL_STATUSES:
+                active_jobs.add(job_id)
+
+        while active_jobs or not job_ids:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=config.EVENTS_HEARTBEAT_INTERVAL,
+            )
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+
+            event = json.loads(message["data"])
+            yield format_event(event["event"], message["data"])
+            if (
+                event["event"] == "status"
+                and event["status"] in TERMINAL_STATUSES
+            ):
+                active_jobs.discard(event["job_id"])
+    finally:
+        await pubsub.aclose()
@@ -4,3 +4,19 @@ class JobNotFoundError(Exception):
     """
 
     pass
+
+
+class ProjectExtractionError(Exception):
+    """
+    Raised when a project zip fails validation or extraction.
+    """
+
+    pass
+
+
+class RenderProcessError(Exception):
+    """
+    Raised when a render process fails, exits early or times out.
+    """
+
+    pass
@@ -0,0 +1,175 @@
+import json
+import time
+
+from fastapi import Depends
+from redis import Redis
+from redis import asyncio as aioredis
+from redis.client import Pipeline
+from redis.asyncio.client import Pipeline as AsyncPipeline
+
+from src.core.config import config
+from src.core.redis import get_jobs_redis, get_async_jobs_redis
+from .schemas import JobDB, ProjectDB
+from .job_queue import (
+    job_task_ids,
+    parse_task_id,
+    task_frame_range,
+    task_total_frames,
+)
+from .constants import (
+    FARM_TASKS_KEY,
+    FARM_TASK_KEY,
+    FARM_LEASE_KEY,
+    FARM_ATTEMPTS_KEY,
+    FARM_EVENTS_KEY,
+)
+
+
+# Commands are only queued here, so both kinds of pipelines work.
+AnyPipeline = Pipeline | AsyncPipeline
+
+
+def add_push_commands(
+    pipeline: AnyPipeline, job: JobDB, project: ProjectDB
+) -> None:
+    now = time.time()
+    for index, task_id in enumerate(job_task_ids(job)):
+        _, chunk = parse_task_id(task_id)
+        payload = {
+            "task_id": task_id,
+            "job_id": job.job_id,
+            "project_id": project.project_id,
+            "project_version": project.content_hash,
+            "resolution_x": job.render_settings.resolution_x,
+            "resolution_y": job.render_settings.resolution_y,
+            "engine": job.render_settings.engine.value,
+            "output_format": job.render_settings.output_format.value,
+            "quality": job.render_settings.quality.value,
+            "frame_range": task_frame_range(job, chunk),
+            "job_total_frames": task_total_frames(job),
+        }
+        pipeline.set(
+            FARM_TASK_KEY.format(task_id),
+            json.dumps(payload),
+            ex=config.REDIS_DATA_LIFETIME,
+        )
+        # Keep the order of chunks within the same timestamp.
+        pipeline.zadd(FARM_TASKS_KEY, {task_id: now + index * 1e-6})
+
+
+def add_remove_commands(pipeline: AnyPipeline, task_ids: list[str]) -> None:
+    pipeline.zrem(FARM_TASKS_KEY, *task_ids)
+    pipeline.hdel(FARM_ATTEMPTS_KEY, *task_ids)
+    for task_id in task_ids:
+        pipeline.delete(
+            FARM_TASK_KEY.format(task_id),
+            FARM_LEASE_KEY.format(task_id),
+        )
+
+
+def add_position_commands(pipeline: AnyPipeline, task_ids: list[str]) -> None:
+    for task_id in task_ids:
+        pipeline.exists(FARM_LEASE_KEY.format(task_id))
+        pipeline.zrank(FARM_TASKS_KEY, task_id)
+
+
+def parse_positions(results: list) -> list[int | None]:
+    """
+    Return 1-based positions of the tasks, None for leased tasks.
+    """
+    return [
+        None if leased or rank is None else rank + 1
+        for leased, rank in zip(results[::2], results[1::2])
+    ]
+
+
+class FarmQueue:
+    """
+    Render tasks leased by farm workers (`modules/render/farm_worker.py`).
+
+    Tasks live in a sorted set scored by the time they become visible.
+    A worker leases a task by moving its score into the future and keeps
+    it there with heartbeats, so a task of a dead worker becomes visible
+    again once its lease expires. Workers report progress as events.
+    """
+
+    @classmethod
+    def remove(
+        cls, task_ids: list[str], redis: Redis = Depends(get_jobs_redis)
+    ) -> int:
+        pipeline = redis.pipeline()
+        add_remove_commands(pipeline, task_ids)
+        return pipeline.execute()[0]
+
+    @classmethod
+    def position(
+        cls, task_id: str, redis: Redis = Depends(get_jobs_redis)
+    ) -> int | None:
+        return cls.positions([task_id], redis)[0]
+
+    @classmethod
+    def positions(
+        cls, task_ids: list[str], redis: Redis = Depends(get_jobs_redis)
+    ) -> list[int | None]:
+        pipeline = redis.pipeline(transaction=False)
+        add_position_commands(pipeline, task_ids)
+        return parse_positions(pipeline.execute())
+
+
+class AsyncFarmQueue:
+    """
+    FarmQueue for request handlers, does not block the event loop.
+    """
+
+    @classmethod
+    async def push(
+        cls,
+        job: JobDB,
+        project: ProjectDB,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> int:
+        """
+        Push the tasks of the job and return the position of the first one.
+        """
+        pipeline = redis.pipeline()
+        add_push_commands(pipeline, job, project)
+        await pipeline.execute()
+        return (await cls.positions(job_task_ids(job)[:1], redis))[0]
+
+    @classmethod
+    async def remove(
+        cls,
+        task_ids: list[str],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> int:
+        pipeline = redis.pipeline()
+        add_remove_commands(pipeline, task_ids)
+        return (await pipeline.execute())[0]
+
+    @classmethod
+    async def positions(
+        cls,
+        task_ids: list[str],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> list[int | None]:
+        pipeline = redis.pipeline(transaction=False)
+        add_position_commands(pipeline, task_ids)
+        return parse_positions(await pipeline.execute())
+
+    @classmethod
+    async def size(
+        cls, redis: aioredis.Redis = Depends(get_async_jobs_redis)
+    ) -> int:
+        """
+        Return the number of tasks waiting for a worker.
+        """
+        return await redis.zcount(FARM_TASKS_KEY, "-inf", time.time())
+
+    @classmethod
+    async def pop_event(
+        cls, redis: aioredis.Redis = Depends(get_async_jobs_redis)
+    ) -> dict | None:
+        event = await redis.lpop(FARM_EVENTS_KEY)
+        if event is None:
+            return None
+        return json.loads(event)
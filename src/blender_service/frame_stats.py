@@ -0,0 +1,103 @@
+import math
+import re
+from datetime import datetime
+
+from fastapi import Depends
+from redis import Redis
+from redis import asyncio as aioredis
+
+from src.core.redis import get_jobs_redis, get_async_jobs_redis
+from src.core.exceptions import BadRequestError
+from .schemas import FrameStats, JobDB, RenderStats
+from .constants import JobErrorMessages, REDIS_FRAME_STATS_KEY
+
+
+STREAM_ID_PATTERN = re.compile(r"^\d+-\d+$")
+
+
+def parse_entry(entry_id: str, fields: dict[str, str]) -> FrameStats:
+    milliseconds, _, _ = entry_id.partition("-")
+    return FrameStats(
+        **fields, timestamp=datetime.fromtimestamp(int(milliseconds) / 1000)
+    )
+
+
+def summarize(records: list[FrameStats]) -> RenderStats | None:
+    """
+    Aggregate the stats, a frame rendered more than once counts once with
+    its last render.
+    """
+    if not records:
+        return None
+    frames = {record.frame: record for record in records}
+    times = sorted(
+        record.render_seconds
+        for record in frames.values()
+        if record.render_seconds is not None
+    )
+    memory = [
+        record.peak_memory_mb
+        for record in frames.values()
+        if record.peak_memory_mb is not None
+    ]
+    return RenderStats(
+        frames=len(frames),
+        avg_frame_seconds=sum(times) / len(times) if times else None,
+        # Nearest rank.
+        p95_frame_seconds=(
+            times[math.ceil(0.95 * len(times)) - 1] if times else None
+        ),
+        max_frame_seconds=times[-1] if times else None,
+        peak_memory_mb=max(memory, default=None),
+    )
+
+
+class FrameStatsLog:
+    """
+    Render time, peak memory and samples of each rendered frame.
+
+    The render script parses Blender's render stats and appends a record
+    per written frame to a Redis stream of the job.
+    """
+
+    @classmethod
+    def summary(
+        cls, job: JobDB, redis: Redis = Depends(get_jobs_redis)
+    ) -> RenderStats | None:
+        entries = redis.xrange(REDIS_FRAME_STATS_KEY.format(job.job_id))
+        return summarize([parse_entry(*entry) for entry in entries])
+
+
+class AsyncFrameStatsLog:
+    @classmethod
+    async def read(
+        cls,
+        job: JobDB,
+        cursor: str | None,
+        limit: int,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> tuple[list[FrameStats], str | None]:
+        """
+        Return the records after the cursor and the cursor of the next page.
+        """
+        if cursor is not None and not STREAM_ID_PATTERN.match(cursor):
+            raise BadRequestError(JobErrorMessages.INVALID_CURSOR.value)
+        entries = await redis.xrange(
+            REDIS_FRAME_STATS_KEY.format(job.job_id),
+            min="-" if cursor is None else f"({cursor}",
+            count=limit + 1,
+        )
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = entries[-1][0]
+        return [parse_entry(*entry) for entry in entries], next_cursor
+
+    @classmethod
+    async def summary(
+        cls,
+        job: JobDB,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> RenderStats | None:
+        entries = await redis.xrange(REDIS_FRAME_STATS_KEY.format(job.job_id))
+        return summarize([parse_entry(*entry) for entry in entries])
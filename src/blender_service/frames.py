@@ -0,0 +1,97 @@
+import re
+from pathlib import Path
+from typing import Iterable
+
+from .schemas import FrameRange
+
+
+FRAME_FILENAME_PATTERN = re.compile(r"^frame_(-?\d+)(\.\w+)$")
+MAX_FRAME_SPEC_RANGE = 1_000_000
+# Trailing bytes of complete files, truncated writes do not have them.
+IMAGE_TRAILERS = {
+    ".png": b"IEND\xaeB`\x82",
+    ".jpg": b"\xff\xd9",
+    ".jpeg": b"\xff\xd9",
+}
+
+
+def frame_filename(frame: int, suffix: str) -> str:
+    """
+    Return the name the render script gives to a rendered frame.
+    """
+    return f"frame_{frame:04d}{suffix}"
+
+
+def parse_frame_filename(filename: str) -> tuple[int, str] | None:
+    match = FRAME_FILENAME_PATTERN.match(filename)
+    if match is None:
+        return None
+    return int(match.group(1)), match.group(2)
+
+
+def is_complete_image(file_path: Path) -> bool:
+    """
+    Check that a frame is not a placeholder or a partially written file.
+    """
+    size = file_path.stat().st_size
+    trailer = IMAGE_TRAILERS.get(file_path.suffix.lower())
+    if size == 0 or trailer is None:
+        return size > 0
+    with open(file_path, "rb") as file:
+        file.seek(max(size - len(trailer), 0))
+        return file.read() == trailer
+
+
+def find_rendered_frames(
+    rendered_dir: Path, only: Iterable[int] | None = None
+) -> dict[int, Path]:
+    """
+    Return the complete frames in the dir and remove the broken ones.
+
+    With `only`, other frames are left alone, they may still be written
+    by other tasks of the job.
+    """
+    frames = {}
+    if not rendered_dir.exists():
+        return frames
+
+    only = None if only is None else set(only)
+    for file_path in rendered_dir.iterdir():
+        parsed = parse_frame_filename(file_path.name)
+        if parsed is None or not file_path.is_file():
+            continue
+        if only is not None and parsed[0] not in only:
+            continue
+        if is_complete_image(file_path):
+            frames[parsed[0]] = file_path
+        else:
+            file_path.unlink()
+    return frames
+
+
+def frame_runs(frames: list[int]) -> list[FrameRange]:
+    """
+    Group sorted frame numbers into ranges of consecutive frames.
+    """
+    runs = []
+    for frame in frames:
+        if runs and runs[-1].end == frame - 1:
+            runs[-1].end = frame
+        else:
+            runs.append(FrameRange(start=frame, end=frame))
+    return runs
+
+
+def parse_frame_spec(spec: str) -> set[int]:
+    """
+    Parse frames like `1-10,15,20-25` into a set of frame numbers.
+    """
+    frames = set()
+    for part in spec.split(","):
+        start, _, end = part.strip().partition("-")
+        start = int(start)
+        end = int(end) if end else start
+        if end < start or end - start >= MAX_FRAME_SPEC_RANGE:
+            raise ValueError(f"Invalid frame range: {part}")
+        frames.update(range(start, end + 1))
+    return frames
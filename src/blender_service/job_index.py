@@ -0,0 +1,128 @@
+import time
+
+from fastapi import Depends
+from redis import asyncio as aioredis
+
+from src.core.config import config
+from src.core.redis import get_async_jobs_redis
+from src.core.exceptions import BadRequestError
+from .schemas import JobDB, Status
+from .farm import AnyPipeline
+from .constants import (
+    JobErrorMessages,
+    REDIS_JOBS_INDEX_KEY,
+    REDIS_PROJECT_JOBS_KEY,
+    REDIS_STATUS_JOBS_KEY,
+)
+
+
+def index_keys(job: JobDB) -> list[str]:
+    return [
+        REDIS_JOBS_INDEX_KEY,
+        REDIS_PROJECT_JOBS_KEY.format(job.project_id),
+        REDIS_STATUS_JOBS_KEY.format(job.status),
+    ]
+
+
+def index_min_score() -> float:
+    """
+    Creation time of the oldest jobs kept in the indexes.
+    """
+    return time.time() - config.REDIS_DATA_LIFETIME
+
+
+def add_index_commands(pipeline: AnyPipeline, job: JobDB) -> None:
+    """
+    Queue the commands indexing the job by creation time.
+
+    A job is in the index of its current status only, the others are
+    cleared since the previous status is not known here. The sets are
+    shared by all jobs and never expire while jobs are saved, so ids of
+    jobs older than the data lifetime are trimmed on every write.
+    """
+    for key in index_keys(job):
+        pipeline.zadd(key, {job.job_id: job.created_at.timestamp()})
+        pipeline.expire(key, config.REDIS_DATA_LIFETIME)
+    for status in Status:
+        if status != job.status:
+            pipeline.zrem(REDIS_STATUS_JOBS_KEY.format(status), job.job_id)
+
+    min_score = f"({index_min_score()}"
+    for key in (
+        REDIS_JOBS_INDEX_KEY,
+        REDIS_PROJECT_JOBS_KEY.format(job.project_id),
+        *(REDIS_STATUS_JOBS_KEY.format(status) for status in Status),
+    ):
+        pipeline.zremrangebyscore(key, "-inf", min_score)
+
+
+def add_unindex_commands(pipeline: AnyPipeline, job: JobDB) -> None:
+    pipeline.zrem(REDIS_JOBS_INDEX_KEY, job.job_id)
+    pipeline.zrem(REDIS_PROJECT_JOBS_KEY.format(job.project_id), job.job_id)
+    for status in Status:
+        pipeline.zrem(REDIS_STATUS_JOBS_KEY.format(status), job.job_id)
+
+
+def make_cursor(job_id: str, score: float) -> str:
+    return f"{score!r}:{job_id}"
+
+
+def parse_cursor(cursor: str) -> tuple[float, str]:
+    score, _, job_id = cursor.partition(":")
+    try:
+        return float(score), job_id
+    except ValueError:
+        raise BadRequestError(JobErrorMessages.INVALID_CURSOR.value)
+
+
+class JobIndex:
+    """
+    Sorted sets of job ids scored by creation time.
+
+    There is one set for all jobs, one per project and one per status, so
+    a listing reads a page of ids and then only the jobs on that page.
+    Ids of jobs created before the data lifetime are trimmed on writes,
+    ids of other expired jobs are dropped when a listing meets them.
+    """
+
+    @classmethod
+    async def page(
+        cls,
+        key: str,
+        limit: int,
+        cursor: str | None = None,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> tuple[list[str], str | None]:
+        """
+        Return ids of the newest jobs after the cursor and the next cursor.
+        """
+        max_score, skip = "+inf", 0
+        if cursor is not None:
+            max_score, after_id = parse_cursor(cursor)
+            # Ids sharing the cursor score come in reverse order, the ones
+            # down to the cursor id were on the previous pages.
+            ties = await redis.zrangebyscore(key, max_score, max_score)
+            skip = sum(1 for job_id in ties if job_id >= after_id)
+
+        items = await redis.zrevrangebyscore(
+            key,
+            max_score,
+            index_min_score(),
+            start=skip,
+            num=limit + 1,
+            withscores=True,
+        )
+        if len(items) <= limit:
+            return [job_id for job_id, _ in items], None
+        items = items[:limit]
+        return [job_id for job_id, _ in items], make_cursor(*items[-1])
+
+    @classmethod
+    async def discard(
+        cls,
+        key: str,
+        job_ids: list[str],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        if job_ids:
+            await redis.zrem(key, *job_ids)
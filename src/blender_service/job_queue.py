@@ -0,0 +1,249 @@
+from fastapi import Depends
+from redis import Redis
+from redis import asyncio as aioredis
+
+from src.core.redis import get_jobs_redis, get_async_jobs_redis
+from .schemas import JobDB, FrameRange, SingleFrame
+from .constants import (
+    REDIS_ENCODE_PROCESSING_KEY,
+    REDIS_ENCODE_QUEUE_KEY,
+    REDIS_PROCESSING_KEY,
+    REDIS_QUEUE_KEY,
+)
+
+
+def make_task_id(job_id: str, chunk: int | None = None) -> str:
+    if chunk is None:
+        return job_id
+    return f"{job_id}:{chunk}"
+
+
+def parse_task_id(task_id: str) -> tuple[str, int | None]:
+    job_id, _, chunk = task_id.partition(":")
+    return job_id, int(chunk) if chunk else None
+
+
+def job_task_ids(job: JobDB) -> list[str]:
+    if not job.chunks:
+        return [make_task_id(job.job_id)]
+    return [make_task_id(job.job_id, i) for i in range(len(job.chunks))]
+
+
+def task_frame_range(job: JobDB, chunk: int | None = None) -> str:
+    """
+    Return the frames of the task in the `--frame-range` format.
+    """
+    if chunk is not None:
+        return f"{job.chunks[chunk].start},{job.chunks[chunk].end}"
+    frame_range = job.render_settings.frame_range
+    if isinstance(frame_range, FrameRange):
+        return f"{frame_range.start},{frame_range.end}"
+    elif isinstance(frame_range, SingleFrame):
+        return str(frame_range.frame)
+
+
+def task_frames(job: JobDB, chunk: int | None = None) -> list[int]:
+    if chunk is not None:
+        return job.chunks[chunk].frames
+    return job.render_settings.frame_range.frames
+
+
+def task_total_frames(job: JobDB) -> int:
+    """
+    Return frames of the whole job for chunked jobs, 0 otherwise.
+    """
+    if not job.chunks:
+        return 0
+    return sum(chunk.total_frames for chunk in job.chunks)
+
+
+async def requeue_processing(
+    queue_key: str, processing_key: str, redis: aioredis.Redis
+) -> list[str]:
+    """
+    Move the taken tasks back to the head of the queue, keeping their order.
+    """
+    task_ids = []
+    while True:
+        task_id = await redis.lmove(processing_key, queue_key, "RIGHT", "LEFT")
+        if task_id is None:
+            return task_ids[::-1]
+        task_ids.append(task_id)
+
+
+def queue_positions(indexes: list[int | None]) -> list[int | None]:
+    return [None if index is None else index + 1 for index in indexes]
+
+
+class JobQueue:
+    """
+    FIFO queue of render tasks waiting for a free render slot.
+
+    A task is a whole job or one chunk of a job's frame range. The queue
+    lives in Redis, so pending tasks survive API restarts.
+    """
+
+    @classmethod
+    def remove(
+        cls, task_ids: list[str], redis: Redis = Depends(get_jobs_redis)
+    ) -> int:
+        pipeline = redis.pipeline()
+        for task_id in task_ids:
+            pipeline.lrem(REDIS_QUEUE_KEY, 0, task_id)
+        return sum(pipeline.execute())
+
+    @classmethod
+    def position(
+        cls, task_id: str, redis: Redis = Depends(get_jobs_redis)
+    ) -> int | None:
+        """
+        Return the 1-based position of the task in the queue.
+        """
+        return cls.positions([task_id], redis)[0]
+
+    @classmethod
+    def positions(
+        cls, task_ids: list[str], redis: Redis = Depends(get_jobs_redis)
+    ) -> list[int | None]:
+        pipeline = redis.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipeline.lpos(REDIS_QUEUE_KEY, task_id)
+        return queue_positions(pipeline.execute())
+
+
+class AsyncJobQueue:
+    """
+    JobQueue for request handlers, does not block the event loop.
+    """
+
+    @classmethod
+    async def push(
+        cls,
+        task_ids: list[str],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> int:
+        """
+        Push tasks and return the 1-based position of the first one.
+        """
+        size = await redis.rpush(REDIS_QUEUE_KEY, *task_ids)
+        return size - len(task_ids) + 1
+
+    @classmethod
+    async def pop(
+        cls,
+        host: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> str | None:
+        """
+        Take the next task, keeping it in the processing list of the host.
+
+        A task stays there until `finish`, so tasks of a dispatcher that
+        died in between are found by `requeue`.
+        """
+        return await redis.lmove(
+            REDIS_QUEUE_KEY, REDIS_PROCESSING_KEY.format(host), "LEFT", "RIGHT"
+        )
+
+    @classmethod
+    async def finish(
+        cls,
+        task_id: str,
+        host: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        await redis.lrem(REDIS_PROCESSING_KEY.format(host), 0, task_id)
+
+    @classmethod
+    async def requeue(
+        cls,
+        host: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> list[str]:
+        return await requeue_processing(
+            REDIS_QUEUE_KEY, REDIS_PROCESSING_KEY.format(host), redis
+        )
+
+    @classmethod
+    async def remove(
+        cls,
+        task_ids: list[str],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> int:
+        pipeline = redis.pipeline()
+        for task_id in task_ids:
+            pipeline.lrem(REDIS_QUEUE_KEY, 0, task_id)
+        return sum(await pipeline.execute())
+
+    @classmethod
+    async def positions(
+        cls,
+        task_ids: list[str],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> list[int | None]:
+        pipeline = redis.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipeline.lpos(REDIS_QUEUE_KEY, task_id)
+        return queue_positions(await pipeline.execute())
+
+    @classmethod
+    async def size(
+        cls, redis: aioredis.Redis = Depends(get_async_jobs_redis)
+    ) -> int:
+        return await redis.llen(REDIS_QUEUE_KEY)
+
+
+class EncodeQueue:
+    """
+    Ids of jobs with all frames rendered, waiting to be encoded into video.
+
+    Encoding takes a render slot too, slots take from this queue before
+    the render queue so finished jobs are not held up by new ones.
+    """
+
+    @classmethod
+    def push(cls, job_id: str, redis: Redis = Depends(get_jobs_redis)) -> None:
+        redis.rpush(REDIS_ENCODE_QUEUE_KEY, job_id)
+
+
+class AsyncEncodeQueue:
+    @classmethod
+    async def push(
+        cls,
+        job_id: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        await redis.rpush(REDIS_ENCODE_QUEUE_KEY, job_id)
+
+    @classmethod
+    async def pop(
+        cls,
+        host: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> str | None:
+        return await redis.lmove(
+            REDIS_ENCODE_QUEUE_KEY,
+            REDIS_ENCODE_PROCESSING_KEY.format(host),
+            "LEFT",
+            "RIGHT",
+        )
+
+    @classmethod
+    async def finish(
+        cls,
+        job_id: str,
+        host: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        await redis.lrem(REDIS_ENCODE_PROCESSING_KEY.format(host), 0, job_id)
+
+    @classmethod
+    async def requeue(
+        cls,
+        host: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> list[str]:
+        return await requeue_processing(
+            REDIS_ENCODE_QUEUE_KEY,
+            REDIS_ENCODE_PROCESSING_KEY.format(host),
+            redis,
+        )
@@ -0,0 +1,92 @@
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+from src.core.config import config
+from src.core.redis import get_jobs_redis
+from .schemas import Status
+from .job_index import index_min_score
+from .constants import (
+    FARM_TASKS_KEY,
+    REDIS_ENCODE_QUEUE_KEY,
+    REDIS_PREVIEW_QUEUE_KEY,
+    REDIS_QUEUE_KEY,
+    REDIS_STATUS_JOBS_KEY,
+)
+
+
+UPLOAD_BYTES = Counter(
+    "render_service_upload_bytes",
+    "Bytes received by upload kind, divide its rate by the upload "
+    "seconds rate for the throughput.",
+    ["kind"],
+)
+UPLOAD_SECONDS = Counter(
+    "render_service_upload_seconds",
+    "Seconds spent receiving uploads by kind.",
+    ["kind"],
+)
+EXTRACTION_DURATION = Histogram(
+    "render_service_extraction_duration_seconds",
+    "Time to extract an uploaded project.",
+    ["status"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+RENDER_PROCESS_EXITS = Counter(
+    "render_service_render_process_exits",
+    "Exited render processes by stage and exit code.",
+    ["stage", "exit_code"],
+)
+
+
+class PipelineCollector:
+    """
+    Read queue depths and job counts from Redis at scrape time.
+
+    The values live in Redis, not in the API processes, so they are
+    reported once no matter how many processes serve the API.
+    """
+
+    def collect(self):
+        queue_depth = GaugeMetricFamily(
+            "render_service_queue_depth",
+            "Tasks waiting in each queue.",
+            labels=["queue"],
+        )
+        jobs = GaugeMetricFamily(
+            "render_service_jobs",
+            "Jobs by status.",
+            labels=["status"],
+        )
+        pipeline = get_jobs_redis().pipeline(transaction=False)
+        pipeline.llen(REDIS_QUEUE_KEY)
+        pipeline.llen(REDIS_ENCODE_QUEUE_KEY)
+        pipeline.llen(REDIS_PREVIEW_QUEUE_KEY)
+        pipeline.zcard(FARM_TASKS_KEY)
+        # Ids of expired jobs stay in the sets until the next trim.
+        min_score = index_min_score()
+        for status in Status:
+            pipeline.zcount(
+                REDIS_STATUS_JOBS_KEY.format(status), min_score, "+inf"
+            )
+        render, encode, preview, farm, *counts = pipeline.execute()
+
+        for queue, depth in (
+            ("render", render),
+            ("encode", encode),
+            ("preview", preview),
+            ("farm", farm),
+        ):
+            queue_depth.add_metric([queue], depth)
+        for status, count in zip(Status, counts):
+            jobs.add_metric([status.value], count)
+        yield queue_depth
+        yield GaugeMetricFamily(
+            "render_service_queue_capacity",
+            "Maximum number of tasks in the render queue.",
+            value=config.RENDER_QUEUE_MAX_SIZE,
+        )
+        yield jobs
+
+
+pipeline_registry = CollectorRegistry()
+pipeline_registry.register(PipelineCollector())
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from asyncio.subprocess import Process
+
+from src.core.logger import setup_logger
+from .job_queue import parse_task_id
+
+
+pool_logger = setup_logger(
+    name="render_pool",
+    filename="render_pool.log",
+)
+
+
+def kill_process(process: Process) -> None:
+    # Raises once the process has exited, even before its returncode is set.
+    with suppress(ProcessLookupError):
+        process.kill()
+
+
+def available_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cpus(cpus: list[int], parts: int) -> list[set[int]]:
+    """
+    Split CPUs into contiguous sets, one per slot.
+
+    When there are more slots than CPUs, slots share CPUs round-robin.
+    """
+    if parts >= len(cpus):
+        return [{cpus[i % len(cpus)]} for i in range(parts)]
+
+    size, extra = divmod(len(cpus), parts)
+    cpu_sets = []
+    start = 0
+    for index in range(parts):
+        end = start + size + (1 if index < extra else 0)
+        cpu_sets.append(set(cpus[start:end]))
+        start = end
+    return cpu_sets
+
+
+class RenderSlot:
+    """
+    One render process slot with its CPU set and thread budget.
+    """
+
+    def __init__(self, index: int, cpus: set[int], threads: int):
+        self.index = index
+        self.cpus = cpus
+        self.threads = threads
+        self.task_id: str | None = None
+        self.process: Process | None = None
+        self.worker: Process | None = None
+        self.worker_queue: str | None = None
+        # Reads the warm worker output into the log of the current job.
+        self.worker_output: asyncio.Task | None = None
+        self.logger: logging.Logger | None = None
+
+    @property
+    def is_busy(self) -> bool:
+        return self.task_id is not None
+
+    @property
+    def job_id(self) -> str | None:
+        if self.task_id is None:
+            return None
+        return parse_task_id(self.task_id)[0]
+
+    def pin(self, process: Process) -> None:
+        """
+        Pin the process to the slot CPUs.
+
+        Must be called right after the process starts, threads spawned
+        later inherit the affinity of the main thread.
+        """
+        if not hasattr(os, "sched_setaffinity"):
+            return
+        try:
+            os.sched_setaffinity(process.pid, self.cpus)
+        except OSError as exc:
+            pool_logger.warning(
+                f"Failed to pin pid {process.pid} to CPUs {self.cpus}: {exc}"
+            )
+
+    def attach(self, task_id: str, process: Process) -> None:
+        self.task_id = task_id
+        self.process = process
+        pool_logger.info(
+            f"Slot {self.index}: task {task_id} started, pid: {process.pid}, "
+            f"cpus: {sorted(self.cpus)}, threads: {self.threads}"
+        )
+
+    def release(self) -> None:
+        pool_logger.info(f"Slot {self.index}: task {self.task_id} released")
+        self.task_id = None
+        self.process = None
+
+    def env(self) -> dict[str, str]:
+        """
+        Environment for the render process limiting native thread pools.
+        """
+        threads = str(self.threads)
+        return {
+            **os.environ,
+            "OMP_NUM_THREADS": threads,
+            "OPENBLAS_NUM_THREADS": threads,
+            "MKL_NUM_THREADS": threads,
+        }
+
+
+class RenderPool:
+    """
+    Fixed set of render slots tracking running processes by job id.
+    """
+
+    def __init__(self, size: int, threads_per_worker: int = 0):
+        cpu_sets = split_cpus(available_cpus(), max(size, 1))
+        self.slots = [
+            RenderSlot(
+                index=index,
+                cpus=cpus,
+                threads=threads_per_worker or len(cpus),
+            )
+            for index, cpus in enumerate(cpu_sets)
+        ]
+
+    @property
+    def running(self) -> dict[str, Process]:
+        return {
+            slot.task_id: slot.process
+            for slot in self.slots
+            if slot.is_busy and slot.process is not None
+        }
+
+    def get_processes(self, job_id: str) -> list[Process]:
+        return [
+            slot.process
+            for slot in self.slots
+            if slot.job_id == job_id and slot.process is not None
+        ]
+
+    def kill(self, job_id: str) -> bool:
+        processes = self.get_processes(job_id)
+        for process in processes:
+            pool_logger.info(f"Killing job {job_id}, pid: {process.pid}")
+            kill_process(process)
+        return bool(processes)
+
+    def shutdown(self) -> None:
+        for slot in self.slots:
+            if slot.worker is not None and slot.worker.returncode is None:
+                pool_logger.info(f"Stopping warm worker, slot: {slot.index}")
+                kill_process(slot.worker)
+            slot.worker = None
@@ -0,0 +1,134 @@
+import json
+import os
+from pathlib import Path
+
+from fastapi import Depends
+from PIL import Image
+from redis.asyncio import Redis
+
+from src.core.config import config
+from src.core.redis import get_async_jobs_redis
+from .schemas import JobDB
+from .farm import AnyPipeline
+from .constants import REDIS_PREVIEW_QUEUE_KEY, REDIS_PREVIEWS_KEY
+
+
+PREVIEW_SUFFIXES = {"WEBP": ".webp", "JPEG": ".jpg"}
+
+
+def previews_enabled() -> bool:
+    return config.PREVIEW_WORKERS > 0 and bool(config.PREVIEW_SIZES)
+
+
+def preview_filename(frame_filename: str, size: int) -> str:
+    stem = Path(frame_filename).stem
+    return f"{stem}_{size}{PREVIEW_SUFFIXES[config.PREVIEW_FORMAT]}"
+
+
+def make_previews(frame_path: Path, previews_dir: Path) -> dict[int, str]:
+    """
+    Write downscaled copies of a frame, one per size in PREVIEW_SIZES.
+
+    Runs in a worker process. Each size is scaled from the previous,
+    bigger one, so the full frame is decoded and scaled only once.
+    Returns preview file names by size.
+    """
+    previews_dir.mkdir(parents=True, exist_ok=True)
+    previews = {}
+    with Image.open(frame_path) as image:
+        image.draft("RGB", (max(config.PREVIEW_SIZES),) * 2)
+        if config.PREVIEW_FORMAT == "JPEG" or image.mode not in (
+            "RGB",
+            "RGBA",
+        ):
+            image = image.convert(
+                "RGB" if config.PREVIEW_FORMAT == "JPEG" else "RGBA"
+            )
+        for size in sorted(config.PREVIEW_SIZES, reverse=True):
+            image.thumbnail((size, size))
+            filename = preview_filename(frame_path.name, size)
+            partial_path = previews_dir / f".{filename}.part"
+            image.save(
+                partial_path,
+                format=config.PREVIEW_FORMAT,
+                quality=config.PREVIEW_QUALITY,
+            )
+            os.replace(partial_path, previews_dir / filename)
+            previews[size] = filename
+    return previews
+
+
+def add_preview_commands(
+    pipeline: AnyPipeline, job_id: str, filenames: list[str]
+) -> None:
+    """
+    Queue previews of written frames, in the same pipeline that adds them
+    to the result manifest.
+    """
+    if previews_enabled() and filenames:
+        pipeline.rpush(
+            REDIS_PREVIEW_QUEUE_KEY,
+            *(json.dumps([job_id, filename]) for filename in filenames),
+        )
+
+
+class PreviewManager:
+    """
+    Previews of rendered frames made in the background for gallery views.
+
+    Frames are queued in Redis as they are written. Previews are written
+    next to the rendered dir and their file names kept in a hash per job.
+    """
+
+    @classmethod
+    async def pop(
+        cls, redis: Redis = Depends(get_async_jobs_redis)
+    ) -> tuple[str, str] | None:
+        item = await redis.lpop(REDIS_PREVIEW_QUEUE_KEY)
+        if item is None:
+            return None
+        job_id, filename = json.loads(item)
+        return job_id, filename
+
+    @classmethod
+    async def save(
+        cls,
+        job: JobDB,
+        filename: str,
+        previews: dict[int, str],
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        key = REDIS_PREVIEWS_KEY.format(job.job_id)
+        pipeline = redis.pipeline()
+        pipeline.hset(key, filename, json.dumps(previews))
+        pipeline.expire(key, config.REDIS_DATA_LIFETIME)
+        await pipeline.execute()
+
+    @classmethod
+    async def get_many(
+        cls,
+        job: JobDB,
+        filenames: list[str],
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> list[dict[int, str]]:
+        """
+        Return preview URLs by size for the frames, empty until made.
+        """
+        if not filenames:
+            return []
+        key = REDIS_PREVIEWS_KEY.format(job.job_id)
+        values = await redis.hmget(key, filenames)
+        return [
+            (
+                {
+                    int(size): (
+                        f"{config.MEDIA_URL}/{job.project_id}/"
+                        f"{job.job_id}/previews/{filename}"
+                    )
+                    for size, filename in json.loads(value).items()
+                }
+                if value
+                else {}
+            )
+            for value in values
+        ]
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from fastapi import Depends
+from redis import Redis
+
+from src.core.config import config
+from src.core.redis import get_jobs_redis
+from src.core.logger import setup_logger
+from .schemas import JobDB, ProjectDB
+from .frames import frame_filename, find_rendered_frames
+from .constants import (
+    RENDER_CACHE_USED_KEY,
+    RENDER_CACHE_FILES_KEY,
+    RENDER_CACHE_SIZES_KEY,
+    RENDER_CACHE_TOTAL_KEY,
+    RENDER_CACHE_LOCK_KEY,
+)
+
+
+cache_logger = setup_logger(
+    name="render_cache",
+    filename="render_cache.log",
+)
+
+
+def frame_cache_key(project: ProjectDB, job: JobDB, frame: int) -> str:
+    """
+    Key of a rendered frame: project content plus normalized settings.
+    """
+    settings = job.render_settings.model_dump(
+        mode="json", exclude={"frame_range", "video", "progressive"}
+    )
+    data = json.dumps([project.content_hash, settings, frame], sort_keys=True)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def link_file(source_path: Path, target_path: Path) -> None:
+    try:
+        os.link(source_path, target_path)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+
+
+class RenderCache:
+    """
+    Rendered frames reused by jobs with the same project and settings.
+
+    Frames are hard-linked between job dirs and the cache dir. Redis keeps
+    the last use of every entry, and the least recently used entries are
+    evicted once the cache grows over `RENDER_CACHE_MAX_SIZE`. Adding and
+    evicting entries takes a Redis lock, so processes finishing jobs at the
+    same time keep the sizes right. Serving takes no lock and falls back to
+    rendering when an entry is evicted under it.
+    """
+
+    root: Path = config.RENDER_CACHE_DIR
+    lock_timeout: int = 60
+
+    @classmethod
+    def enabled(cls, project: ProjectDB) -> bool:
+        return (
+            config.RENDER_CACHE_MAX_SIZE > 0
+            and project.content_hash is not None
+        )
+
+    @classmethod
+    def serve(
+        cls,
+        job: JobDB,
+        project: ProjectDB,
+        redis: Redis = Depends(get_jobs_redis),
+    ) -> bool:
+        """
+        Link all frames of the job from the cache into its rendered dir.
+
+        Return False and link nothing unless every frame is cached.
+        """
+        if not cls.enabled(project):
+            return False
+
+        frames = job.render_settings.frame_range.frames
+        keys = [frame_cache_key(project, job, frame) for frame in frames]
+        paths = redis.hmget(RENDER_CACHE_FILES_KEY, keys)
+        if not all(paths):
+            return False
+
+        job.init_dirs()
+        try:
+            for frame, path in zip(frames, paths):
+                cache_path = cls.root / path
+                filename = frame_filename(frame, cache_path.suffix)
+                link_file(cache_path, job.rendered_dir / filename)
+        except FileNotFoundError:
+            # Evicted in the meantime, the job renders everything again.
+            for file_path in job.rendered_dir.iterdir():
+                file_path.unlink()
+            return False
+
+        # Entries evicted after linking are not brought back.
+        now = time.time()
+        redis.zadd(RENDER_CACHE_USED_KEY, {key: now for key in keys}, xx=True)
+        return True
+
+    @classmethod
+    def store(
+        cls,
+        job: JobDB,
+        project: ProjectDB,
+        redis: Redis = Depends(get_jobs_redis),
+    ) -> None:
+        """
+        Add the frames of a completed job to the cache.
+        """
+        if not cls.enabled(project):
+            return
+
+        frames = find_rendered_frames(job.rendered_dir)
+        with redis.lock(
+            RENDER_CACHE_LOCK_KEY,
+            timeout=cls.lock_timeout,
+            blocking_timeout=cls.lock_timeout,
+        ):
+            now = time.time()
+            for frame, file_path in frames.items():
+                key = frame_cache_key(project, job, frame)
+                path = f"{key[:2]}/{key}{file_path.suffix}"
+                if redis.hsetnx(RENDER_CACHE_FILES_KEY, key, path):
+                    cache_path = cls.root / path
+                    cache_path.parent.mkdir(parents=True, exist_ok=True)
+                    link_file(file_path, cache_path)
+                    size = cache_path.stat().st_size
+                    pipeline = redis.pipeline()
+                    pipeline.hset(RENDER_CACHE_SIZES_KEY, key, size)
+                    pipeline.incrby(RENDER_CACHE_TOTAL_KEY, size)
+                    pipeline.execute()
+                redis.zadd(RENDER_CACHE_USED_KEY, {key: now})
+
+            cls.evict(redis)
+
+    @classmethod
+    def evict(cls, redis: Redis = Depends(get_jobs_redis)) -> None:
+        """
+        Remove the least recently used frames until the cache fits.
+
+        Callers hold the cache lock.
+        """
+        while int(redis.get(RENDER_CACHE_TOTAL_KEY) or 0) > (
+            config.RENDER_CACHE_MAX_SIZE
+        ):
+            popped = redis.zpopmin(RENDER_CACHE_USED_KEY)
+            if not popped:
+                redis.delete(RENDER_CACHE_TOTAL_KEY)
+                break
+
+            key, _ = popped[0]
+            path = redis.hget(RENDER_CACHE_FILES_KEY, key)
+            size = int(redis.hget(RENDER_CACHE_SIZES_KEY, key) or 0)
+            pipeline = redis.pipeline()
+            pipeline.hdel(RENDER_CACHE_FILES_KEY, key)
+            pipeline.hdel(RENDER_CACHE_SIZES_KEY, key)
+            pipeline.decrby(RENDER_CACHE_TOTAL_KEY, size)
+            pipeline.execute()
+            if path is not None:
+                (cls.root / path).unlink(missing_ok=True)
+            cache_logger.info(f"Evicted cached frame: {key}")
@@ -0,0 +1,153 @@
+import json
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from starlette.concurrency import run_in_threadpool
+
+from src.core.config import config
+from src.core.redis import get_async_jobs_redis
+from .schemas import JobDB, RenderResult, TERMINAL_STATUSES
+from .frames import find_rendered_frames, parse_frame_filename
+from .uploads import file_sha256
+from .previews import PreviewManager, add_preview_commands
+from .constants import REDIS_RESULTS_KEY
+
+
+def result_entry(file_path: Path, sha256: str) -> str:
+    stat = file_path.stat()
+    return json.dumps(
+        {
+            "filename": file_path.name,
+            "size": stat.st_size,
+            "sha256": sha256,
+            "timestamp": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+        }
+    )
+
+
+def scan_results(rendered_dir: Path) -> list[str]:
+    """
+    Build manifest entries of the complete frames in the dir.
+    """
+    frames = find_rendered_frames(rendered_dir)
+    return [
+        result_entry(frames[frame], file_sha256(frames[frame]))
+        for frame in sorted(frames)
+    ]
+
+
+class ResultManifest:
+    """
+    Frames of a job in the order they were written.
+
+    The render script appends an entry for every written frame, so the
+    result endpoint does not scan the rendered dir. Clients pass the
+    number of entries they already have as `since` to get only new ones.
+    """
+
+    @classmethod
+    async def append(
+        cls,
+        job: JobDB,
+        file_path: Path,
+        sha256: str,
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        key = REDIS_RESULTS_KEY.format(job.job_id)
+        pipeline = redis.pipeline()
+        pipeline.rpush(key, result_entry(file_path, sha256))
+        pipeline.expire(key, config.REDIS_DATA_LIFETIME)
+        add_preview_commands(pipeline, job.job_id, [file_path.name])
+        await pipeline.execute()
+
+    @classmethod
+    async def entries(
+        cls,
+        job: JobDB,
+        start: int = 0,
+        end: int = -1,
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> list[dict]:
+        """
+        Return the entries from `start` to `end`, both included.
+        """
+        key = REDIS_RESULTS_KEY.format(job.job_id)
+        entries = await redis.lrange(key, start, end)
+        if (
+            not entries
+            and start == 0
+            and job.status in TERMINAL_STATUSES
+            and await cls.rebuild(job, redis)
+        ):
+            entries = await redis.lrange(key, start, end)
+        return [json.loads(entry) for entry in entries]
+
+    @classmethod
+    async def read(
+        cls,
+        job: JobDB,
+        since: int,
+        limit: int,
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> list[RenderResult]:
+        entries = await cls.entries(job, since, since + limit - 1, redis)
+        previews = await PreviewManager.get_many(
+            job, [entry["filename"] for entry in entries], redis
+        )
+        return [
+            RenderResult(
+                **entry,
+                path=(
+                    f"{config.MEDIA_URL}/{job.project_id}/"
+                    f"{job.job_id}/rendered/{entry['filename']}"
+                ),
+                previews=frame_previews,
+            )
+            for entry, frame_previews in zip(entries, previews)
+        ]
+
+    @classmethod
+    async def frames(
+        cls, job: JobDB, redis: Redis = Depends(get_async_jobs_redis)
+    ) -> dict[int, Path]:
+        """
+        Return paths of the written frames by frame number.
+        """
+        frames = {}
+        for entry in await cls.entries(job, redis=redis):
+            if parsed := parse_frame_filename(entry["filename"]):
+                frames[parsed[0]] = job.rendered_dir / entry["filename"]
+        return frames
+
+    @classmethod
+    async def rebuild(
+        cls, job: JobDB, redis: Redis = Depends(get_async_jobs_redis)
+    ) -> bool:
+        """
+        Build the manifest of a finished job from its rendered dir.
+
+        For frames linked from the render cache and jobs rendered before
+        the manifest existed.
+        """
+        entries = await run_in_threadpool(scan_results, job.rendered_dir)
+        if not entries:
+            return False
+
+        # Only the first of concurrent rebuilds is kept.
+        key = REDIS_RESULTS_KEY.format(job.job_id)
+        temp_key = f"{key}:{uuid4().hex}"
+        pipeline = redis.pipeline()
+        pipeline.rpush(temp_key, *entries)
+        pipeline.expire(temp_key, config.REDIS_DATA_LIFETIME)
+        pipeline.renamenx(temp_key, key)
+        pipeline.delete(temp_key)
+        add_preview_commands(
+            pipeline,
+            job.job_id,
+            [json.loads(entry)["filename"] for entry in entries],
+        )
+        await pipeline.execute()
+        return True
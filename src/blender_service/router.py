@@ -1,44 +1,181 @@
+import hashlib
+import time
+from pathlib import Path
+
 from fastapi import (
     APIRouter,
     UploadFile,
     Depends,
     status,
-    BackgroundTasks,
     Request,
+    BackgroundTasks,
+    Form,
+    Query,
 )
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.logger import logger
+from starlette.concurrency import run_in_threadpool
 import aiofiles
 from redis.asyncio import Redis
 
 from src.core.config import config
-from src.core.redis import get_jobs_redis
-from src.core.utils import stream_logs, list_directory_files
-from src.core.exceptions import BadRequestError, NotFoundError
+from src.core.redis import get_jobs_redis, get_async_jobs_redis
+from src.core.utils import stream_logs, stream_zip
+from src.core.exceptions import (
+    BadRequestError,
+    ConflictError,
+    NotFoundError,
+)
 from .schemas import (
     JobRead,
     RenderSettings,
     Status,
+    TERMINAL_STATUSES,
     JobDB,
     RenderResult,
     ProjectDB,
     Project,
+    ProjectStatus,
+    FrameRange,
+    AssetLookup,
+    AssetLookupResult,
+    UploadSession,
+    UploadSessionCreate,
+    UploadSessionRead,
+    JobStatusBatch,
+    JobList,
+    FrameStatsRead,
+)
+from .utils import (
+    AsyncJobManager,
+    AsyncProjectManager,
+    get_async_task_queue,
 )
-from .utils import JobManager, ProjectManager
 from .dependencies import get_job_or_404, get_project_or_404, get_job_or_none
-from .constants import JobErrorMessages
-from .service import render_job
+from .constants import (
+    JobErrorMessages,
+    REDIS_PROGRESS_KEY,
+    REDIS_CHUNKS_DONE_KEY,
+    REDIS_COMPLETED_FRAMES_KEY,
+    REDIS_JOBS_INDEX_KEY,
+    REDIS_PROJECT_JOBS_KEY,
+    REDIS_STATUS_JOBS_KEY,
+)
+from .job_queue import AsyncEncodeQueue, AsyncJobQueue, job_task_ids
+from .job_index import JobIndex
+from .metrics import UPLOAD_BYTES, UPLOAD_SECONDS
+from .farm import AsyncFarmQueue
+from .service import extract_project
+from .supervisor import has_running_tasks
+from .assets import AssetStore, parse_asset_manifest, validate_asset_manifest
+from .uploads import UploadManager, file_sha256
+from .results import ResultManifest
+from .frame_stats import AsyncFrameStatsLog
+from .render_cache import RenderCache
+from .eta import AsyncJobEstimates
+from .frames import find_rendered_frames, frame_runs, parse_frame_spec
+from .events import stream_job_events
 
 
 project_router = APIRouter(prefix="/projects", tags=["Projects"])
 tasks_router = APIRouter(prefix="/tasks", tags=["Tasks"])
 
 
+def check_linked_assets(linked_assets: dict[str, str]) -> None:
+    if missing := AssetStore.missing(list(linked_assets.values())):
+        raise BadRequestError(
+            f"{JobErrorMessages.ASSET_NOT_FOUND.value} {missing}"
+        )
+
+
+async def start_extraction(
+    project: ProjectDB, background_tasks: BackgroundTasks, redis: Redis
+) -> None:
+    project.status = ProjectStatus.EXTRACTING
+    await AsyncProjectManager.save(project, redis)
+    background_tasks.add_task(extract_project, project.project_id)
+
+
+def get_chunk_size() -> int:
+    """
+    Return the frames per render task in the configured render mode.
+    """
+    if config.RENDER_MODE == "farm":
+        return config.FARM_BATCH_SIZE
+    return config.RENDER_CHUNK_SIZE
+
+
+async def enqueue_job(job: JobDB, project: ProjectDB, redis: Redis) -> None:
+    if config.RENDER_MODE == "farm":
+        job.queue_position = await AsyncFarmQueue.push(job, project, redis)
+    else:
+        job.queue_position = await AsyncJobQueue.push(job_task_ids(job), redis)
+
+
+async def finish_job(job: JobDB, redis: Redis) -> None:
+    """
+    Complete a job with all frames in place, or queue its video encode.
+    """
+    if job.render_settings.video is None:
+        job.status = Status.COMPLETED
+        await AsyncJobManager.save(job, redis)
+        return
+    job.status = Status.RENDERING
+    job.video_url = None
+    job.started_at = None
+    job.finished_at = None
+    await AsyncJobManager.save(job, redis)
+    await AsyncEncodeQueue.push(job.job_id, redis)
+
+
+async def list_jobs(
+    key: str, limit: int, cursor: str | None, redis: Redis
+) -> JobList:
+    job_ids, next_cursor = await JobIndex.page(key, limit, cursor, redis)
+    jobs = await AsyncJobManager.get_many(job_ids, redis)
+    await AsyncJobEstimates.apply(jobs, redis)
+    await JobIndex.discard(
+        key,
+        [job_id for job_id, job in zip(job_ids, jobs) if job is None],
+        redis,
+    )
+    return JobList(
+        jobs=[job for job in jobs if job is not None],
+        next_cursor=next_cursor,
+    )
+
+
+def get_upload_or_404(project: ProjectDB, upload_id: str) -> UploadSession:
+    if project.upload is None or project.upload.upload_id != upload_id:
+        raise NotFoundError(JobErrorMessages.UPLOAD_NOT_FOUND.value)
+    return project.upload
+
+
+@project_router.post("/assets/lookup", response_model=AssetLookupResult)
+async def lookup_assets(lookup: AssetLookup):
+    """
+    Return the asset hashes the server does not have yet.
+
+    Files with known hashes can be left out of the project zip and listed
+    in the `asset_manifest` of the upload instead.
+    """
+    return AssetLookupResult(missing=AssetStore.missing(lookup.hashes))
+
+
+@project_router.get("/assets/{digest}")
+async def download_asset(digest: str):
+    if not AssetStore.exists(digest):
+        raise NotFoundError(JobErrorMessages.ASSET_NOT_FOUND.value)
+    return FileResponse(AssetStore.path(digest))
+
+
 @project_router.post("/{project_id}/upload", response_model=Project)
 async def upload_file(
     zip_file: UploadFile,
     project_id: str,
-    redis: Redis = Depends(get_jobs_redis),
+    background_tasks: BackgroundTasks,
+    asset_manifest: str | None = Form(None),
+    redis: Redis = Depends(get_async_jobs_redis),
 ):
     if zip_file.content_type not in [
         "application/zip",
@@ -46,12 +183,25 @@ async def upload_file(
     ] or not zip_file.filename.endswith(".zip"):
         raise BadRequestError(JobErrorMessages.ZIP_FILE_REQUIRED.value)
 
-    project = ProjectDB(project_id=project_id, zip_filename=zip_file.filename)
+    linked_assets = {}
+    if asset_manifest is not None:
+        try:
+            linked_assets = parse_asset_manifest(asset_manifest)
+        except ValueError as exc:
+            raise BadRequestError(str(exc))
+    check_linked_assets(linked_assets)
+
+    project = ProjectDB(
+        project_id=project_id,
+        zip_filename=zip_file.filename,
+        linked_assets=linked_assets,
+    )
     project.create_dirs()
 
     logger.info(
         f"Uploading file: {zip_file.filename} to {project.project_path}"
     )
+    start_time = time.monotonic()
     async with aiofiles.open(project.zip_file_path, "wb") as out_file:
         chunk_size = 1024 * 1024
         while True:
@@ -59,79 +209,559 @@ async def upload_file(
             if not chunk:
                 break
             await out_file.write(chunk)
+            UPLOAD_BYTES.labels("project").inc(len(chunk))
+    UPLOAD_SECONDS.labels("project").inc(time.monotonic() - start_time)
 
     logger.info(f"File uploaded: {zip_file.filename}")
+    await start_extraction(project, background_tasks, redis)
+
+    return project
+
+
+@project_router.post("/{project_id}/uploads", response_model=UploadSessionRead)
+async def create_upload(
+    project_id: str,
+    upload: UploadSessionCreate,
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Start a resumable upload of the project zip.
 
-    ProjectManager.save(project, redis)
+    Send the chunks with `PUT .../chunks/{index}` in any order and in
+    parallel, then finish the upload with `POST .../complete`. The
+    session lives as long as the project data in Redis. Starting a new
+    session of a project still uploading replaces its current session.
+    """
+    existing = await AsyncProjectManager.get(project_id, redis)
+    previous = None
+    if existing is not None:
+        if existing.status in (
+            ProjectStatus.UPLOADED,
+            ProjectStatus.EXTRACTING,
+        ):
+            raise ConflictError(JobErrorMessages.PROJECT_EXTRACTING.value)
+        if existing.status == ProjectStatus.READY:
+            raise ConflictError(JobErrorMessages.PROJECT_EXISTS.value)
+        previous = existing.upload
+
+    if Path(upload.filename).name != upload.filename or (
+        not upload.filename.endswith(".zip")
+    ):
+        raise BadRequestError(JobErrorMessages.ZIP_FILE_REQUIRED.value)
+    if upload.size > config.EXTRACT_MAX_SIZE:
+        raise BadRequestError(JobErrorMessages.UPLOAD_TOO_LARGE.value)
+
+    try:
+        linked_assets = validate_asset_manifest(upload.asset_manifest)
+    except ValueError as exc:
+        raise BadRequestError(str(exc))
+    check_linked_assets(linked_assets)
+
+    chunk_size = min(
+        upload.chunk_size or config.UPLOAD_CHUNK_SIZE,
+        config.UPLOAD_MAX_CHUNK_SIZE,
+    )
+    project = ProjectDB(
+        project_id=project_id,
+        status=ProjectStatus.UPLOADING,
+        zip_filename=upload.filename,
+        linked_assets=linked_assets,
+        upload=UploadSession(
+            filename=upload.filename,
+            size=upload.size,
+            sha256=upload.sha256,
+            chunk_size=chunk_size,
+        ),
+    )
+    await UploadManager.create(project, previous, redis)
+    await AsyncProjectManager.save(project, redis)
+
+    logger.info(
+        f"Upload session {project.upload.upload_id} started: "
+        f"{upload.filename} ({project.upload.total_chunks} chunks)"
+    )
+    return await UploadManager.read(project, redis)
+
+
+@project_router.get(
+    "/{project_id}/uploads/{upload_id}", response_model=UploadSessionRead
+)
+async def get_upload(
+    upload_id: str,
+    project: ProjectDB = Depends(get_project_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Return the upload session with the chunks stored so far.
+    """
+    get_upload_or_404(project, upload_id)
+    return await UploadManager.read(project, redis)
+
+
+@project_router.put(
+    "/{project_id}/uploads/{upload_id}/chunks/{index}",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    project: ProjectDB = Depends(get_project_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Store one chunk of the upload. Sending a chunk again overwrites it.
+    """
+    upload = get_upload_or_404(project, upload_id)
+    if not 0 <= index < upload.total_chunks:
+        raise BadRequestError(JobErrorMessages.UPLOAD_CHUNK_INVALID.value)
+
+    expected_length = upload.chunk_length(index)
+    written = 0
+    start_time = time.monotonic()
+    try:
+        async with aiofiles.open(project.upload_file_path, "r+b") as part_file:
+            await part_file.seek(index * upload.chunk_size)
+            async for chunk in request.stream():
+                written += len(chunk)
+                if written > expected_length:
+                    raise BadRequestError(
+                        JobErrorMessages.UPLOAD_CHUNK_INVALID.value
+                    )
+                await part_file.write(chunk)
+    except FileNotFoundError:
+        # The session was replaced by a new one.
+        raise NotFoundError(JobErrorMessages.UPLOAD_NOT_FOUND.value)
+    UPLOAD_BYTES.labels("chunk").inc(written)
+    UPLOAD_SECONDS.labels("chunk").inc(time.monotonic() - start_time)
+
+    if written != expected_length:
+        raise BadRequestError(JobErrorMessages.UPLOAD_CHUNK_INVALID.value)
+    await UploadManager.mark_received(upload, index, redis)
+
+
+@project_router.post(
+    "/{project_id}/uploads/{upload_id}/complete", response_model=Project
+)
+async def complete_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    project: ProjectDB = Depends(get_project_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Verify the uploaded zip against its SHA-256 and start the extraction.
+    """
+    upload = get_upload_or_404(project, upload_id)
+    if missing := await UploadManager.missing(upload, redis):
+        raise BadRequestError(
+            f"{JobErrorMessages.UPLOAD_INCOMPLETE.value} {missing}"
+        )
+
+    digest = await run_in_threadpool(file_sha256, project.upload_file_path)
+    if digest != upload.sha256:
+        # No way to tell the broken chunk, so all of them are sent again.
+        await UploadManager.reset(upload, redis)
+        raise BadRequestError(JobErrorMessages.UPLOAD_CHECKSUM_MISMATCH.value)
+
+    await UploadManager.finish(project, redis)
+    logger.info(f"File uploaded: {project.zip_filename}")
+    await start_extraction(project, background_tasks, redis)
 
     return project
 
 
+@project_router.get("/{project_id}", response_model=Project)
+async def get_project(project: ProjectDB = Depends(get_project_or_404)):
+    return project
+
+
+@project_router.get("/{project_id}/assets", response_model=dict[str, str])
+async def get_project_assets(project: ProjectDB = Depends(get_project_or_404)):
+    """
+    Return the project files mapped to their asset hashes.
+    """
+    if project.status == ProjectStatus.EXTRACTING:
+        raise BadRequestError(JobErrorMessages.PROJECT_EXTRACTING.value)
+    if project.status != ProjectStatus.READY:
+        raise BadRequestError(JobErrorMessages.PROJECT_NOT_READY.value)
+    return project.assets
+
+
+@project_router.get("/{project_id}/jobs", response_model=JobList)
+async def get_project_jobs(
+    limit: int = Query(50, ge=1, le=config.JOBS_PAGE_MAX_SIZE),
+    cursor: str | None = Query(None),
+    project: ProjectDB = Depends(get_project_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    List jobs of the project, newest first.
+    """
+    return await list_jobs(
+        REDIS_PROJECT_JOBS_KEY.format(project.project_id),
+        limit,
+        cursor,
+        redis,
+    )
+
+
 @tasks_router.post("/{project_id}/start", response_model=JobRead)
-def start_render(
+async def start_render(
     render_settings: RenderSettings,
-    background_tasks: BackgroundTasks,
-    request: Request,
     project: ProjectDB = Depends(get_project_or_404),
-    redis: Redis = Depends(get_jobs_redis),
+    redis: Redis = Depends(get_async_jobs_redis),
 ):
-    if request.app.state.active_process is not None:
+    task_queue = get_async_task_queue()
+    if await task_queue.size(redis) >= config.RENDER_QUEUE_MAX_SIZE:
         raise BadRequestError(JobErrorMessages.SERVICE_BUSY.value)
 
     if not (config.TEMP_DIR / project.project_id).exists():
         raise BadRequestError(JobErrorMessages.PROJECT_NOT_FOUND.value)
 
+    if project.status == ProjectStatus.UPLOADING:
+        raise BadRequestError(JobErrorMessages.PROJECT_UPLOADING.value)
+
+    if project.status == ProjectStatus.FAILED:
+        raise BadRequestError(JobErrorMessages.PROJECT_NOT_READY.value)
+
+    # Farm workers fetch the project by its asset manifest.
+    if task_queue is AsyncFarmQueue and project.status != ProjectStatus.READY:
+        raise BadRequestError(JobErrorMessages.PROJECT_EXTRACTING.value)
+
     job = JobDB(
         project_id=project.project_id,
         render_settings=render_settings,
-        status=Status.RENDERING,
+        status=Status.PENDING,
+    )
+
+    chunk_size = get_chunk_size()
+    frame_range = render_settings.frame_range
+    if (
+        chunk_size > 0
+        and isinstance(frame_range, FrameRange)
+        and frame_range.total_frames > chunk_size
+    ):
+        job.chunks = frame_range.split(chunk_size)
+
+    # Links cached frames into the job dir, so it runs in a thread.
+    if await run_in_threadpool(
+        RenderCache.serve, job, project, get_jobs_redis()
+    ):
+        logger.info(f"Job {job.job_id} served from the render cache")
+        await finish_job(job, redis)
+        return job
+
+    await AsyncJobManager.save(job, redis)
+    await enqueue_job(job, project, redis)
+
+    return job
+
+
+@tasks_router.post("/{job_id}/resume", response_model=JobRead)
+async def resume_render(
+    job: JobDB = Depends(get_job_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Render again only the frames a finished job is missing.
+
+    Frames already written to the rendered dir are kept, placeholders and
+    partially written frames are removed and rendered again.
+    """
+    if job.status not in TERMINAL_STATUSES:
+        raise BadRequestError(JobErrorMessages.JOB_ALREADY_RENDERING.value)
+    # Chunks of a failed job are killed, their frames must not count into
+    # the new run.
+    if await has_running_tasks(job.job_id, redis):
+        raise BadRequestError(JobErrorMessages.JOB_STOPPING.value)
+
+    project = await AsyncProjectManager.get(job.project_id, redis)
+    if project is None:
+        raise BadRequestError(JobErrorMessages.PROJECT_NOT_FOUND.value)
+
+    if await get_async_task_queue().size(redis) >= (
+        config.RENDER_QUEUE_MAX_SIZE
+    ):
+        raise BadRequestError(JobErrorMessages.SERVICE_BUSY.value)
+
+    rendered_frames = await run_in_threadpool(
+        find_rendered_frames, job.rendered_dir
     )
+    missing_frames = [
+        frame
+        for frame in job.render_settings.frame_range.frames
+        if frame not in rendered_frames
+    ]
+    if not missing_frames:
+        await finish_job(job, redis)
+        return job
+
+    job.chunks = None
+    if isinstance(job.render_settings.frame_range, FrameRange):
+        chunk_size = get_chunk_size()
+        job.chunks = []
+        for frame_range in frame_runs(missing_frames):
+            if chunk_size > 0:
+                job.chunks.extend(frame_range.split(chunk_size))
+            else:
+                job.chunks.append(frame_range)
 
-    JobManager.save(job, redis)
+    logger.info(
+        f"Resuming job {job.job_id}: {len(missing_frames)} missing frames"
+    )
+    await redis.delete(
+        REDIS_PROGRESS_KEY.format(job.job_id),
+        REDIS_CHUNKS_DONE_KEY.format(job.job_id),
+        REDIS_COMPLETED_FRAMES_KEY.format(job.job_id),
+    )
+    job.status = Status.PENDING
+    job.render_progress = None
+    job.video_url = None
+    job.render_stats = None
+    job.started_at = None
+    job.finished_at = None
+    await AsyncJobManager.save(job, redis)
+    await enqueue_job(job, project, redis)
 
-    background_tasks.add_task(render_job, job.job_id, request)
     return job
 
 
 @tasks_router.post("/{job_id}/cancel", status_code=status.HTTP_204_NO_CONTENT)
 async def cancel_render(
-    request: Request,
     job: JobDB = Depends(get_job_or_none),
-    redis: Redis = Depends(get_jobs_redis),
+    redis: Redis = Depends(get_async_jobs_redis),
 ):
-    if job is not None and job.status == Status.RENDERING:
-        job.status = Status.CANCELLED
-        JobManager.save(job, redis)
+    """
+    Cancel a pending or rendering job.
 
-    if (active_process := request.app.state.active_process) is None:
+    The API process running the dispatcher kills the job's processes on
+    the status event, farm workers notice the lost lease and drop the task.
+    """
+    if job is None or job.status not in (Status.PENDING, Status.RENDERING):
         raise BadRequestError(JobErrorMessages.JOB_NOT_RENDERING.value)
 
-    active_process.kill()
-    request.app.state.active_process = None
+    await get_async_task_queue().remove(job_task_ids(job), redis)
+    job.status = Status.CANCELLED
+    await AsyncJobManager.save(job, redis)
+
+
+@tasks_router.put(
+    "/{job_id}/frames/{filename}", status_code=status.HTTP_204_NO_CONTENT
+)
+async def upload_frame(
+    filename: str,
+    request: Request,
+    job: JobDB = Depends(get_job_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Store a frame rendered by a farm worker in the job's rendered dir.
+    """
+    if job.status in TERMINAL_STATUSES:
+        raise BadRequestError(JobErrorMessages.JOB_NOT_RENDERING.value)
+
+    if Path(filename).name != filename or filename.startswith("."):
+        raise BadRequestError(JobErrorMessages.INVALID_FILENAME.value)
+
+    job.init_dirs()
+    frame_path = job.rendered_dir / filename
+    partial_path = job.rendered_dir / f".{filename}.part"
+    sha256 = hashlib.sha256()
+    start_time = time.monotonic()
+    async with aiofiles.open(partial_path, "wb") as out_file:
+        async for chunk in request.stream():
+            sha256.update(chunk)
+            await out_file.write(chunk)
+            UPLOAD_BYTES.labels("frame").inc(len(chunk))
+    UPLOAD_SECONDS.labels("frame").inc(time.monotonic() - start_time)
+    partial_path.replace(frame_path)
+    await ResultManifest.append(job, frame_path, sha256.hexdigest(), redis)
+
+
+@tasks_router.get("/events")
+async def job_events(job_id: list[str] = Query([])):
+    """
+    Stream progress and status changes of the jobs as server-sent events.
+
+    Watch several jobs with repeated `job_id` parameters, or all jobs
+    without any. The stream ends when every watched job has finished.
+    """
+    if len(job_id) > config.EVENTS_MAX_JOBS:
+        raise BadRequestError(JobErrorMessages.TOO_MANY_JOBS.value)
+
+    return StreamingResponse(
+        stream_job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @tasks_router.get("/{job_id}/logs")
-async def render_logs(job: JobDB = Depends(get_job_or_404)):
+async def render_logs(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    job: JobDB = Depends(get_job_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Stream the job log until the job finishes.
 
+    Resume from a byte `offset`, or with `Accept: text/event-stream` get
+    server-sent events whose ids are offsets, so reconnecting clients
+    continue from `Last-Event-ID`.
+    """
     log_dir = config.LOGS_DIR / "render_jobs"
     logs_file_path = log_dir / f"{job.job_id}.log"
 
     if not logs_file_path.exists():
         raise NotFoundError(JobErrorMessages.LOG_FILE_NOT_FOUND.value)
 
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    async def is_finished() -> bool:
+        current_job = await AsyncJobManager.get(job.job_id, redis)
+        return current_job is None or current_job.status in TERMINAL_STATUSES
+
+    lines = stream_logs(logs_file_path, offset, is_finished)
+    if "text/event-stream" not in request.headers.get("accept", ""):
+        return StreamingResponse(
+            (line async for _, line in lines),
+            media_type="text/plain",
+        )
+
+    async def log_events():
+        async for line_offset, line in lines:
+            data = line.rstrip("\r\n")
+            yield f"id: {line_offset}\ndata: {data}\n\n"
+        yield "event: end\ndata: \n\n"
+
     return StreamingResponse(
-        stream_logs(logs_file_path),
-        media_type="text/plain",
+        log_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+@tasks_router.get("", response_model=JobList)
+async def get_jobs(
+    job_status: Status | None = Query(None, alias="status"),
+    limit: int = Query(50, ge=1, le=config.JOBS_PAGE_MAX_SIZE),
+    cursor: str | None = Query(None),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    List jobs, newest first, optionally only the ones in a status.
+
+    Pass `next_cursor` of a page as `cursor` to get the next one.
+    """
+    key = REDIS_JOBS_INDEX_KEY
+    if job_status is not None:
+        key = REDIS_STATUS_JOBS_KEY.format(job_status)
+    return await list_jobs(key, limit, cursor, redis)
+
+
+@tasks_router.post("/status:batch", response_model=list[JobRead])
+async def get_render_statuses(
+    batch: JobStatusBatch,
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Return the status of many jobs at once, unknown jobs are left out.
+    """
+    jobs = await AsyncJobManager.get_many(batch.job_ids, redis)
+    await AsyncJobEstimates.apply(jobs, redis)
+    return [job for job in jobs if job is not None]
+
+
 @tasks_router.get("/{job_id}/status", response_model=JobRead)
-async def get_render_status(job: JobDB = Depends(get_job_or_404)):
+async def get_render_status(
+    job: JobDB = Depends(get_job_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    await AsyncJobEstimates.apply([job], redis)
     return job
 
 
 @tasks_router.get("/{job_id}/result", response_model=list[RenderResult])
-async def get_render_result(job: JobDB = Depends(get_job_or_404)):
-    return await list_directory_files(
-        job.rendered_dir, job.job_id, job.project_id
+async def get_render_result(
+    since: int = Query(0, ge=0),
+    limit: int = Query(
+        config.RESULTS_PAGE_MAX_SIZE, ge=1, le=config.RESULTS_PAGE_MAX_SIZE
+    ),
+    job: JobDB = Depends(get_job_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Return the written frames of the job in the order they were written.
+
+    `since` skips the frames a client already has, the next page starts
+    at `since` plus the number of returned frames.
+    """
+    return await ResultManifest.read(job, since, limit, redis)
+
+
+@tasks_router.get("/{job_id}/stats", response_model=FrameStatsRead)
+async def get_render_stats(
+    cursor: str | None = None,
+    limit: int = Query(
+        config.FRAME_STATS_PAGE_MAX_SIZE,
+        ge=1,
+        le=config.FRAME_STATS_PAGE_MAX_SIZE,
+    ),
+    job: JobDB = Depends(get_job_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Return render time, peak memory and samples of each rendered frame,
+    with aggregates over all frames of the job.
+    """
+    frames, next_cursor = await AsyncFrameStatsLog.read(
+        job, cursor, limit, redis
+    )
+    return FrameStatsRead(
+        summary=await AsyncFrameStatsLog.summary(job, redis),
+        frames=frames,
+        next_cursor=next_cursor,
+    )
+
+
+@tasks_router.get("/{job_id}/result/archive")
+async def download_render_result(
+    frames: str | None = Query(None),
+    job: JobDB = Depends(get_job_or_404),
+    redis: Redis = Depends(get_async_jobs_redis),
+):
+    """
+    Download the written frames of the job as a zip streamed on the fly.
+
+    Limit it to some `frames`, given like `1-10,15`.
+    """
+    rendered_frames = await ResultManifest.frames(job, redis)
+    if frames is not None:
+        try:
+            selected = parse_frame_spec(frames)
+        except ValueError:
+            raise BadRequestError(JobErrorMessages.INVALID_FRAMES.value)
+        rendered_frames = {
+            frame: path
+            for frame, path in rendered_frames.items()
+            if frame in selected
+        }
+    if not rendered_frames:
+        raise NotFoundError(JobErrorMessages.RESULT_NOT_FOUND.value)
+
+    files = [
+        (rendered_frames[frame], rendered_frames[frame].name)
+        for frame in sorted(rendered_frames)
+    ]
+    # Sync iterators are consumed in a thread, file reads do not block.
+    return StreamingResponse(
+        stream_zip(files),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{job.job_id}.zip"'
+        },
     )
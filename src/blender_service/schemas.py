@@ -1,10 +1,12 @@
+import hashlib
+import json
 from uuid import uuid4
 from datetime import datetime
 from enum import StrEnum
 from pathlib import Path
 from typing import Union
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 from src.core.config import config
 
@@ -19,6 +21,37 @@ class BlenderEngine(StrEnum):
     EEVEE = "BLENDER_EEVEE_NEXT"
 
 
+class QualityProfile(StrEnum):
+    DRAFT = "DRAFT"
+    PREVIEW = "PREVIEW"
+    FINAL = "FINAL"
+
+
+class VideoCodec(StrEnum):
+    H264 = "H264"
+    H265 = "H265"
+    AV1 = "AV1"
+    VP9 = "WEBM"
+    PRORES = "PRORES"
+
+
+# Container format and file suffix of each codec.
+VIDEO_CONTAINERS = {
+    VideoCodec.H264: ("MPEG4", ".mp4"),
+    VideoCodec.H265: ("MPEG4", ".mp4"),
+    VideoCodec.AV1: ("MPEG4", ".mp4"),
+    VideoCodec.VP9: ("WEBM", ".webm"),
+    VideoCodec.PRORES: ("QUICKTIME", ".mov"),
+}
+
+
+class VideoQuality(StrEnum):
+    LOSSLESS = "LOSSLESS"
+    HIGH = "HIGH"
+    MEDIUM = "MEDIUM"
+    LOW = "LOW"
+
+
 class Status(StrEnum):
     PENDING = "PENDING"
     RENDERING = "RUNNING"
@@ -27,18 +60,79 @@ class Status(StrEnum):
     FAILED = "FAILED"
 
 
+TERMINAL_STATUSES = {Status.COMPLETED, Status.CANCELLED, Status.FAILED}
+# Running processes of jobs in these statuses are killed.
+STOPPED_STATUSES = {Status.CANCELLED, Status.FAILED}
+
+
+class ProjectStatus(StrEnum):
+    UPLOADING = "UPLOADING"
+    UPLOADED = "UPLOADED"
+    EXTRACTING = "EXTRACTING"
+    READY = "READY"
+    FAILED = "FAILED"
+
+
 class RenderResult(BaseModel):
     filename: str
     path: str
     timestamp: datetime
+    size: Union[int, None] = None
+    sha256: Union[str, None] = None
+    # A quick render of the frame, replaced by the final one later.
+    draft: bool = False
+    # Preview URLs by their max width and height.
+    previews: dict[int, str] = Field(default_factory=dict)
 
 
 class Project(BaseModel):
     project_id: str
+    status: ProjectStatus = ProjectStatus.UPLOADED
+    blender_file: Union[str, None] = None
+    error: Union[str, None] = None
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int = Field(gt=0)
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
+    chunk_size: Union[int, None] = Field(default=None, gt=0)
+    asset_manifest: dict[str, str] = {}
+
+
+class UploadSession(BaseModel):
+    upload_id: str = Field(default_factory=lambda: uuid4().hex)
+    filename: str
+    size: int
+    sha256: str
+    chunk_size: int
+
+    @property
+    def total_chunks(self) -> int:
+        return -(-self.size // self.chunk_size)
+
+    def chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+
+class UploadSessionRead(BaseModel):
+    upload_id: str
+    project_id: str
+    filename: str
+    size: int
+    sha256: str
+    chunk_size: int
+    total_chunks: int
+    received_chunks: list[int]
 
 
 class ProjectDB(Project):
     zip_filename: str
+    upload: Union[UploadSession, None] = None
+    # Files taken from the asset store instead of the zip.
+    linked_assets: dict[str, str] = {}
+    # All project files, path to asset hash.
+    assets: dict[str, str] = {}
 
     @property
     def project_path(self) -> Path:
@@ -52,19 +146,72 @@ class ProjectDB(Project):
     def zip_file_path(self) -> Path:
         return self.project_path / self.zip_filename
 
+    @property
+    def content_hash(self) -> Union[str, None]:
+        """
+        Hash of all project files, changes with any file of the project.
+        """
+        if not self.assets:
+            return None
+        return hashlib.sha256(
+            json.dumps(self.assets, sort_keys=True).encode()
+        ).hexdigest()
+
+    @property
+    def upload_file_path(self) -> Path:
+        return self.project_path / f".{self.upload.upload_id}.part"
+
+    @property
+    def blender_file_path(self) -> Union[Path, None]:
+        if self.blender_file is None:
+            return None
+        return self.extracted_dir / self.blender_file
+
     def create_dirs(self) -> None:
         self.project_path.mkdir(parents=True, exist_ok=True)
         self.extracted_dir.mkdir(parents=True, exist_ok=True)
 
 
+class AssetLookup(BaseModel):
+    hashes: list[str]
+
+
+class AssetLookupResult(BaseModel):
+    missing: list[str]
+
+
 class SingleFrame(BaseModel):
     frame: int
 
+    @property
+    def frames(self) -> list[int]:
+        return [self.frame]
+
 
 class FrameRange(BaseModel):
     start: int
     end: int
 
+    @property
+    def total_frames(self) -> int:
+        return self.end - self.start + 1
+
+    @property
+    def frames(self) -> list[int]:
+        return list(range(self.start, self.end + 1))
+
+    def split(self, chunk_size: int) -> list["FrameRange"]:
+        return [
+            FrameRange(start=start, end=min(start + chunk_size - 1, self.end))
+            for start in range(self.start, self.end + 1, chunk_size)
+        ]
+
+
+class VideoSettings(BaseModel):
+    codec: VideoCodec = VideoCodec.H264
+    quality: VideoQuality = VideoQuality.MEDIUM
+    fps: int = Field(24, ge=1, le=240)
+
 
 class RenderSettings(BaseModel):
     frame_range: Union[FrameRange, SingleFrame]
@@ -73,9 +220,24 @@ class RenderSettings(BaseModel):
     # camera_to_render: Union[str, None] = None # TODO: Add camera to render
     output_format: OutputFormat = OutputFormat.PNG
     engine: BlenderEngine = BlenderEngine.EEVEE
+    quality: QualityProfile = QualityProfile.FINAL
+    # Write a quick draft of the frame before the final one.
+    progressive: bool = False
+    # Encode the frames into a video once they are rendered.
+    video: Union[VideoSettings, None] = None
 
     model_config = ConfigDict(from_attributes=True)
 
+    @model_validator(mode="after")
+    def check_video(self) -> "RenderSettings":
+        if self.video is not None and not isinstance(
+            self.frame_range, FrameRange
+        ):
+            raise ValueError("Video needs a frame range")
+        if self.progressive and not isinstance(self.frame_range, SingleFrame):
+            raise ValueError("Progressive render needs a single frame")
+        return self
+
 
 class RenderProgress(BaseModel):
     current_frame: int
@@ -83,6 +245,29 @@ class RenderProgress(BaseModel):
     remaining_frames: int
 
 
+class FrameStats(BaseModel):
+    frame: int
+    timestamp: datetime
+    render_seconds: Union[float, None] = None
+    peak_memory_mb: Union[float, None] = None
+    samples: Union[int, None] = None
+    total_samples: Union[int, None] = None
+
+
+class RenderStats(BaseModel):
+    frames: int
+    avg_frame_seconds: Union[float, None] = None
+    p95_frame_seconds: Union[float, None] = None
+    max_frame_seconds: Union[float, None] = None
+    peak_memory_mb: Union[float, None] = None
+
+
+class FrameStatsRead(BaseModel):
+    summary: Union[RenderStats, None] = None
+    frames: list[FrameStats]
+    next_cursor: Union[str, None] = None
+
+
 class JobBase(BaseModel):
     job_id: str = Field(default_factory=lambda: str(uuid4()))
     project_id: str
@@ -93,13 +278,35 @@ class JobCreate(JobBase):
     render_settings: Union[RenderSettings, None] = None
     status: Status = Status.PENDING
     render_progress: Union[RenderProgress, None] = None
+    queue_position: Union[int, None] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    video_url: Union[str, None] = None
+    # Frame time and memory of the rendered frames, set once they are done.
+    render_stats: Union[RenderStats, None] = None
+    # Set when the job starts rendering and when it ends.
+    started_at: Union[datetime, None] = None
+    finished_at: Union[datetime, None] = None
+    # Estimated on read from frame times, not stored.
+    elapsed: Union[float, None] = None
+    eta_seconds: Union[float, None] = None
+    frames_per_minute: Union[float, None] = None
 
 
 class JobRead(JobCreate):
     pass
 
 
+class JobList(BaseModel):
+    jobs: list[JobRead]
+    next_cursor: Union[str, None] = None
+
+
+class JobStatusBatch(BaseModel):
+    job_ids: list[str] = Field(max_length=1000)
+
+
 class JobDB(JobCreate):
+    chunks: Union[list[FrameRange], None] = None
 
     @property
     def project_path(self) -> Path:
@@ -113,6 +320,15 @@ class JobDB(JobCreate):
     def rendered_dir(self) -> Path:
         return self.job_path / "rendered"
 
+    @property
+    def previews_dir(self) -> Path:
+        return self.job_path / "previews"
+
+    @property
+    def video_file_path(self) -> Path:
+        _, suffix = VIDEO_CONTAINERS[self.render_settings.video.codec]
+        return self.job_path / f"video{suffix}"
+
     @property
     def zip_file_path(self) -> Path:
         return self.project_path / self.zip_filename
@@ -1,18 +1,41 @@
+import logging
+import shutil
+import time
 import zipfile
-from pathlib import Path
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Iterable
 
-from fastapi import Request
+from redis import Redis
 
+from src.core.config import config
 from src.core.redis import get_jobs_redis
 from src.core.logger import setup_logger
-from .exceptions import JobNotFoundError
+from .exceptions import ProjectExtractionError
 from .schemas import (
+    VIDEO_CONTAINERS,
+    JobDB,
+    ProjectStatus,
     Status,
-    FrameRange,
-    SingleFrame,
+    TERMINAL_STATUSES,
 )
-from .utils import JobManager, ProjectManager
+from .utils import JobManager, ProjectManager, get_task_queue
+from .pool import RenderSlot
+from .assets import AssetStore, is_safe_path
+from .render_cache import RenderCache
+from .frame_stats import FrameStatsLog
+from .eta import FrameTimeHistory
+from .metrics import EXTRACTION_DURATION
+from .previews import previews_enabled
+from .job_queue import (
+    EncodeQueue,
+    job_task_ids,
+    make_task_id,
+    parse_task_id,
+    task_frame_range,
+    task_total_frames,
+)
+from .constants import REDIS_CHUNKS_DONE_KEY
 
 
 service_logger = setup_logger(
@@ -21,17 +44,137 @@ service_logger = setup_logger(
 )
 
 
-def unpack_zip(zip_file_path: Path, extracted_dir: Path):
+def get_job_logger(job_id: str) -> logging.Logger:
+    return setup_logger(
+        name=job_id,
+        filename=f"{job_id}.log",
+        log_dir="render_jobs",
+        log_format="%(asctime)s %(levelname)s %(message)s",
+    )
+
+
+def validate_zip_members(
+    zip: zipfile.ZipFile, linked_paths: Iterable[str] = ()
+) -> list[zipfile.ZipInfo]:
+    """
+    Check the zip against size and zip bomb limits before extracting it.
+
+    `linked_paths` are project files taken from the asset store instead of
+    the zip, they count when looking for the Blender file.
+    """
+    members = zip.infolist()
+    if len(members) > config.EXTRACT_MAX_FILES:
+        raise ProjectExtractionError(f"Too many files in zip: {len(members)}")
+
+    total_size = 0
+    paths = set(linked_paths)
+    for member in members:
+        if not is_safe_path(member.filename):
+            raise ProjectExtractionError(
+                f"Invalid path in zip: {member.filename}"
+            )
+
+        if (
+            member.compress_size > 0
+            and member.file_size / member.compress_size
+            > config.EXTRACT_MAX_RATIO
+        ):
+            raise ProjectExtractionError(
+                f"Suspicious compression ratio: {member.filename}"
+            )
+
+        total_size += member.file_size
+        paths.add(member.filename)
+
+    if total_size > config.EXTRACT_MAX_SIZE:
+        raise ProjectExtractionError(
+            f"Extracted size exceeds the limit: {total_size} bytes"
+        )
+
+    blender_files = [
+        path
+        for path in paths
+        if len(PurePosixPath(path).parts) == 1 and path.endswith(".blend")
+    ]
+    if not blender_files:
+        raise ProjectExtractionError("Blender file not found in zip")
+    if len(blender_files) > 1:
+        raise ProjectExtractionError("Multiple Blender files found in zip")
+    return members
+
+
+def _extract_members(
+    zip_file_path: Path, members: list[zipfile.ZipInfo], extracted_dir: Path
+) -> dict[str, str]:
+    assets = {}
+    # ZipFile is not safe to share between threads, each one opens its own.
+    with zipfile.ZipFile(zip_file_path, "r") as zip:
+        for member in members:
+            if member.is_dir():
+                (extracted_dir / member.filename).mkdir(
+                    parents=True, exist_ok=True
+                )
+                continue
+
+            with zip.open(member) as source:
+                try:
+                    digest = AssetStore.add(source, member.file_size)
+                except ProjectExtractionError as exc:
+                    raise ProjectExtractionError(
+                        f"{exc}: {member.filename}"
+                    ) from exc
+            AssetStore.link(digest, extracted_dir / member.filename)
+            assets[member.filename] = digest
+    return assets
+
+
+def unpack_zip(
+    zip_file_path: Path,
+    extracted_dir: Path,
+    linked_assets: dict[str, str] | None = None,
+) -> dict[str, str]:
+    """
+    Extract the zip through the asset store and link extra stored assets.
+
+    Returns the project manifest mapping file paths to asset hashes.
+    """
     service_logger.info(f"Unpack Zip: {zip_file_path}")
     if not zip_file_path.exists():
         raise FileNotFoundError(f"Zip file not found: {zip_file_path}")
 
+    linked_assets = linked_assets or {}
+    if missing := AssetStore.missing(list(linked_assets.values())):
+        raise ProjectExtractionError(f"Assets not found: {missing}")
+
     with zipfile.ZipFile(zip_file_path, "r") as zip:
-        zip.extractall(extracted_dir)
+        members = validate_zip_members(zip, linked_assets)
+
+    # Deal members largest first so the threads get similar amounts of data.
+    members.sort(key=lambda member: member.file_size, reverse=True)
+    workers = max(1, min(config.EXTRACT_WORKERS, len(members)))
+    batches = [members[index::workers] for index in range(workers)]
+
+    extracted_dir.mkdir(parents=True, exist_ok=True)
+    assets = {}
+    for path, digest in linked_assets.items():
+        AssetStore.link(digest, extracted_dir / path)
+        assets[path] = digest
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _extract_members, zip_file_path, batch, extracted_dir
+            )
+            for batch in batches
+        ]
+        for future in futures:
+            assets.update(future.result())
+
     service_logger.info(
         f"Unpack Zip Completed: {zip_file_path}."
         f"Extracted to: {extracted_dir}"
     )
+    return assets
 
 
 def get_blender_file_path(extracted_dir: Path) -> Path:
@@ -52,81 +195,189 @@ def get_blender_file_path(extracted_dir: Path) -> Path:
     return extracted_dir / blender_files[0]
 
 
-def render_job(job_id: str, request: Request):
-    logger = setup_logger(
-        name=job_id,
-        filename=f"{job_id}.log",
-        log_dir="render_jobs",
-        log_format="%(asctime)s %(levelname)s %(message)s",
-    )
+def extract_project(project_id: str) -> None:
+    """
+    Extract an uploaded project and resolve its Blender file.
+    """
     redis = get_jobs_redis()
+    project = ProjectManager.get(project_id, redis)
+    if project is None:
+        service_logger.error(f"Project not found: {project_id}")
+        return
+
+    start_time = time.monotonic()
     try:
-        job = JobManager.get(job_id, redis)
+        shutil.rmtree(project.extracted_dir, ignore_errors=True)
+        project.assets = unpack_zip(
+            project.zip_file_path,
+            project.extracted_dir,
+            project.linked_assets,
+        )
+        blender_file_path = get_blender_file_path(project.extracted_dir)
+        project.blender_file = blender_file_path.name
+        project.status = ProjectStatus.READY
+        project.error = None
+        service_logger.info(
+            f"Project extracted: {project_id}, "
+            f"time: {round(time.monotonic() - start_time, 2)} sec."
+        )
+    except Exception as exc:
+        shutil.rmtree(project.extracted_dir, ignore_errors=True)
+        project.status = ProjectStatus.FAILED
+        project.error = str(exc)
+        service_logger.error(f"Project extraction failed: {project_id}: {exc}")
+    EXTRACTION_DURATION.labels(project.status).observe(
+        time.monotonic() - start_time
+    )
+    ProjectManager.save(project, redis)
 
-        if not job:
-            raise JobNotFoundError(f"Job not found: {job_id}")
 
-        if not job.rendered_dir.exists():
-            job.init_dirs()
+def build_render_args(
+    job: JobDB,
+    blender_file_path: Path,
+    slot: RenderSlot,
+    chunk: int | None = None,
+) -> list[str]:
+    render_args = [
+        "--job-id",
+        job.job_id,
+        "--task-id",
+        make_task_id(job.job_id, chunk),
+        "--blender-file-path",
+        str(blender_file_path),
+        "--resolution-x",
+        str(job.render_settings.resolution_x),
+        "--resolution-y",
+        str(job.render_settings.resolution_y),
+        "--engine",
+        job.render_settings.engine.value,
+        "--output-format",
+        job.render_settings.output_format.value,
+        "--frame-range",
+        task_frame_range(job, chunk),
+        "--output-dir",
+        str(job.rendered_dir),
+        "--threads",
+        str(slot.threads),
+        "--job-total-frames",
+        str(task_total_frames(job)),
+        "--quality",
+        job.render_settings.quality.value,
+    ]
+    if previews_enabled():
+        render_args.append("--previews")
+    if job.render_settings.progressive:
+        render_args.append("--progressive")
+    return render_args
 
-        project = ProjectManager.get(job.project_id, redis)
 
-        if not any(project.extracted_dir.iterdir()):
-            unpack_zip(project.zip_file_path, project.extracted_dir)
+def build_encode_args(job: JobDB) -> list[str]:
+    video = job.render_settings.video
+    video_format, _ = VIDEO_CONTAINERS[video.codec]
+    return [
+        "--encode-video",
+        "--job-id",
+        job.job_id,
+        "--frames-dir",
+        str(job.rendered_dir),
+        "--output-path",
+        str(job.video_file_path),
+        "--video-format",
+        video_format,
+        "--codec",
+        video.codec.value,
+        "--quality",
+        video.quality.value,
+        "--fps",
+        str(video.fps),
+    ]
 
-        blender_file_path = get_blender_file_path(project.extracted_dir)
 
-        if isinstance(job.render_settings.frame_range, FrameRange):
-            frame_range = (
-                f"{job.render_settings.frame_range.start},"
-                f"{job.render_settings.frame_range.end}"
-            )
-        elif isinstance(job.render_settings.frame_range, SingleFrame):
-            frame_range = job.render_settings.frame_range.frame
-
-        process = subprocess.Popen(
-            [
-                "python",
-                "modules/render/run.py",
-                "--job-id",
-                job_id,
-                "--blender-file-path",
-                str(blender_file_path),
-                "--resolution-x",
-                str(job.render_settings.resolution_x),
-                "--resolution-y",
-                str(job.render_settings.resolution_y),
-                "--engine",
-                job.render_settings.engine.value,
-                "--output-format",
-                job.render_settings.output_format.value,
-                "--frame-range",
-                str(frame_range),
-                "--output-dir",
-                str(job.rendered_dir),
-            ],
-        )
-        request.app.state.active_process = process
-        process.wait()
+def finish_chunk(job: JobDB, redis: Redis) -> bool:
+    """
+    Count a finished chunk and return True when it was the last one.
+    """
+    key = REDIS_CHUNKS_DONE_KEY.format(job.job_id)
+    done = redis.incr(key)
+    redis.expire(key, config.REDIS_DATA_LIFETIME)
+    return done >= len(job.chunks)
 
-        job = JobManager.get(job_id, redis)
-        if job.status == Status.CANCELLED:
-            service_logger.info(f"Render Job Cancelled: {job_id}")
-            logger.info("Render Job Cancelled.")
-            return
 
-        service_logger.info(f"Updating Job Status to COMPLETED: {job_id}")
+def complete_task(
+    job: JobDB, task_id: str, redis: Redis, logger: logging.Logger
+) -> None:
+    if job.chunks and not finish_chunk(job, redis):
+        service_logger.info(f"Render Chunk Completed: {task_id}")
+        return
+
+    try:
+        job.render_stats = FrameStatsLog.summary(job, redis)
+    except Exception as exc:
+        service_logger.error(f"Render stats summary failed: {exc}")
+    try:
+        FrameTimeHistory.record(job, redis)
+    except Exception as exc:
+        service_logger.error(f"Frame time history update failed: {exc}")
+
+    if job.render_settings.video is not None:
+        # Stays running until the video is encoded.
+        service_logger.info(f"Queueing video encode: {job.job_id}")
+        logger.info("Frames rendered, queueing video encode.")
+        JobManager.save(job, redis)
+        EncodeQueue.push(job.job_id, redis)
+    else:
+        service_logger.info(f"Updating Job Status to COMPLETED: {job.job_id}")
         job.status = Status.COMPLETED
-        request.app.state.active_process = None
         JobManager.save(job, redis)
-        service_logger.info(f"Render Job Completed: {job_id}")
+        service_logger.info(f"Render Job Completed: {job.job_id}")
 
-    except JobNotFoundError:
-        service_logger.error(f"Job not found: {job_id}")
+    try:
+        project = ProjectManager.get(job.project_id, redis)
+        RenderCache.store(job, project, redis)
     except Exception as exc:
-        job = JobManager.get(job_id, redis)
-        job.status = Status.FAILED
-        JobManager.save(job, redis)
+        service_logger.error(f"Render cache update failed: {exc}")
+
 
-        service_logger.error(f"Render Failed, job_id: {job_id}: {exc}")
-        logger.error("Render Failed.")
+def fail_task(
+    job: JobDB,
+    task_id: str,
+    error: str,
+    redis: Redis,
+    logger: logging.Logger,
+) -> None:
+    job.status = Status.FAILED
+    JobManager.save(job, redis)
+    get_task_queue().remove(job_task_ids(job), redis)
+
+    service_logger.error(f"Render Failed, task_id: {task_id}: {error}")
+    logger.error("Render Failed.")
+
+
+def handle_farm_event(event: dict) -> None:
+    """
+    Apply a task event reported by a farm worker to its job.
+    """
+    task_id = event["task_id"]
+    job_id, _ = parse_task_id(task_id)
+    logger = get_job_logger(job_id)
+    redis = get_jobs_redis()
+    job = JobManager.get(job_id, redis)
+    if job is None or job.status in TERMINAL_STATUSES:
+        service_logger.info(f"Skipping farm event for task {task_id}")
+        return
+
+    service_logger.info(
+        f"Farm event: {event['event']}, task_id: {task_id}, "
+        f"worker: {event['worker_id']}"
+    )
+    if event["event"] == "started":
+        job = JobManager.mark_rendering(job_id, redis)
+        if job is None or job.status in TERMINAL_STATUSES:
+            service_logger.info(f"Skipping farm event for task {task_id}")
+            return
+        logger.info(f"Task {task_id} started on {event['worker_id']}.")
+    elif event["event"] == "finished":
+        logger.info(f"Task {task_id} finished on {event['worker_id']}.")
+        complete_task(job, task_id, redis, logger)
+    elif event["event"] == "failed":
+        fail_task(job, task_id, event["error"], redis, logger)
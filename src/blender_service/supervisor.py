@@ -0,0 +1,476 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+from uuid import uuid4
+
+from redis import asyncio as aioredis
+from starlette.concurrency import run_in_threadpool
+
+from src.core.config import config
+from src.core.redis import get_jobs_redis, get_async_jobs_redis
+from src.core.logger import setup_logger
+from .exceptions import (
+    JobNotFoundError,
+    ProjectExtractionError,
+    RenderProcessError,
+)
+from .schemas import (
+    JobDB,
+    ProjectDB,
+    ProjectStatus,
+    Status,
+    STOPPED_STATUSES,
+    TERMINAL_STATUSES,
+)
+from .utils import AsyncJobManager, AsyncProjectManager
+from .frames import find_rendered_frames
+from .pool import RenderSlot, kill_process
+from .metrics import RENDER_PROCESS_EXITS
+from .job_queue import (
+    AsyncEncodeQueue,
+    AsyncJobQueue,
+    parse_task_id,
+    task_frames,
+)
+from .service import (
+    build_encode_args,
+    build_render_args,
+    complete_task,
+    extract_project,
+    fail_task,
+    get_job_logger,
+)
+from .constants import (
+    RENDER_SCRIPT,
+    REDIS_WORKER_RESULT_KEY,
+    REDIS_RENDER_PROCESSES_KEY,
+)
+
+
+supervisor_logger = setup_logger(
+    name="render_supervisor",
+    filename="render_supervisor.log",
+)
+HOSTNAME = socket.gethostname()
+RENDER_STAGE = "render"
+ENCODE_STAGE = "encode"
+WARM_WORKER_STAGE = "warm_worker"
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_render_process(pid: int) -> bool:
+    """
+    Check that the pid still belongs to a render process and not to an
+    unrelated process that got the pid after it.
+    """
+    try:
+        cmdline = Path(f"/proc/{pid}/cmdline").read_bytes()
+    except OSError:
+        return False
+    return RENDER_SCRIPT.encode() in cmdline
+
+
+async def register_process(
+    process: asyncio.subprocess.Process,
+    task_id: str | None,
+    redis: aioredis.Redis,
+    stage: str = RENDER_STAGE,
+) -> None:
+    """
+    Record the process in Redis, so an API restarted after a crash can
+    find the tasks it was running.
+    """
+    await redis.hset(
+        REDIS_RENDER_PROCESSES_KEY,
+        str(process.pid),
+        json.dumps(
+            {
+                "host": HOSTNAME,
+                "owner_pid": os.getpid(),
+                "task_id": task_id,
+                "stage": stage,
+            }
+        ),
+    )
+
+
+async def unregister_process(
+    process: asyncio.subprocess.Process, redis: aioredis.Redis
+) -> None:
+    await redis.hdel(REDIS_RENDER_PROCESSES_KEY, str(process.pid))
+
+
+async def pipe_output(
+    stream: asyncio.StreamReader, get_logger: Callable[[], logging.Logger]
+) -> None:
+    """
+    Write the output of a render process to the log of its current job.
+    """
+    while line := await stream.readline():
+        text = line.decode(errors="replace").rstrip()
+        if text:
+            get_logger().info(text)
+
+
+async def kill_if_stopped(
+    task_id: str,
+    process: asyncio.subprocess.Process,
+    redis: aioredis.Redis,
+) -> None:
+    """
+    Kill the process of a job stopped before the process got its slot.
+
+    Later stops reach the dispatcher as status events, see
+    `dispatcher.watch_stopped_jobs`.
+    """
+    job_id, _ = parse_task_id(task_id)
+    job = await AsyncJobManager.get(job_id, redis)
+    if job is None or job.status in STOPPED_STATUSES:
+        kill_process(process)
+
+
+async def spawn_render_process(
+    slot: RenderSlot, *args: str
+) -> asyncio.subprocess.Process:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable,
+        RENDER_SCRIPT,
+        *args,
+        # Lines reach the job log as they are printed.
+        env={**slot.env(), "PYTHONUNBUFFERED": "1"},
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    slot.pin(process)
+    return process
+
+
+async def wait_for_project(
+    project_id: str, redis: aioredis.Redis
+) -> ProjectDB:
+    """
+    Return the project once its extraction has finished.
+    """
+    deadline = time.monotonic() + config.EXTRACT_WAIT_TIMEOUT
+    project = await AsyncProjectManager.get(project_id, redis)
+    while project.status == ProjectStatus.EXTRACTING:
+        if time.monotonic() > deadline:
+            raise ProjectExtractionError(
+                f"Project extraction timed out: {project_id}"
+            )
+        await asyncio.sleep(0.5)
+        project = await AsyncProjectManager.get(project_id, redis)
+
+    if project.status == ProjectStatus.UPLOADED:
+        # Uploaded before extraction moved to upload time.
+        await run_in_threadpool(extract_project, project_id)
+        project = await AsyncProjectManager.get(project_id, redis)
+
+    if project.status != ProjectStatus.READY:
+        raise ProjectExtractionError(project.error)
+    return project
+
+
+async def start_warm_worker(
+    slot: RenderSlot, redis: aioredis.Redis
+) -> asyncio.subprocess.Process:
+    if slot.worker is not None and slot.worker.returncode is None:
+        return slot.worker
+
+    slot.worker_queue = f"render_worker:{uuid4().hex}"
+    worker = await spawn_render_process(
+        slot, "--worker-queue", slot.worker_queue
+    )
+    await register_process(worker, None, redis)
+    slot.worker = worker
+    # Lines go to the job the worker renders at the moment.
+    slot.worker_output = asyncio.create_task(
+        pipe_output(worker.stdout, lambda: slot.logger or supervisor_logger)
+    )
+    supervisor_logger.info(
+        f"Warm worker started, slot: {slot.index}, pid: {worker.pid}"
+    )
+    return worker
+
+
+async def run_in_warm_worker(
+    task_id: str,
+    render_args: list[str],
+    slot: RenderSlot,
+    redis: aioredis.Redis,
+) -> None:
+    worker = await start_warm_worker(slot, redis)
+    slot.attach(task_id, worker)
+    await register_process(worker, task_id, redis)
+    await kill_if_stopped(task_id, worker, redis)
+
+    result_key = REDIS_WORKER_RESULT_KEY.format(task_id)
+    await redis.delete(result_key)
+    await redis.rpush(slot.worker_queue, json.dumps(render_args))
+
+    item = None
+    try:
+        async with asyncio.timeout(config.RENDER_TASK_TIMEOUT or None):
+            while worker.returncode is None and item is None:
+                item = await redis.blpop(result_key, timeout=1)
+    except asyncio.CancelledError:
+        # Stays registered, so the next API start requeues the task.
+        kill_process(worker)
+        raise
+    except TimeoutError:
+        await stop_warm_worker(slot, redis)
+        raise RenderProcessError(
+            f"Render timed out after {config.RENDER_TASK_TIMEOUT} sec."
+        )
+
+    if item is None:
+        returncode = worker.returncode
+        await stop_warm_worker(slot, redis)
+        raise RenderProcessError(f"Warm worker exited with code {returncode}")
+
+    await register_process(worker, None, redis)
+    result = json.loads(item[1])
+    if not result["success"]:
+        raise RenderProcessError(f"Warm worker failed: {result['error']}")
+
+
+async def stop_warm_worker(slot: RenderSlot, redis: aioredis.Redis) -> None:
+    worker = slot.worker
+    if worker is None:
+        return
+    if worker.returncode is None:
+        kill_process(worker)
+    await worker.wait()
+    RENDER_PROCESS_EXITS.labels(WARM_WORKER_STAGE, worker.returncode).inc()
+    await slot.worker_output
+    await unregister_process(worker, redis)
+    slot.worker = None
+    slot.worker_output = None
+
+
+async def run_in_process(
+    task_id: str,
+    render_args: list[str],
+    slot: RenderSlot,
+    redis: aioredis.Redis,
+    stage: str = RENDER_STAGE,
+) -> None:
+    process = await spawn_render_process(slot, *render_args)
+    slot.attach(task_id, process)
+    await register_process(process, task_id, redis, stage)
+    await kill_if_stopped(task_id, process, redis)
+    try:
+        async with asyncio.timeout(config.RENDER_TASK_TIMEOUT or None):
+            await pipe_output(process.stdout, lambda: slot.logger)
+            await process.wait()
+    except asyncio.CancelledError:
+        # Stays registered, so the next API start requeues the task.
+        kill_process(process)
+        raise
+    except TimeoutError:
+        kill_process(process)
+        await process.wait()
+        RENDER_PROCESS_EXITS.labels(stage, process.returncode).inc()
+        await unregister_process(process, redis)
+        raise RenderProcessError(
+            f"Render timed out after {config.RENDER_TASK_TIMEOUT} sec."
+        )
+
+    RENDER_PROCESS_EXITS.labels(stage, process.returncode).inc()
+    await unregister_process(process, redis)
+    if process.returncode != 0:
+        raise RenderProcessError(
+            f"Render process exited with code {process.returncode}"
+        )
+
+
+def is_stopped(job: JobDB, task_id: str, logger: logging.Logger) -> bool:
+    """
+    Check whether the job was cancelled or failed while the task ran.
+
+    A failed chunk stops the other chunks of its job, they are neither
+    counted as finished nor failed again.
+    """
+    if job.status == Status.CANCELLED:
+        supervisor_logger.info(f"Render Job Cancelled: {job.job_id}")
+        logger.info("Render Job Cancelled.")
+        return True
+    if job.status == Status.FAILED:
+        supervisor_logger.info(f"Task stopped, the job failed: {task_id}")
+        return True
+    return False
+
+
+async def has_running_tasks(job_id: str, redis: aioredis.Redis) -> bool:
+    """
+    Check whether a process is still registered for a task of the job.
+
+    Entries of dead processes on this host are left for `recover_tasks`.
+    """
+    processes = await redis.hgetall(REDIS_RENDER_PROCESSES_KEY)
+    for pid, data in processes.items():
+        info = json.loads(data)
+        if info["task_id"] is None:
+            continue
+        if parse_task_id(info["task_id"])[0] != job_id:
+            continue
+        if info["host"] != HOSTNAME or is_process_alive(int(pid)):
+            return True
+    return False
+
+
+async def render_task(task_id: str, slot: RenderSlot) -> None:
+    """
+    Render a task in the slot and record its outcome on the job.
+    """
+    job_id, chunk = parse_task_id(task_id)
+    logger = get_job_logger(job_id)
+    slot.logger = logger
+    redis = get_async_jobs_redis()
+    try:
+        # A cancel between reading and saving the job must not be undone.
+        job = await AsyncJobManager.mark_rendering(job_id, redis)
+
+        if not job:
+            raise JobNotFoundError(f"Job not found: {job_id}")
+
+        if job.status in TERMINAL_STATUSES:
+            supervisor_logger.info(f"Skipping task {task_id}: {job.status}")
+            return
+
+        job.init_dirs()
+        # A crashed run leaves placeholders, Blender would skip them.
+        await run_in_threadpool(
+            find_rendered_frames, job.rendered_dir, task_frames(job, chunk)
+        )
+
+        project = await wait_for_project(job.project_id, redis)
+        render_args = build_render_args(
+            job, project.blender_file_path, slot, chunk
+        )
+
+        if config.RENDER_WARM_WORKERS:
+            await run_in_warm_worker(task_id, render_args, slot, redis)
+        else:
+            await run_in_process(task_id, render_args, slot, redis)
+
+        job = await AsyncJobManager.get(job_id, redis)
+        if is_stopped(job, task_id, logger):
+            return
+
+        await run_in_threadpool(
+            complete_task, job, task_id, get_jobs_redis(), logger
+        )
+
+    except JobNotFoundError:
+        supervisor_logger.error(f"Job not found: {job_id}")
+    except Exception as exc:
+        job = await AsyncJobManager.get(job_id, redis)
+        if is_stopped(job, task_id, logger):
+            return
+
+        await run_in_threadpool(
+            fail_task, job, task_id, str(exc), get_jobs_redis(), logger
+        )
+    finally:
+        slot.release()
+        slot.logger = None
+
+
+async def encode_task(job_id: str, slot: RenderSlot) -> None:
+    """
+    Encode the rendered frames of a job into its video in the slot.
+    """
+    logger = get_job_logger(job_id)
+    slot.logger = logger
+    redis = get_async_jobs_redis()
+    try:
+        job = await AsyncJobManager.get(job_id, redis)
+
+        if not job:
+            raise JobNotFoundError(f"Job not found: {job_id}")
+
+        if job.status in TERMINAL_STATUSES:
+            supervisor_logger.info(f"Skipping encode {job_id}: {job.status}")
+            return
+
+        logger.info("Encoding video.")
+        await run_in_process(
+            job_id, build_encode_args(job), slot, redis, ENCODE_STAGE
+        )
+
+        job = await AsyncJobManager.get(job_id, redis)
+        if is_stopped(job, job_id, logger):
+            return
+
+        job.video_url = (
+            f"{config.MEDIA_URL}/{job.project_id}/{job.job_id}/"
+            f"{job.video_file_path.name}"
+        )
+        job.status = Status.COMPLETED
+        await AsyncJobManager.save(job, redis)
+        supervisor_logger.info(f"Render Job Completed: {job_id}")
+        logger.info("Video encoded.")
+
+    except JobNotFoundError:
+        supervisor_logger.error(f"Job not found: {job_id}")
+    except Exception as exc:
+        job = await AsyncJobManager.get(job_id, redis)
+        if is_stopped(job, job_id, logger):
+            return
+
+        await run_in_threadpool(
+            fail_task,
+            job,
+            job_id,
+            f"Video encode failed: {exc}",
+            get_jobs_redis(),
+            logger,
+        )
+    finally:
+        slot.release()
+        slot.logger = None
+
+
+async def recover_tasks() -> None:
+    """
+    Take back the tasks of the previous dispatcher on this host.
+
+    Only the API process holding the dispatcher lock renders, so processes
+    of any other API process were left behind by a crash or a lost lock.
+    They are killed and the tasks taken from the queues on this host go
+    back to the front, including ones that had no process yet or whose
+    outcome was not saved. Frames written before are kept.
+    """
+    redis = get_async_jobs_redis()
+    processes = await redis.hgetall(REDIS_RENDER_PROCESSES_KEY)
+    for pid, data in processes.items():
+        info = json.loads(data)
+        if info["host"] != HOSTNAME or info["owner_pid"] == os.getpid():
+            continue
+
+        if is_process_alive(int(pid)) and is_render_process(int(pid)):
+            supervisor_logger.info(f"Killing orphaned render process: {pid}")
+            os.kill(int(pid), signal.SIGKILL)
+        await redis.hdel(REDIS_RENDER_PROCESSES_KEY, pid)
+
+    for job_id in await AsyncEncodeQueue.requeue(HOSTNAME, redis):
+        supervisor_logger.info(f"Requeueing orphaned encode: {job_id}")
+    for task_id in await AsyncJobQueue.requeue(HOSTNAME, redis):
+        supervisor_logger.info(f"Requeueing orphaned task: {task_id}")
@@ -0,0 +1,119 @@
+import hashlib
+import os
+from pathlib import Path
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from starlette.concurrency import run_in_threadpool
+
+from src.core.config import config
+from src.core.redis import get_async_jobs_redis
+from .schemas import ProjectDB, UploadSession, UploadSessionRead
+from .constants import REDIS_UPLOAD_CHUNKS_KEY
+
+
+def file_sha256(file_path: Path) -> str:
+    with open(file_path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def create_part_file(
+    project: ProjectDB, previous: UploadSession | None
+) -> None:
+    project.create_dirs()
+    if previous is not None:
+        (project.project_path / f".{previous.upload_id}.part").unlink(
+            missing_ok=True
+        )
+    with open(project.upload_file_path, "wb") as part_file:
+        part_file.truncate(project.upload.size)
+
+
+class UploadManager:
+    """
+    Resumable project uploads.
+
+    Chunks are written in place into a preallocated part file, so they can
+    arrive in parallel and in any order. Stored chunk indexes are kept in
+    a Redis set to survive dropped connections and API restarts.
+    """
+
+    @classmethod
+    async def create(
+        cls,
+        project: ProjectDB,
+        previous: UploadSession | None,
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        """
+        Create the part file of the session and drop the one it replaces.
+        """
+        await run_in_threadpool(create_part_file, project, previous)
+        if previous is not None:
+            await redis.delete(
+                REDIS_UPLOAD_CHUNKS_KEY.format(previous.upload_id)
+            )
+
+    @classmethod
+    async def received(
+        cls,
+        upload: UploadSession,
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> list[int]:
+        key = REDIS_UPLOAD_CHUNKS_KEY.format(upload.upload_id)
+        chunks = await redis.smembers(key)
+        return sorted(int(index) for index in chunks)
+
+    @classmethod
+    async def mark_received(
+        cls,
+        upload: UploadSession,
+        index: int,
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        key = REDIS_UPLOAD_CHUNKS_KEY.format(upload.upload_id)
+        pipeline = redis.pipeline()
+        pipeline.sadd(key, index)
+        pipeline.expire(key, config.REDIS_DATA_LIFETIME)
+        await pipeline.execute()
+
+    @classmethod
+    async def missing(
+        cls,
+        upload: UploadSession,
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> list[int]:
+        received = set(await cls.received(upload, redis))
+        return [i for i in range(upload.total_chunks) if i not in received]
+
+    @classmethod
+    async def read(
+        cls, project: ProjectDB, redis: Redis = Depends(get_async_jobs_redis)
+    ) -> UploadSessionRead:
+        return UploadSessionRead(
+            **project.upload.model_dump(),
+            project_id=project.project_id,
+            total_chunks=project.upload.total_chunks,
+            received_chunks=await cls.received(project.upload, redis),
+        )
+
+    @classmethod
+    async def reset(
+        cls,
+        upload: UploadSession,
+        redis: Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        await redis.delete(REDIS_UPLOAD_CHUNKS_KEY.format(upload.upload_id))
+
+    @classmethod
+    async def finish(
+        cls, project: ProjectDB, redis: Redis = Depends(get_async_jobs_redis)
+    ) -> None:
+        """
+        Move the part file to the project zip and drop the session.
+        """
+        os.replace(project.upload_file_path, project.zip_file_path)
+        await redis.delete(
+            REDIS_UPLOAD_CHUNKS_KEY.format(project.upload.upload_id)
+        )
+        project.upload = None
@@ -1,9 +1,98 @@
+import json
+
 from fastapi import Depends
-from redis import Redis
+from redis import Redis, WatchError
+from redis import asyncio as aioredis
+
+from src.core.config import config
+from src.core.redis import (
+    get_jobs_redis,
+    get_async_jobs_redis,
+    RedisHandler,
+    AsyncRedisHandler,
+)
+from .schemas import JobDB, RenderProgress, ProjectDB, Status
+from .constants import REDIS_PROGRESS_KEY, REDIS_JOB_EVENTS_CHANNEL
+from .job_queue import JobQueue, AsyncJobQueue, job_task_ids
+from .farm import FarmQueue, AsyncFarmQueue, AnyPipeline
+from .job_index import add_index_commands, add_unindex_commands
+from .eta import stamp_timings
+
+
+# Filled in on read.
+READ_ONLY_FIELDS = {
+    "queue_position",
+    "elapsed",
+    "eta_seconds",
+    "frames_per_minute",
+}
+
+
+def get_task_queue() -> type[JobQueue] | type[FarmQueue]:
+    """
+    Return the queue render tasks go to in the configured render mode.
+    """
+    if config.RENDER_MODE == "farm":
+        return FarmQueue
+    return JobQueue
+
+
+def get_async_task_queue() -> type[AsyncJobQueue] | type[AsyncFarmQueue]:
+    if config.RENDER_MODE == "farm":
+        return AsyncFarmQueue
+    return AsyncJobQueue
+
+
+def job_keys(job_ids: list[str]) -> list[str]:
+    """
+    Return the keys of the jobs followed by the keys of their progress.
+    """
+    return job_ids + [REDIS_PROGRESS_KEY.format(i) for i in job_ids]
+
+
+def build_jobs(values: list[str | None]) -> list[JobDB | None]:
+    """
+    Build jobs from the values of `job_keys`.
+    """
+    count = len(values) // 2
+    jobs = []
+    for job_data, progress in zip(values[:count], values[count:]):
+        if not job_data:
+            jobs.append(None)
+            continue
+        job = JobDB.model_validate_json(job_data)
+        if progress:
+            job.render_progress = RenderProgress.model_validate_json(progress)
+        jobs.append(job)
+    return jobs
+
+
+def pending_jobs(jobs: list[JobDB | None]) -> list[JobDB]:
+    return [job for job in jobs if job and job.status == Status.PENDING]
+
+
+def status_event(job: JobDB) -> str:
+    return json.dumps(
+        {"event": "status", "job_id": job.job_id, "status": job.status}
+    )
+
 
-from src.core.redis import get_jobs_redis, RedisHandler
-from .schemas import JobDB, RenderProgress, ProjectDB
-from .constants import REDIS_PROGRESS_KEY
+def add_save_commands(pipeline: AnyPipeline, job: JobDB) -> None:
+    """
+    Queue the commands storing the job, its indexes and status event.
+
+    Pipelines run them in a transaction, so indexes always match the job.
+    """
+    stamp_timings(job)
+    pipeline.set(
+        job.job_id,
+        job.model_dump_json(exclude=READ_ONLY_FIELDS),
+        ex=config.REDIS_DATA_LIFETIME,
+    )
+    add_index_commands(pipeline, job)
+    pipeline.publish(
+        REDIS_JOB_EVENTS_CHANNEL.format(job.job_id), status_event(job)
+    )
 
 
 class ProjectManager:
@@ -32,22 +121,156 @@ class ProjectManager:
 class JobManager:
     @classmethod
     def get(cls, job_id: str, redis: Redis = Depends(get_jobs_redis)) -> JobDB:
-        job_data = RedisHandler.get(job_id, redis)
-        progress = RedisHandler.get(REDIS_PROGRESS_KEY.format(job_id), redis)
-        if not job_data:
-            return None
+        return cls.get_many([job_id], redis)[0]
 
-        job = JobDB.model_validate_json(job_data)
-        if progress:
-            job.render_progress = RenderProgress.model_validate_json(progress)
-        return job
+    @classmethod
+    def get_many(
+        cls, job_ids: list[str], redis: Redis = Depends(get_jobs_redis)
+    ) -> list[JobDB | None]:
+        """
+        Read the jobs with their progress in a single round trip.
+
+        Queue positions of pending jobs take one more pipelined round trip.
+        """
+        jobs = build_jobs(RedisHandler.get_many(job_keys(job_ids), redis))
+        if pending := pending_jobs(jobs):
+            positions = get_task_queue().positions(
+                [job_task_ids(job)[0] for job in pending], redis
+            )
+            for job, position in zip(pending, positions):
+                job.queue_position = position
+        return jobs
 
     @classmethod
     def save(cls, job: JobDB, redis: Redis = Depends(get_jobs_redis)) -> None:
-        RedisHandler.save(job.job_id, job.model_dump_json(), redis)
+        pipeline = redis.pipeline()
+        add_save_commands(pipeline, job)
+        pipeline.execute()
+
+    @classmethod
+    def mark_rendering(
+        cls, job_id: str, redis: Redis = Depends(get_jobs_redis)
+    ) -> JobDB | None:
+        """
+        Move a pending job to RENDERING unless it was stopped meanwhile.
+
+        Returns the job as stored, callers skip it when it is terminal.
+        """
+        with redis.pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(job_id)
+                    job = build_jobs(pipeline.mget(job_keys([job_id])))[0]
+                    if job is None or job.status != Status.PENDING:
+                        pipeline.unwatch()
+                        return job
+                    job.status = Status.RENDERING
+                    pipeline.multi()
+                    add_save_commands(pipeline, job)
+                    pipeline.execute()
+                    return job
+                except WatchError:
+                    continue
 
     @classmethod
     def delete(
         cls, job_id: str, redis: Redis = Depends(get_jobs_redis)
     ) -> None:
-        RedisHandler.delete(job_id, redis)
+        job = cls.get(job_id, redis)
+        if job is None:
+            return
+        pipeline = redis.pipeline()
+        pipeline.delete(job_id)
+        add_unindex_commands(pipeline, job)
+        pipeline.execute()
+
+
+class AsyncProjectManager:
+    """
+    ProjectManager for request handlers, does not block the event loop.
+    """
+
+    @classmethod
+    async def get(
+        cls,
+        project_id: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> ProjectDB:
+        project_data = await AsyncRedisHandler.get(project_id, redis)
+        if not project_data:
+            return None
+        return ProjectDB.model_validate_json(project_data)
+
+    @classmethod
+    async def save(
+        cls,
+        project: ProjectDB,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> None:
+        await AsyncRedisHandler.save(
+            project.project_id, project.model_dump_json(), redis
+        )
+
+
+class AsyncJobManager:
+    """
+    JobManager for request handlers, does not block the event loop.
+    """
+
+    @classmethod
+    async def get(
+        cls, job_id: str, redis: aioredis.Redis = Depends(get_async_jobs_redis)
+    ) -> JobDB:
+        return (await cls.get_many([job_id], redis))[0]
+
+    @classmethod
+    async def get_many(
+        cls,
+        job_ids: list[str],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> list[JobDB | None]:
+        values = await AsyncRedisHandler.get_many(job_keys(job_ids), redis)
+        jobs = build_jobs(values)
+        if pending := pending_jobs(jobs):
+            positions = await get_async_task_queue().positions(
+                [job_task_ids(job)[0] for job in pending], redis
+            )
+            for job, position in zip(pending, positions):
+                job.queue_position = position
+        return jobs
+
+    @classmethod
+    async def save(
+        cls, job: JobDB, redis: aioredis.Redis = Depends(get_async_jobs_redis)
+    ) -> None:
+        pipeline = redis.pipeline()
+        add_save_commands(pipeline, job)
+        await pipeline.execute()
+
+    @classmethod
+    async def mark_rendering(
+        cls,
+        job_id: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> JobDB | None:
+        """
+        Move a pending job to RENDERING unless it was stopped meanwhile.
+
+        Returns the job as stored, callers skip it when it is terminal.
+        """
+        async with redis.pipeline() as pipeline:
+            while True:
+                try:
+                    await pipeline.watch(job_id)
+                    values = await pipeline.mget(job_keys([job_id]))
+                    job = build_jobs(values)[0]
+                    if job is None or job.status != Status.PENDING:
+                        await pipeline.unwatch()
+                        return job
+                    job.status = Status.RENDERING
+                    pipeline.multi()
+                    add_save_commands(pipeline, job)
+                    await pipeline.execute()
+                    return job
+                except WatchError:
+                    continue
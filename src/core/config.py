@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -10,6 +11,10 @@ class Settings(BaseSettings):
     LOGS_DIR.mkdir(exist_ok=True)
     TEMP_DIR: Path = BASE_DIR / "temp"
     TEMP_DIR.mkdir(exist_ok=True)
+    ASSET_STORE_DIR: Path = BASE_DIR / "assets"
+    ASSET_STORE_DIR.mkdir(exist_ok=True)
+    RENDER_CACHE_DIR: Path = BASE_DIR / "cache"
+    RENDER_CACHE_DIR.mkdir(exist_ok=True)
 
     # Media
     MEDIA_URL: str = "/media"
@@ -25,6 +30,59 @@ class Settings(BaseSettings):
     REDIS_JOBS_DB: int = 0
     REDIS_DATA_LIFETIME: int = 60 * 60 * 24  # 1 day
 
+    # Project uploads
+    UPLOAD_CHUNK_SIZE: int = 16 * 1024 * 1024  # 16 MB
+    UPLOAD_MAX_CHUNK_SIZE: int = 128 * 1024 * 1024  # 128 MB
+
+    # Project extraction
+    EXTRACT_WORKERS: int = 4
+    EXTRACT_MAX_SIZE: int = 20 * 1024 * 1024 * 1024  # 20 GB
+    EXTRACT_MAX_FILES: int = 100_000
+    EXTRACT_MAX_RATIO: int = 200  # uncompressed / compressed size
+    EXTRACT_WAIT_TIMEOUT: float = 600  # seconds
+
+    # Render queue
+    RENDER_QUEUE_MAX_SIZE: int = 1000
+    RENDER_QUEUE_POLL_INTERVAL: float = 1.0  # seconds
+
+    # Render pool
+    RENDER_WORKERS: int = 1
+    RENDER_THREADS_PER_WORKER: int = 0  # 0 - use all CPUs of the slot
+    RENDER_WARM_WORKERS: bool = False  # keep bpy loaded between jobs
+    RENDER_CHUNK_SIZE: int = 0  # frames per chunk, 0 - do not split
+    RENDER_TASK_TIMEOUT: float = 0  # seconds per task, 0 - no limit
+    DISPATCHER_LOCK_TIMEOUT: float = 30  # seconds to take over a dead API
+
+    # Render result cache
+    RENDER_CACHE_MAX_SIZE: int = 10 * 1024 * 1024 * 1024  # 10 GB, 0 - off
+
+    # Frame previews
+    PREVIEW_SIZES: list[int] = [256, 1024]  # max width and height, px
+    PREVIEW_FORMAT: Literal["WEBP", "JPEG"] = "WEBP"
+    PREVIEW_QUALITY: int = 80
+    PREVIEW_WORKERS: int = 2  # processes, 0 - no previews
+
+    # Job events
+    EVENTS_MAX_JOBS: int = 100  # jobs watched by one connection
+    EVENTS_HEARTBEAT_INTERVAL: float = 15.0  # seconds
+
+    # Job listings
+    JOBS_PAGE_MAX_SIZE: int = 500
+    RESULTS_PAGE_MAX_SIZE: int = 1000  # frames per result page
+    FRAME_STATS_PAGE_MAX_SIZE: int = 1000
+
+    # Completion estimates
+    FRAME_TIME_HISTORY_SIZE: int = 20  # renders kept per settings
+    ETA_FRAME_WINDOW: int = 10  # last frames the frame rate is taken from
+
+    # Log streaming
+    LOG_STATUS_CHECK_INTERVAL: float = 5.0  # seconds between status checks
+
+    # Render farm
+    RENDER_MODE: Literal["local", "farm"] = "local"
+    FARM_BATCH_SIZE: int = 10  # frames leased by a farm worker at once
+    FARM_POLL_INTERVAL: float = 1.0  # seconds
+
     @property
     def CELERY_REDIS_URL(self):
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.CELERY_BROKER_DB}"  # noqa: E501
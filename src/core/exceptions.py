@@ -15,3 +15,11 @@ class NotFoundError(HTTPException):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=detail,
         )
+
+
+class ConflictError(HTTPException):
+    def __init__(self, detail: str = "Conflict"):
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=detail,
+        )
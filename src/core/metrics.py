@@ -0,0 +1,107 @@
+import os
+import time
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+REQUEST_LATENCY = Histogram(
+    "render_service_request_duration_seconds",
+    "Time until the API starts its response, by route.",
+    ["method", "route", "status"],
+)
+REDIS_LATENCY = Histogram(
+    "render_service_redis_command_duration_seconds",
+    "Round trip time of Redis commands and pipelines.",
+    ["command"],
+    buckets=(
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+    ),
+)
+# Waiting for an item is not latency.
+BLOCKING_COMMANDS = {"BLPOP", "BRPOP", "BLMOVE", "BZPOPMIN", "XREAD"}
+
+
+def observe_redis_command(command: str, started_at: float) -> None:
+    command = str(command).upper()
+    if command not in BLOCKING_COMMANDS:
+        REDIS_LATENCY.labels(command).observe(time.perf_counter() - started_at)
+
+
+def generate_metrics(*registries: CollectorRegistry) -> bytes:
+    """
+    Return the metrics of all API processes and of the given registries.
+
+    Gunicorn runs several API processes; with PROMETHEUS_MULTIPROC_DIR set
+    every process writes its values there and any of them reports the sum.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return b"".join(
+        generate_latest(registry) for registry in (registry, *registries)
+    )
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Return the path template of the matched route.
+
+    Templates keep the number of label values bounded. Routes of included
+    routers may know only their own part of the path, the prefix is taken
+    from the request path.
+    """
+    route_path = getattr(scope.get("route"), "path", None)
+    if route_path is None:
+        return "unmatched"
+    prefix_length = scope["path"].count("/") - route_path.count("/")
+    prefix = scope["path"].split("/")[: prefix_length + 1]
+    return "/".join(prefix) + route_path
+
+
+class RequestMetricsMiddleware:
+    """
+    Observe the time to the start of each response.
+
+    Streamed responses count until their headers are sent, log and event
+    streams would otherwise report how long clients kept watching.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+
+        async def send_observed(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                REQUEST_LATENCY.labels(
+                    scope["method"],
+                    route_template(scope),
+                    str(message["status"]),
+                ).observe(time.perf_counter() - started_at)
+            await send(message)
+
+        await self.app(scope, receive, send_observed)
@@ -1,10 +1,14 @@
 import logging
+import time
 
 from redis import ConnectionPool, Redis
+from redis import asyncio as aioredis
+from redis.client import Pipeline
 from fastapi import Depends
 
 from .config import config
 from .logger import setup_logger
+from .metrics import observe_redis_command
 
 logger = setup_logger(
     name="redis",
@@ -25,31 +29,163 @@ def create_redis_pool(db: int) -> ConnectionPool:
     )
 
 
+def create_async_redis_pool(db: int) -> aioredis.ConnectionPool:
+    logger.debug(f"Creating async Redis pool for db: {db}")
+    return aioredis.ConnectionPool(
+        host=config.REDIS_HOST,
+        port=config.REDIS_PORT,
+        db=db,
+        encoding="utf-8",
+        decode_responses=True,
+    )
+
+
+class InstrumentedPipeline(Pipeline):
+    def execute(self, raise_on_error: bool = True) -> list:
+        started_at = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            observe_redis_command("PIPELINE", started_at)
+
+
+class InstrumentedRedis(Redis):
+    """
+    Redis client observing the latency of its commands.
+    """
+
+    def execute_command(self, *args, **options):
+        started_at = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            observe_redis_command(args[0], started_at)
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: str | None = None
+    ) -> InstrumentedPipeline:
+        return InstrumentedPipeline(
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint,
+        )
+
+
+class AsyncInstrumentedPipeline(aioredis.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True) -> list:
+        started_at = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            observe_redis_command("PIPELINE", started_at)
+
+
+class AsyncInstrumentedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        started_at = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe_redis_command(args[0], started_at)
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: str | None = None
+    ) -> AsyncInstrumentedPipeline:
+        return AsyncInstrumentedPipeline(
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint,
+        )
+
+
 jobs_pool = create_redis_pool(config.REDIS_JOBS_DB)
+async_jobs_pool = create_async_redis_pool(config.REDIS_JOBS_DB)
 
 
 def get_jobs_redis() -> Redis:
     logger.debug("Getting Redis connection for jobs")
-    return Redis(connection_pool=jobs_pool)
+    return InstrumentedRedis(connection_pool=jobs_pool)
+
+
+def get_async_jobs_redis() -> aioredis.Redis:
+    logger.debug("Getting async Redis connection for jobs")
+    return AsyncInstrumentedRedis(connection_pool=async_jobs_pool)
 
 
 class RedisHandler:
 
     @classmethod
     def save(cls, key: str, data: str, redis: Redis = Depends(get_jobs_redis)):
-        logger.debug(f"Saving data to Redis: key={key}, data={data}")
+        logger.debug(f"Saving data to Redis: key={key}")
         redis.set(key, data, ex=config.REDIS_DATA_LIFETIME)
 
     @classmethod
     def get(cls, key: str, redis: Redis = Depends(get_jobs_redis)):
         logger.debug(f"Getting data from Redis: key={key}")
         data = redis.get(key)
-        logger.debug(f"Data retrieved from Redis: key={key}, data={data}")
         if data:
             return data
         return None
 
+    @classmethod
+    def get_many(
+        cls, keys: list[str], redis: Redis = Depends(get_jobs_redis)
+    ) -> list[str | None]:
+        """
+        Get the values of the keys in a single round trip.
+        """
+        logger.debug(f"Getting {len(keys)} keys from Redis")
+        if not keys:
+            return []
+        return [data or None for data in redis.mget(keys)]
+
     @classmethod
     def delete(cls, key: str, redis: Redis = Depends(get_jobs_redis)):
         logger.debug(f"Deleting data from Redis: key={key}")
         redis.delete(key)
+
+
+class AsyncRedisHandler:
+    """
+    RedisHandler for request handlers, does not block the event loop.
+    """
+
+    @classmethod
+    async def save(
+        cls,
+        key: str,
+        data: str,
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ):
+        logger.debug(f"Saving data to Redis: key={key}")
+        await redis.set(key, data, ex=config.REDIS_DATA_LIFETIME)
+
+    @classmethod
+    async def get(
+        cls, key: str, redis: aioredis.Redis = Depends(get_async_jobs_redis)
+    ):
+        logger.debug(f"Getting data from Redis: key={key}")
+        data = await redis.get(key)
+        if data:
+            return data
+        return None
+
+    @classmethod
+    async def get_many(
+        cls,
+        keys: list[str],
+        redis: aioredis.Redis = Depends(get_async_jobs_redis),
+    ) -> list[str | None]:
+        logger.debug(f"Getting {len(keys)} keys from Redis")
+        if not keys:
+            return []
+        return [data or None for data in await redis.mget(keys)]
+
+    @classmethod
+    async def delete(
+        cls, key: str, redis: aioredis.Redis = Depends(get_async_jobs_redis)
+    ):
+        logger.debug(f"Deleting data from Redis: key={key}")
+        await redis.delete(key)
@@ -1,40 +1,126 @@
-from datetime import datetime
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable, Iterable, Iterator
 import asyncio
+import io
+import zipfile
 from pathlib import Path
 
+from watchfiles import awatch
+
 from src.core.config import config
 
 
-async def stream_logs(file_path: Path) -> AsyncGenerator[str, None]:
-    with open(file_path, "r") as file:
-        for line in file:
-            yield line
+# Already compressed formats, deflating them again only costs CPU.
+STORED_SUFFIXES = {".png", ".jpg", ".jpeg"}
+ZIP_READ_SIZE = 1024 * 1024
+
+
+class ZipBuffer(io.RawIOBase):
+    """
+    Write-only stream collecting the bytes zipfile writes until taken.
+    """
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(files: Iterable[tuple[Path, str]]) -> Iterator[bytes]:
+    """
+    Yield a zip of the files as it is built, without a temporary archive.
+
+    `files` are pairs of a file path and its name in the archive. Files
+    that no longer exist are left out.
+    """
+    buffer = ZipBuffer()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for file_path, arcname in files:
+            try:
+                source = open(file_path, "rb")
+            except FileNotFoundError:
+                continue
+            with source:
+                info = zipfile.ZipInfo.from_file(file_path, arcname)
+                info.compress_type = (
+                    zipfile.ZIP_STORED
+                    if file_path.suffix.lower() in STORED_SUFFIXES
+                    else zipfile.ZIP_DEFLATED
+                )
+                with archive.open(info, "w") as target:
+                    while chunk := source.read(ZIP_READ_SIZE):
+                        target.write(chunk)
+                        if data := buffer.take():
+                            yield data
+    # Data descriptor of the last file and the central directory.
+    yield buffer.take()
+
+
+async def never_finished() -> bool:
+    return False
+
+
+async def stream_logs(
+    file_path: Path,
+    offset: int = 0,
+    is_finished: Callable[[], Awaitable[bool]] = never_finished,
+) -> AsyncGenerator[tuple[int, str], None]:
+    """
+    Tail a log file from the byte offset, yielding complete lines with the
+    offset right after them.
+
+    Waits for file changes with inotify instead of polling. While the file
+    is idle, `is_finished` is checked and the stream ends once it returns
+    True and the rest of the file is sent.
+    """
+    stop_event = asyncio.Event()
+    watcher = awatch(
+        file_path,
+        stop_event=stop_event,
+        rust_timeout=int(config.LOG_STATUS_CHECK_INTERVAL * 1000),
+        yield_on_timeout=True,
+    )
+    file = open(file_path, "rb")
+    try:
+        file.seek(offset)
+        partial = b""
+        finished = await is_finished()
         while True:
-            line = file.readline()
-            if line:
-                yield line
-            else:
-                await asyncio.sleep(0.1)
-
-
-async def list_directory_files(
-    directory: Path, job_id: str, project_id: str
-) -> list[dict]:
-    files = []
-    for file_path in directory.iterdir():
-        if file_path.is_file():
-            stat = file_path.stat()
-            files.append(
-                {
-                    "filename": file_path.name,
-                    "path": (
-                        f"{config.MEDIA_URL}/{project_id}/"
-                        f"{job_id}/rendered/{file_path.name}"
-                    ),
-                    "timestamp": datetime.fromtimestamp(
-                        stat.st_mtime
-                    ).isoformat(),
-                }
-            )
-    return files
+            if file_path.exists() and file_path.stat().st_size < offset:
+                # Rotated or truncated, start over with the new file.
+                file.close()
+                file = open(file_path, "rb")
+                offset = 0
+                partial = b""
+
+            for line in file:
+                if not line.endswith(b"\n"):
+                    partial += line
+                    continue
+                line = partial + line
+                partial = b""
+                offset += len(line)
+                yield offset, line.decode(errors="replace")
+
+            if finished:
+                break
+            changes = await anext(watcher)
+            if not changes:
+                # Idle, send what was written before the job finished.
+                finished = await is_finished()
+
+        if partial:
+            yield offset + len(partial), partial.decode(errors="replace")
+    finally:
+        stop_event.set()
+        await watcher.aclose()
+        file.close()
@@ -0,0 +1,13 @@
+import pytest
+
+from modules.render.run import count_completed_frame
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def test_rewritten_frames_are_counted_once():
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    assert count_completed_frame("job", 1, redis) == 1
+    assert count_completed_frame("job", 2, redis) == 2
+    assert count_completed_frame("job", 1, redis) == 2
+    assert count_completed_frame("other", 1, redis) == 1
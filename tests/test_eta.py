@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+from src.blender_service.eta import apply_estimates
+from src.blender_service.schemas import (
+    FrameRange,
+    JobDB,
+    RenderProgress,
+    RenderSettings,
+    Status,
+)
+
+
+def make_job(chunks: list[FrameRange] | None, done: int) -> JobDB:
+    frame_range = FrameRange(start=1, end=5)
+    return JobDB(
+        project_id="project",
+        status=Status.RENDERING,
+        render_settings=RenderSettings(frame_range=frame_range),
+        chunks=chunks,
+        render_progress=RenderProgress(
+            current_frame=done,
+            total_frames=5,
+            remaining_frames=5 - done,
+        ),
+        started_at=datetime.now() - timedelta(seconds=12),
+    )
+
+
+def stream_entries(*seconds_ago: float) -> list:
+    """
+    Frame stats entries written the given seconds ago, newest first.
+    """
+    now = datetime.now().timestamp()
+    return [
+        (f"{int((now - ago) * 1000)}-0", {"frame": "1"}) for ago in seconds_ago
+    ]
+
+
+def test_parallel_chunks_written_together():
+    job = make_job(
+        [
+            FrameRange(start=1, end=2),
+            FrameRange(start=3, end=4),
+            FrameRange(start=5, end=5),
+        ],
+        done=2,
+    )
+
+    apply_estimates([job], [stream_entries(0.001, 0.006), []])
+
+    # Two frames in 12 seconds, not two frames 5 milliseconds apart.
+    assert job.frames_per_minute == 10
+    assert 17 < job.eta_seconds <= 18
+
+
+def test_near_zero_gap_is_ignored():
+    job = make_job(None, done=2)
+
+    apply_estimates([job], [stream_entries(0.001, 0.006), ["4.0"]])
+
+    assert job.frames_per_minute == 15
+    assert 11 < job.eta_seconds <= 12
+
+
+def test_sequential_frame_gaps():
+    job = make_job(None, done=3)
+
+    apply_estimates([job], [stream_entries(1, 3, 5), ["4.0"]])
+
+    assert job.frames_per_minute == 30
+    assert 2.9 < job.eta_seconds <= 3.1
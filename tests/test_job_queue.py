@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from src.blender_service.job_queue import AsyncEncodeQueue, AsyncJobQueue
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+def test_taken_tasks_are_requeued_in_order():
+    async def run():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await AsyncJobQueue.push(["a:0", "a:1", "a:2", "b"], redis)
+        assert await AsyncJobQueue.pop("host", redis) == "a:0"
+        assert await AsyncJobQueue.pop("host", redis) == "a:1"
+        assert await AsyncJobQueue.pop("other", redis) == "a:2"
+        await AsyncJobQueue.finish("a:1", "host", redis)
+
+        assert await AsyncJobQueue.requeue("host", redis) == ["a:0"]
+        assert await AsyncJobQueue.requeue("host", redis) == []
+        assert await AsyncJobQueue.positions(["a:0", "b"], redis) == [1, 2]
+
+    asyncio.run(run())
+
+
+def test_taken_encodes_are_requeued():
+    async def run():
+        redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await AsyncEncodeQueue.push("a", redis)
+        await AsyncEncodeQueue.push("b", redis)
+        assert await AsyncEncodeQueue.pop("host", redis) == "a"
+
+        assert await AsyncEncodeQueue.requeue("host", redis) == ["a"]
+        assert await AsyncEncodeQueue.pop("host", redis) == "a"
+        await AsyncEncodeQueue.finish("a", "host", redis)
+        assert await AsyncEncodeQueue.requeue("host", redis) == []
+
+    asyncio.run(run())
@@ -0,0 +1,48 @@
+import logging
+
+import pytest
+from PIL import Image
+
+from modules.render.run import encode_video_file, video_resolution
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [
+        ((1920, 1080), (1920, 1080)),
+        ((82, 45), (82, 44)),
+        ((81, 45), (80, 44)),
+        ((16, 9), (32, 18)),
+        ((9, 16), (18, 32)),
+        ((5, 3), (30, 18)),
+    ],
+)
+def test_video_resolution(size, expected):
+    assert video_resolution(*size) == expected
+
+
+@pytest.mark.parametrize("size", [(82, 45), (16, 9)])
+def test_encode_odd_and_small_frames(tmp_path, size):
+    frame_files = []
+    for frame in range(1, 4):
+        frame_file = tmp_path / f"frame_{frame:04d}.png"
+        Image.new("RGB", size, (frame * 60, 0, 0)).save(frame_file)
+        frame_files.append(frame_file)
+    output_path = tmp_path / "video.mp4"
+
+    status = encode_video_file(
+        frame_files=frame_files,
+        output_path=output_path,
+        video_format="MPEG4",
+        codec="H264",
+        quality="MEDIUM",
+        fps=24,
+        logger=logging.getLogger(__name__),
+        job_id="job",
+        redis=fakeredis.FakeRedis(decode_responses=True),
+    )
+
+    assert "FINISHED" in status
+    assert output_path.stat().st_size > 0